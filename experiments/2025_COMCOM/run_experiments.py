@@ -1,9 +1,20 @@
 #!/usr/bin/env python
 
+import multiprocessing
+import os
+import traceback
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 
-from experiments_runner import RebalancingMode, run_all_simulations
+from experiments_runner import (
+    RebalancingMode,
+    run_simulation_sweeps,
+    topology_capacity_names,
+)
+from experiments_runner.archive import COMPRESS_CSV_POLICY
 from plasma_network_generator.commands.generate_all import (
     DEFAULT_FRACTION_OF_UNBANKED_RETAIL_USERS,
 )
@@ -14,6 +25,7 @@ from plasma_network_generator.commands.generate_all import (
     _execute as topology_generate,
 )
 from plasma_network_generator.core import select_eurosystem_subset
+from plasma_network_generator.topology_cache import TopologyCache
 
 MY_DIR = Path(__file__).resolve().parent
 REPO_BASEPATH = MY_DIR.parent.parent
@@ -21,6 +33,27 @@ REPO_BASEPATH = MY_DIR.parent.parent
 NB_INTERMEDIARIES = 30
 NB_RETAIL = 300000
 NB_MERCHANTS = 3000
+# The number of partitions of the topologies, i.e. of MPI ranks of the simulations
+NB_PARTITIONS = 4
+
+# Total number of MPI ranks of the simulations that are run at once
+MAX_CORES = int(os.environ.get("MAX_CORES", os.cpu_count() or 1))
+# Gzip the csv outputs of each simulation once it has been analysed, as
+# results/compress.sh would do (default: keep them uncompressed, as published)
+OUTPUT_POLICY = (
+    COMPRESS_CSV_POLICY if os.environ.get("COMPRESS_OUTPUTS") == "1" else None
+)
+# Memory budget of the topology generation processes, in GB (default: the memory
+# available when the generation starts)
+MAX_TOPOLOGY_MEMORY_GB = os.environ.get("MAX_TOPOLOGY_MEMORY_GB")
+# Upper bound of the peak memory of a topology generation per retail user, the
+# retail users being by far the largest population of the network. The peak
+# resident set size of generate_all (PCN_model_params.json, 3 nations, k=4)
+# grows by about 8 KiB per retail user (362 MB with 30k users, 928 MB with
+# 100k), plus a margin for METIS
+TOPOLOGY_BYTES_PER_RETAIL_USER = int(
+    os.environ.get("TOPOLOGY_BYTES_PER_RETAIL_USER", 12 * 1024)
+)
 
 
 class TopologyType(Enum):
@@ -46,44 +79,144 @@ def setup_result_directories(experiment_nb: int, topology_type: TopologyType) ->
     return results_dir
 
 
+@dataclass(frozen=True)
+class TopologyJob:
+    """The topology of a seed, to be generated in topologies_dir/seed_<seed>."""
+
+    topologies_dir: Path
+    seed: int
+    capacities: list[float]
+    topology_type: TopologyType
+    nb_intermediaries: int
+    nb_retail: int
+    nb_merchants: int
+
+    @property
+    def estimated_memory(self) -> int:
+        return self.nb_retail * TOPOLOGY_BYTES_PER_RETAIL_USER
+
+
+def topology_memory_budget() -> int:
+    """Get the memory budget of the topology generation processes, in bytes."""
+    if MAX_TOPOLOGY_MEMORY_GB is not None:
+        return int(float(MAX_TOPOLOGY_MEMORY_GB) * 1024**3)
+    try:
+        with Path("/proc/meminfo").open() as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def generate_topology(job: TopologyJob) -> TopologyJob:
+    """
+    Generate the topology of a seed for the given capacities.
+
+    The topologies are cached by generator parameters: only the capacities missing
+    from an existing seed directory are generated. The seed directories generated
+    before the cache can not be completed: they are used as they are if they have
+    all the capacities, otherwise an error is raised.
+    """
+    topologies_seed_dir = job.topologies_dir / f"seed_{job.seed}"
+    if topologies_seed_dir.exists() and not TopologyCache.is_cache_dir(
+        topologies_seed_dir
+    ):
+        capacity_names = topology_capacity_names(topologies_seed_dir)
+        missing = [
+            capacity
+            for capacity in job.capacities
+            if capacity not in capacity_names
+            or not (
+                topologies_seed_dir
+                / f"capacity-{capacity_names[capacity]}"
+                / f"k_{NB_PARTITIONS:02d}"
+            ).is_dir()
+        ]
+        if missing:
+            msg = (
+                f"{topologies_seed_dir} was generated without the topology cache and "
+                f"lacks the capacities {missing}: delete it to generate it again"
+            )
+            raise ValueError(msg)
+        print(f"Using the existing topologies of {topologies_seed_dir}")
+        return job
+    topgen_args = TopologyGeneratorArgs(
+        model_params_file=MY_DIR / "PCN_model_params.json",
+        nb_partitions=[NB_PARTITIONS],
+        seed=job.seed,
+        nations=select_eurosystem_subset(["IT", "CY", "FI"]),
+        nb_cb=0 if job.topology_type == TopologyType.SF_PCN else 3,
+        nb_retail=job.nb_retail,
+        nb_merchants=job.nb_merchants,
+        nb_intermediaries=job.nb_intermediaries,
+        capacity_fractions=job.capacities,
+        output_dir=topologies_seed_dir,
+        # Other args
+        version=False,  # Do not print version and exit
+        verbose=False,
+        p_small_merchants=0.4,
+        p_medium_merchants=0.3,
+        p_large_merchants=0.3,
+        fraction_of_unbanked_retail_users=DEFAULT_FRACTION_OF_UNBANKED_RETAIL_USERS,
+        scale_free_2_2=(job.topology_type == TopologyType.SF_PCN),
+        use_cache=True,
+    )
+    topology_generate(topgen_args)
+    return job
+
+
 def generate_topologies(
-    topologies_dir: Path,
-    seeds: list[int],
-    capacities: list[float],
-    topology_type: TopologyType,
-    nb_intermediaries: int,
-    nb_retail: int,
-    nb_merchants: int,
-) -> None:
+    jobs: list[TopologyJob],
+    max_memory: int | None = None,
+    max_workers: int = MAX_CORES,
+) -> Iterator[TopologyJob]:
     """
-    Generate topologies for the given seeds and capacities.
+    Generate the topologies of the given jobs in a process pool.
+
+    Topology generation is single-threaded and bound by memory, so the jobs are
+    started in order as long as their estimated memory fits in max_memory
+    (default: topology_memory_budget(); a job larger than the whole budget is run
+    alone), with at most max_workers
+    processes. The jobs are yielded as soon as their topology is ready, so that
+    their simulations can start while the other topologies are being generated.
+    A job whose generation fails is reported and not yielded.
+
+    The processes are spawned rather than forked: the generator runs in a thread
+    of run_simulation_sweeps(), and forking while the other threads hold locks
+    (e.g. of logging or of the results store) can deadlock the children.
     """
-    for seed in seeds:
-        topologies_seed_dir = topologies_dir / f"seed_{seed}"
-        if topologies_seed_dir.exists():
-            print(f"Skipping {topologies_seed_dir} because it already exists.")
-            continue
-        topgen_args = TopologyGeneratorArgs(
-            model_params_file=MY_DIR / "PCN_model_params.json",
-            nb_partitions=[4],
-            seed=seed,
-            nations=select_eurosystem_subset(["IT", "CY", "FI"]),
-            nb_cb=0 if topology_type == TopologyType.SF_PCN else 3,
-            nb_retail=nb_retail,
-            nb_merchants=nb_merchants,
-            nb_intermediaries=nb_intermediaries,
-            capacity_fractions=capacities,
-            output_dir=topologies_seed_dir,
-            # Other args
-            version=False,  # Do not print version and exit
-            verbose=False,
-            p_small_merchants=0.4,
-            p_medium_merchants=0.3,
-            p_large_merchants=0.3,
-            fraction_of_unbanked_retail_users=DEFAULT_FRACTION_OF_UNBANKED_RETAIL_USERS,
-            scale_free_2_2=(topology_type == TopologyType.SF_PCN),
-        )
-        topology_generate(topgen_args)
+    pending = list(jobs)
+    running: dict[Future, TopologyJob] = {}
+    free_memory = topology_memory_budget() if max_memory is None else max_memory
+    with ProcessPoolExecutor(
+        max_workers=max(1, max_workers), mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        while pending or running:
+            for job in list(pending):
+                if len(running) >= max_workers:
+                    break
+                if running and job.estimated_memory > free_memory:
+                    continue
+                pending.remove(job)
+                free_memory -= job.estimated_memory
+                future = executor.submit(generate_topology, job)
+                running[future] = job
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                free_memory += job.estimated_memory
+                error = future.exception()
+                if error is not None:
+                    print(
+                        f"Topology generation of {job.topologies_dir}/seed_{job.seed} "
+                        f"failed with error: {error}"
+                    )
+                    traceback.print_exception(error)
+                    continue
+                yield job
 
 
 def run_experiment_1() -> None:
@@ -114,45 +247,48 @@ def run_experiment_1() -> None:
         0.1,
         1.0,
     ]
-    # Topology generation
-    for topology_type in TopologyType:
-        topologies_dir = setup_topology_directories("topologies", topology_type)
-        generate_topologies(
-            topologies_dir,
-            seeds,
+    jobs = [
+        TopologyJob(
+            setup_topology_directories("topologies", topology_type),
+            seed,
             capacities,
             topology_type,
             NB_INTERMEDIARIES,
             NB_RETAIL,
             NB_MERCHANTS,
         )
-    # Run experiments
+        for topology_type in TopologyType
+        for seed in seeds
+    ]
+
     # Experiment 1 (Plot 1...2)
-    for topology_type in TopologyType:
-        topologies_dir = setup_topology_directories("topologies", topology_type)
-        results_dir = setup_result_directories(1, topology_type)
-        results = run_all_simulations(
-            cloth_root_dir=REPO_BASEPATH,
-            topologies_dir=topologies_dir,
-            results_dir=results_dir,
-            block_congestion_rates=0,
-            block_sizes=4,
-            capacities=capacities,
-            num_processess=4,
-            seeds=seeds,
-            simulation_ends=86400000,
-            submarine_swap_thresholds=0.9,
-            rebalancing=[
+    def simulations(job: TopologyJob) -> dict:
+        return {
+            "cloth_root_dir": REPO_BASEPATH,
+            "topologies_dir": job.topologies_dir,
+            "results_dir": setup_result_directories(1, job.topology_type),
+            "block_congestion_rates": 0,
+            "block_sizes": 4,
+            "capacities": capacities,
+            "num_processess": NB_PARTITIONS,
+            "seeds": job.seed,
+            "simulation_ends": 86400000,
+            "submarine_swap_thresholds": 0.9,
+            "rebalancing": [
                 RebalancingMode.NONE,
                 RebalancingMode.REV,
                 RebalancingMode.FULL,
             ],
-            use_known_paths=1,
-            syncs="5 --max-opt-lookahead=100 --batch=1",
-            tpss=2,
-            tps_cfgs=None,
-            cleanup=False,
-        )
+            "use_known_paths": 1,
+            "syncs": "5 --max-opt-lookahead=100 --batch=1",
+            "tpss": 2,
+            "tps_cfgs": None,
+            "cleanup": False,
+            "output_policy": OUTPUT_POLICY,
+        }
+
+    # Run the simulations of each seed as soon as its topology is generated
+    run_simulation_sweeps(map(simulations, generate_topologies(jobs)), MAX_CORES)
 
 
 def run_experiment_2() -> None:
@@ -169,41 +305,44 @@ def run_experiment_2() -> None:
         0.005,
         0.01,
     ]
-    # Topology generation
-    for topology_type in TopologyType:
-        topologies_dir = setup_topology_directories("topologies", topology_type)
-        generate_topologies(
-            topologies_dir,
-            seeds,
+    jobs = [
+        TopologyJob(
+            setup_topology_directories("topologies", topology_type),
+            seed,
             capacities,
             topology_type,
             NB_INTERMEDIARIES,
             NB_RETAIL,
             NB_MERCHANTS,
         )
-    # Run experiments
+        for topology_type in TopologyType
+        for seed in seeds
+    ]
+
     # Experiment 2 (Plot 3)
-    for topology_type in TopologyType:
-        topologies_dir = setup_topology_directories("topologies", topology_type)
-        results_dir = setup_result_directories(2, topology_type)
-        results = run_all_simulations(
-            cloth_root_dir=REPO_BASEPATH,
-            topologies_dir=topologies_dir,
-            results_dir=results_dir,
-            block_congestion_rates=0,
-            block_sizes=4,
-            capacities=capacities,
-            num_processess=4,
-            seeds=seeds,
-            simulation_ends=86400000,
-            submarine_swap_thresholds=0.9,
-            rebalancing=[RebalancingMode.FULL],
-            use_known_paths=1,
-            syncs="5 --max-opt-lookahead=100 --batch=1",
-            tpss=None,
-            tps_cfgs=MY_DIR / "PCN_load.txt",
-            cleanup=False,
-        )
+    def simulations(job: TopologyJob) -> dict:
+        return {
+            "cloth_root_dir": REPO_BASEPATH,
+            "topologies_dir": job.topologies_dir,
+            "results_dir": setup_result_directories(2, job.topology_type),
+            "block_congestion_rates": 0,
+            "block_sizes": 4,
+            "capacities": capacities,
+            "num_processess": NB_PARTITIONS,
+            "seeds": job.seed,
+            "simulation_ends": 86400000,
+            "submarine_swap_thresholds": 0.9,
+            "rebalancing": [RebalancingMode.FULL],
+            "use_known_paths": 1,
+            "syncs": "5 --max-opt-lookahead=100 --batch=1",
+            "tpss": None,
+            "tps_cfgs": MY_DIR / "PCN_load.txt",
+            "cleanup": False,
+            "output_policy": OUTPUT_POLICY,
+        }
+
+    # Run the simulations of each seed as soon as its topology is generated
+    run_simulation_sweeps(map(simulations, generate_topologies(jobs)), MAX_CORES)
 
 
 def run_experiment_3() -> None:
@@ -219,47 +358,47 @@ def run_experiment_3() -> None:
         0.002,
         0.01,
     ]
-    # Topology generation
-    for topology_type in TopologyType:
-        for i in range(1, 5):
-            topologies_dir = setup_topology_directories(
-                f"topologies_exp3_{i}", topology_type
-            )
-            generate_topologies(
-                topologies_dir,
-                seeds,
-                capacities,
-                topology_type,
-                NB_INTERMEDIARIES * i,
-                NB_RETAIL * i,
-                NB_MERCHANTS * i,
-            )
-    for topology_type in TopologyType:
-        for i in range(1, 5):
-            topologies_dir = setup_topology_directories(
-                f"topologies_exp3_{i}", topology_type
-            )
-            results_dir = setup_result_directories(
-                3 * 10 ** len(str(i)) + i, topology_type
-            )
-            results = run_all_simulations(
-                cloth_root_dir=REPO_BASEPATH,
-                topologies_dir=topologies_dir,
-                results_dir=results_dir,
-                block_congestion_rates=0,
-                block_sizes=4 * i,
-                capacities=capacities,
-                num_processess=4,
-                seeds=seeds,
-                simulation_ends=18000000,
-                submarine_swap_thresholds=0.9,
-                rebalancing=[RebalancingMode.FULL],
-                use_known_paths=1,
-                syncs="5 --max-opt-lookahead=100 --batch=1",
-                tpss=2 * i,
-                tps_cfgs=None,
-                cleanup=False,
-            )
+    jobs = [
+        TopologyJob(
+            setup_topology_directories(f"topologies_exp3_{i}", topology_type),
+            seed,
+            capacities,
+            topology_type,
+            NB_INTERMEDIARIES * i,
+            NB_RETAIL * i,
+            NB_MERCHANTS * i,
+        )
+        for topology_type in TopologyType
+        for i in range(1, 5)
+        for seed in seeds
+    ]
+
+    def simulations(job: TopologyJob) -> dict:
+        i = job.nb_retail // NB_RETAIL
+        return {
+            "cloth_root_dir": REPO_BASEPATH,
+            "topologies_dir": job.topologies_dir,
+            "results_dir": setup_result_directories(
+                3 * 10 ** len(str(i)) + i, job.topology_type
+            ),
+            "block_congestion_rates": 0,
+            "block_sizes": 4 * i,
+            "capacities": capacities,
+            "num_processess": NB_PARTITIONS,
+            "seeds": job.seed,
+            "simulation_ends": 18000000,
+            "submarine_swap_thresholds": 0.9,
+            "rebalancing": [RebalancingMode.FULL],
+            "use_known_paths": 1,
+            "syncs": "5 --max-opt-lookahead=100 --batch=1",
+            "tpss": 2 * i,
+            "tps_cfgs": None,
+            "cleanup": False,
+            "output_policy": OUTPUT_POLICY,
+        }
+
+    # Run the simulations of each seed as soon as its topology is generated
+    run_simulation_sweeps(map(simulations, generate_topologies(jobs)), MAX_CORES)
 
 
 def main() -> None:
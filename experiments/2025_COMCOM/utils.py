@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import functools
+import json
 import logging
 import pathlib
 import re
@@ -7,9 +9,10 @@ from typing import TYPE_CHECKING
 
 import IPython
 
+from experiments_runner import EXPERIMENT_MANIFEST_FILE
+
 if TYPE_CHECKING:
     import os
-    from collections.abc import Iterable
 
 MY_DIR = pathlib.Path(__file__).resolve().parent
 logger = logging.getLogger(__name__)
@@ -50,64 +53,128 @@ def add_gz_extension_if_exists(filepath: str | os.PathLike) -> pathlib.Path:
     raise FileNotFoundError(msg)
 
 
-def _match_single_file(f_path: pathlib.Path, reg_expr: str) -> bool:
+def per_minute_series(column: str) -> dict[int, float]:
+    """Parse a per-minute statistic of results.csv into {minute: value}.
+
+    Only the minutes in which at least a payment started are returned. The
+    statistic is a json list, null in the other minutes, or a {minute: value}
+    dict in the results of older versions of the analyzer.
+    """
+    values = json.loads(column)
+    if isinstance(values, dict):
+        return {int(minute): value for minute, value in values.items()}
+    return {minute: value for minute, value in enumerate(values) if value is not None}
+
+
+# Matches the simulator options in the command line echoed in simulation_log.txt
+LOG_OPTIONS_REG_EXPR = {
+    "capacity": r"--input-dir=\S*capacity-([^/\s]+)/",
+    "waterfall": r"--waterfall=(\d+)",
+    "reverse_waterfall": r"--reverse-waterfall=(\d+)",
+    "submarine_swaps": r"--submarine-swaps=(\d+)",
+}
+
+ExperimentIndex = dict[tuple[str, object], set[pathlib.Path]]
+
+
+def _parse_simulation_log(f_path: pathlib.Path) -> dict[str, object]:
+    """Recover the parameters of a simulation without experiment.json from its log.
+
+    Only the parameters in LOG_OPTIONS_REG_EXPR are recovered. The log is read up
+    to the line where all of them have been found.
+    """
+    experiment: dict[str, object] = {}
     with f_path.open("r") as f:
         for line in f:
-            m = re.search(reg_expr, line)
-            if m is not None:
-                return True
-    return False
-
-
-def _grep_files_with_matches(
-    path_iterator: Iterable[pathlib.Path],
-    reg_expr: str,
-) -> list[pathlib.Path]:
-    """Given an iterator over paths and a regex, returns the list of files that
-    match the regex.
+            for key, reg_expr in LOG_OPTIONS_REG_EXPR.items():
+                m = re.search(reg_expr, line)
+                if m is not None and key not in experiment:
+                    experiment[key] = (
+                        m.group(1) if key == "capacity" else int(m.group(1))
+                    )
+            if len(experiment) == len(LOG_OPTIONS_REG_EXPR):
+                break
+    return experiment
+
+
+@functools.cache
+def build_experiment_index(base_path: pathlib.Path) -> ExperimentIndex:
+    """Index the simulations in directories of the following form:
+        <base_path>/aaaaaaaaaaaa/seed_XXX/experiment.json
+
+    The index maps each (parameter, value) pair of the experiment.json manifests
+    to the set of experiment directories (<base_path>/aaaaaaaaaaaa) having it.
+    Simulations run before the manifests were introduced are indexed by parsing
+    their simulation_log.txt instead.
+
+    The index is cached: call build_experiment_index.cache_clear() to pick up new
+    simulations.
     """
-    return [f for f in path_iterator if _match_single_file(f, reg_expr)]
+    index: ExperimentIndex = {}
+    for seed_dir in base_path.glob("*/seed_*"):
+        manifest_file = seed_dir / EXPERIMENT_MANIFEST_FILE
+        log_file = seed_dir / "simulation_log.txt"
+        if manifest_file.is_file():
+            experiment = json.loads(manifest_file.read_text())
+        elif log_file.is_file():
+            experiment = _parse_simulation_log(log_file)
+        else:
+            continue
+        for key, value in experiment.items():
+            index.setdefault((key, value), set()).add(seed_dir.parent)
+    return index
+
+
+def search_experiments(base_path: pathlib.Path, **params: object) -> set[pathlib.Path]:
+    """Get the experiment directories in base_path whose simulations have all the
+    given parameters, e.g. search_experiments(base_path, capacity="0.00180").
+    """
+    index = build_experiment_index(base_path)
+    directory_sets = [index.get((key, value), set()) for key, value in params.items()]
+    return set.intersection(*directory_sets) if directory_sets else set()
 
 
 def search_full_simulations(
     base_path: pathlib.Path, desired_capacity: str
 ) -> pathlib.Path | None:
     """Looks for full simulations in directories of the following form:
-        <base_path>/aaaaaaaaaaaa/seed_XXX/simulation_log.txt
-        <base_path>/aaaaaaaaaaaa/seed_YYY/simulation_log.txt
+        <base_path>/aaaaaaaaaaaa/seed_XXX/experiment.json
+        <base_path>/aaaaaaaaaaaa/seed_YYY/experiment.json
 
-    A match is successful if simulation_log.txt indicates that the simuation
-    has been run with waterfall, reverse waterfall and submarine swaps enabled,
-    and has been run on an input dir indicating the specified capacity.
+    A match is successful if the simulation has been run with waterfall, reverse
+    waterfall and submarine swaps enabled, and on an input dir with the specified
+    capacity. See build_experiment_index().
 
     Returns <base_path>/aaaaaaaaaaaa. See the examples for the conditions.
 
     EXAMPLE 1:
-        <base_path>/aaaaaaaaaaaa/seed_XXX/simulation_log.txt
-        <base_path>/aaaaaaaaaaaa/seed_YYY/simulation_log.txt
+        <base_path>/aaaaaaaaaaaa/seed_XXX/experiment.json
+        <base_path>/aaaaaaaaaaaa/seed_YYY/experiment.json
 
         Returns <base_path>/aaaaaaaaaaaa.
 
     EXAMPLE 2:
-        <base_path>/aaaaaaaaaaaa/seed_XXX/simulation_log.txt
-        <base_path>/aaaaaaaaaaaa/seed_YYY/simulation_log.txt
-        <base_path>/bbbbbbbbbbbb/seed_ZZZ/simulation_log.txt
+        <base_path>/aaaaaaaaaaaa/seed_XXX/experiment.json
+        <base_path>/aaaaaaaaaaaa/seed_YYY/experiment.json
+        <base_path>/bbbbbbbbbbbb/seed_ZZZ/experiment.json
 
         Raises a runtime error: the matching directory after base_path is not
         unique.
     """
-    reg_expr = rf"--input-dir=.*capacity-{desired_capacity}/.* --waterfall=1 .*--reverse-waterfall=1 .*--submarine-swaps=1"
-    glob_pattern = "*/seed_*/simulation_log.txt"
-    experiments = _grep_files_with_matches(base_path.glob(glob_pattern), reg_expr)
-    if len(experiments) == 0:
+    params = {
+        "capacity": desired_capacity,
+        "waterfall": 1,
+        "reverse_waterfall": 1,
+        "submarine_swaps": 1,
+    }
+    directory_set = search_experiments(base_path, **params)
+    if len(directory_set) == 0:
         logger.warning(
-            "Could not find any simulation with '%s' in %s/%s",
-            reg_expr,
+            "Could not find any simulation with %s in %s",
+            params,
             base_path,
-            glob_pattern,
         )
         return None
-    directory_set = {e.parent.parent for e in experiments}
     if len(directory_set) > 1:
         msg = f"Too many directories found: {directory_set}"
         raise RuntimeError(msg)
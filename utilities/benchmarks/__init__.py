@@ -0,0 +1,5 @@
+"""Benchmarks of the Python utilities.
+
+The benchmarks time and memory-profile the stages of the utilities, and store the
+results in JSON files that can be compared between commits. See the README.
+"""
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+"""Main entrypoint.
+
+python -m benchmarks topology [args]            benchmark the topology generator
+python -m benchmarks analyzer [args]            benchmark the statistics analyzer
+python -m benchmarks synthetic-outputs [args]   write synthetic simulator outputs
+python -m benchmarks compare BASE NEW [args]    compare two benchmark results
+"""
+
+import sys
+
+if __name__ == "__main__":
+    # the commands are imported on demand, as the topology generator needs METIS
+    command, argv = sys.argv[1:2], sys.argv[2:]
+    if command == ["topology"]:
+        from benchmarks.commands import topology
+
+        topology.main(argv)
+    elif command == ["analyzer"]:
+        from benchmarks.commands import analyzer
+
+        analyzer.main(argv)
+    elif command == ["synthetic-outputs"]:
+        from benchmarks.commands import synthetic_outputs
+
+        synthetic_outputs.main(argv)
+    elif command == ["compare"]:
+        from benchmarks.commands import compare
+
+        compare.main(argv)
+    else:
+        print(__doc__)
+        sys.exit(1)
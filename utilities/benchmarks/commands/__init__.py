@@ -0,0 +1 @@
+"""Benchmarks entry points."""
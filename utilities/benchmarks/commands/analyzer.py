@@ -0,0 +1,210 @@
+"""Benchmark the stages of the statistics analyzer on synthetic outputs.
+
+For each number of payments, the synthetic outputs are written (or reused, if
+already in the data directory with the same parameters), and then the stages of
+the analyzer, and the whole analyzer, are each run in a new process.
+"""
+
+import argparse
+import dataclasses
+import logging
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+from textwrap import dedent
+
+from benchmarks.commands.synthetic_outputs import add_spec_arguments, spec_from_args
+from benchmarks.harness import (
+    Benchmark,
+    StageResult,
+    run_in_new_process,
+    write_results,
+)
+from benchmarks.synthetic import (
+    SyntheticOutputsSpec,
+    read_synthetic_outputs_spec,
+    write_synthetic_outputs,
+)
+from plasma_network_generator.utils import integer_in_human_format
+from statistics_analyzer.commands.analyzer import (
+    PAYMENTS_OUTPUT_FILE_PATTERN,
+    _compute_distribution_stats,
+    _compute_per_batch_stats,
+    _compute_stats_per_minute,
+    _compute_total_capacity,
+    _execute,
+    _read_payments_output_files,
+    _sender_tiers,
+    _transaction_batches,
+    _transactions_df,
+)
+from statistics_analyzer.commands.analyzer import Args as AnalyzerArgs
+from statistics_analyzer.core import PaymentsStats
+from statistics_analyzer.sketch import payments_sketches
+
+DEFAULT_ROWS = (1_000_000, 10_000_000, 50_000_000)
+DEFAULT_OUTPUT_FILE = Path("analyzer_benchmark.json")
+
+
+@dataclasses.dataclass(frozen=True)
+class Args:
+    output_file: Path
+    data_dir: Path | None
+    rows: Sequence[int]
+    spec: SyntheticOutputsSpec
+    route_length_breakdowns: bool = False
+
+
+def get_description() -> str:
+    return dedent(
+        """\
+    Example usage: benchmark the analyzer, keeping the synthetic outputs for the
+    next runs
+
+        $ python -m benchmarks analyzer --rows 1M 10M --ranks 4 \\
+            --data-dir ~/analyzer-benchmark-data \\
+            --output-file analyzer_benchmark.json
+    """,
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks analyzer",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=get_description(),
+    )
+    parser.add_argument(
+        "-o",
+        "--output-file",
+        type=Path,
+        default=DEFAULT_OUTPUT_FILE,
+        help=f"the JSON results file (default: {DEFAULT_OUTPUT_FILE})",
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="the directory of the synthetic outputs, kept for the next runs "
+        "(default: a temporary directory)",
+    )
+    parser.add_argument(
+        "--rows",
+        type=integer_in_human_format,
+        nargs="+",
+        default=DEFAULT_ROWS,
+        help="the numbers of payments (default: 1M 10M 50M)",
+    )
+    parser.add_argument(
+        "--route-length-breakdowns",
+        action="store_true",
+        help="also compute the route length distribution per payment type and nation",
+    )
+    add_spec_arguments(parser)
+    return parser
+
+
+def parse_args(argv: Sequence[str] | None = None) -> Args:
+    raw_args = get_parser().parse_args(argv)
+    return Args(
+        output_file=raw_args.output_file,
+        data_dir=raw_args.data_dir,
+        rows=tuple(raw_args.rows),
+        # the tps are set by the number of rows
+        spec=spec_from_args(raw_args, tps=1.0),
+        route_length_breakdowns=raw_args.route_length_breakdowns,
+    )
+
+
+def _analyzer_args(args: Args, input_dir: Path, output_dir: Path) -> AnalyzerArgs:
+    return AnalyzerArgs(
+        verbose=False,
+        input_dir=input_dir,
+        output_dir=output_dir,
+        rank_idx=None,
+        route_length_breakdowns=args.route_length_breakdowns,
+    )
+
+
+def _benchmark_stages(args: Args, input_dir: Path, rows: int) -> list[StageResult]:
+    """Run the stages of the analyzer one by one, in this process."""
+    analyzer_args = _analyzer_args(args, input_dir, input_dir)
+    benchmark = Benchmark("analyzer")
+    with benchmark.stage("_read_payments_output_files", rows=rows):
+        all_payments_df = _read_payments_output_files(
+            analyzer_args, PAYMENTS_OUTPUT_FILE_PATTERN
+        )
+    with benchmark.stage("_transactions_df", rows=rows):
+        txs_df = _transactions_df(all_payments_df)
+        batch = _transaction_batches(analyzer_args, txs_df)
+
+    payments_stats = PaymentsStats(nb_batches=analyzer_args.nb_batches)
+    with benchmark.stage("_compute_per_batch_stats", rows=rows):
+        _compute_per_batch_stats(payments_stats, txs_df, batch)
+    with benchmark.stage("_compute_stats_per_minute", rows=rows):
+        _compute_stats_per_minute(analyzer_args, payments_stats, all_payments_df)
+    with benchmark.stage("_compute_distribution_stats", rows=rows):
+        _compute_distribution_stats(
+            payments_stats, txs_df, all_payments_df, args.route_length_breakdowns
+        )
+    with benchmark.stage("payments_sketches", rows=rows):
+        payments_sketches(all_payments_df, _sender_tiers(all_payments_df))
+    with benchmark.stage("_compute_total_capacity", rows=rows):
+        _compute_total_capacity(analyzer_args)
+    return benchmark.results
+
+
+def _benchmark_execute(args: Args, input_dir: Path, rows: int) -> list[StageResult]:
+    """Run the whole analyzer, in this process."""
+    benchmark = Benchmark("analyzer")
+    with (
+        tempfile.TemporaryDirectory() as output_dir,
+        benchmark.stage("_execute", rows=rows),
+    ):
+        _execute(_analyzer_args(args, input_dir, Path(output_dir)))
+    return benchmark.results
+
+
+def _synthetic_outputs(args: Args, data_dir: Path, rows: int) -> Path:
+    """Get the directory of the synthetic outputs with rows payments."""
+    spec = dataclasses.replace(args.spec, tps=rows * 1000 / args.spec.duration)
+    input_dir = data_dir / f"rows_{rows}"
+    if read_synthetic_outputs_spec(input_dir) == spec:
+        logging.info("Reusing the synthetic outputs in %s", input_dir)
+    else:
+        logging.info("Writing %d synthetic payments to %s", rows, input_dir)
+        write_synthetic_outputs(input_dir, spec)
+    return input_dir
+
+
+def _benchmark(args: Args, data_dir: Path) -> None:
+    params = dataclasses.asdict(args.spec)
+    del params["tps"]
+    params |= {
+        "rows": args.rows,
+        "route_length_breakdowns": args.route_length_breakdowns,
+    }
+    benchmark = Benchmark("analyzer", params)
+    for rows in args.rows:
+        input_dir = _synthetic_outputs(args, data_dir, rows)
+        logging.info("Benchmarking %d payments", rows)
+        benchmark.results.extend(
+            run_in_new_process(_benchmark_stages, args, input_dir, rows)
+        )
+        benchmark.results.extend(
+            run_in_new_process(_benchmark_execute, args, input_dir, rows)
+        )
+        # write the results of every size, in case a larger size runs out of memory
+        write_results(args.output_file, benchmark.to_dict())
+    logging.info("Results written to %s", args.output_file)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    args = parse_args(argv)
+    if args.data_dir is not None:
+        _benchmark(args, args.data_dir)
+        return
+    with tempfile.TemporaryDirectory() as data_dir:
+        _benchmark(args, Path(data_dir))
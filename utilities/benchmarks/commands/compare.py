@@ -0,0 +1,53 @@
+"""Compare two benchmark results, e.g. of two commits.
+
+The stages are matched by name and labels. The command exits with an error if a
+stage is slower, or needs more memory, than in the base results by more than the
+threshold.
+"""
+
+import argparse
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+
+from benchmarks.harness import DEFAULT_THRESHOLD, compare_results
+
+MEBIBYTE = 1 << 20
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks compare",
+        description=__doc__,
+    )
+    parser.add_argument("base_file", type=Path, help="the base results")
+    parser.add_argument("results_file", type=Path, help="the results to compare")
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"the tolerated relative increase of time and memory (default: {DEFAULT_THRESHOLD})",
+    )
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = get_parser().parse_args(argv)
+    comparisons = compare_results(args.base_file, args.results_file)
+    nb_regressions = 0
+    print(
+        f"{'stage':<70} {'time (s)':>20} {'ratio':>6} {'memory (MiB)':>20} {'ratio':>6}"
+    )
+    for c in comparisons:
+        is_regression = c.is_regression(args.threshold)
+        nb_regressions += is_regression
+        print(
+            f"{c.key:<70} "
+            f"{c.base_wall_seconds:>9.3f} {c.wall_seconds:>10.3f} {c.wall_ratio:>6.2f} "
+            f"{c.base_peak_rss_delta / MEBIBYTE:>9.1f} {c.peak_rss_delta / MEBIBYTE:>10.1f} "
+            f"{c.memory_ratio:>6.2f}" + (" REGRESSION" if is_regression else "")
+        )
+    print(f"{len(comparisons)} stages compared, {nb_regressions} regressions")
+    if nb_regressions > 0:
+        sys.exit(1)
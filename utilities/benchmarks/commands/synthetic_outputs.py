@@ -0,0 +1,124 @@
+"""Write synthetic simulator outputs, with the layout of the simulator ones.
+
+See benchmarks.synthetic for the outputs written.
+"""
+
+import argparse
+import dataclasses
+import logging
+from collections.abc import Sequence
+from pathlib import Path
+
+from benchmarks.synthetic import SyntheticOutputsSpec, write_synthetic_outputs
+from plasma_network_generator.utils import (
+    check_positive_integer,
+    float_between_0_and_1,
+    integer_in_human_format,
+    set_of_strings,
+)
+
+DEFAULT_SPEC = SyntheticOutputsSpec()
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the arguments of a SyntheticOutputsSpec, but for tps."""
+    parser.add_argument(
+        "--duration",
+        type=integer_in_human_format,
+        default=DEFAULT_SPEC.duration,
+        help=f"the simulated time in ms (default: {DEFAULT_SPEC.duration})",
+    )
+    parser.add_argument(
+        "--ranks",
+        type=check_positive_integer,
+        default=DEFAULT_SPEC.nb_ranks,
+        help=f"the number of ranks (default: {DEFAULT_SPEC.nb_ranks})",
+    )
+    parser.add_argument(
+        "--nations",
+        type=set_of_strings,
+        default=",".join(DEFAULT_SPEC.nations),
+        help=f"the nations of the network (default: {','.join(DEFAULT_SPEC.nations)})",
+    )
+    parser.add_argument(
+        "--size",
+        type=integer_in_human_format,
+        nargs=3,
+        metavar=("INTERMEDIARIES", "RETAIL", "MERCHANTS"),
+        default=(
+            DEFAULT_SPEC.nb_intermediaries,
+            DEFAULT_SPEC.nb_retail,
+            DEFAULT_SPEC.nb_merchants,
+        ),
+        help="the number of intermediaries, retail users and merchants per nation "
+        f"(default: {DEFAULT_SPEC.nb_intermediaries} {DEFAULT_SPEC.nb_retail} {DEFAULT_SPEC.nb_merchants})",
+    )
+    for name, help_text in [
+        ("p_deposit", "the fraction of deposits"),
+        ("p_withdrawal", "the fraction of withdrawals"),
+        ("p_submarine_swap", "the fraction of submarine swaps"),
+        ("p_no_balance", "the fraction of payments failed for lack of balance"),
+        ("p_no_route", "the fraction of payments failed for lack of a route"),
+        ("p_timeout", "the fraction of payments failed for a timeout"),
+    ]:
+        default = getattr(DEFAULT_SPEC, name)
+        parser.add_argument(
+            "--" + name.replace("_", "-"),
+            type=float_between_0_and_1,
+            default=default,
+            help=f"{help_text} (default: {default})",
+        )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        default=DEFAULT_SPEC.seed,
+        help=f"random seed (default: {DEFAULT_SPEC.seed})",
+    )
+
+
+def spec_from_args(raw_args: argparse.Namespace, tps: float) -> SyntheticOutputsSpec:
+    nb_intermediaries, nb_retail, nb_merchants = raw_args.size
+    return dataclasses.replace(
+        DEFAULT_SPEC,
+        tps=tps,
+        duration=raw_args.duration,
+        nb_ranks=raw_args.ranks,
+        nations=tuple(sorted(raw_args.nations)),
+        nb_intermediaries=nb_intermediaries,
+        nb_retail=nb_retail,
+        nb_merchants=nb_merchants,
+        p_deposit=raw_args.p_deposit,
+        p_withdrawal=raw_args.p_withdrawal,
+        p_submarine_swap=raw_args.p_submarine_swap,
+        p_no_balance=raw_args.p_no_balance,
+        p_no_route=raw_args.p_no_route,
+        p_timeout=raw_args.p_timeout,
+        seed=raw_args.seed,
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks synthetic-outputs",
+        description=__doc__,
+    )
+    parser.add_argument(
+        "-o", "--output-dir", type=Path, required=True, help="the output directory"
+    )
+    parser.add_argument(
+        "--tps",
+        type=float,
+        default=DEFAULT_SPEC.tps,
+        help=f"the payments started per second (default: {DEFAULT_SPEC.tps})",
+    )
+    add_spec_arguments(parser)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    raw_args = get_parser().parse_args(argv)
+    spec = spec_from_args(raw_args, raw_args.tps)
+    logging.info("Writing %d payments to %s", spec.nb_payments, raw_args.output_dir)
+    write_synthetic_outputs(raw_args.output_dir, spec)
@@ -0,0 +1,283 @@
+"""Benchmark the stages of the topology generator at several network scales.
+
+Each scale multiplies the number of intermediaries, retail users and merchants
+of the base size (the central banks are not scaled), and is run in a new
+process, so that the peak memory of a scale does not hide the ones of the next.
+"""
+
+import argparse
+import dataclasses
+import logging
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+from textwrap import dedent
+
+from benchmarks.harness import (
+    Benchmark,
+    StageResult,
+    run_in_new_process,
+    write_results,
+)
+
+# isort: off
+# generate_all configures the METIS library, loaded by cloth_dump: import it first
+from plasma_network_generator.commands.generate_all import Args as GenerateAllArgs
+from plasma_network_generator.commands.generate_all import (
+    networkx_generator_args,
+    scale_capacities,
+)
+from plasma_network_generator.cloth_dump import (
+    partition_network,
+    write_cloth_network,
+    write_plasma_paths,
+)
+
+# isort: on
+from plasma_network_generator.commands.networkx_generator import _subnetworks_models
+from plasma_network_generator.core import select_eurosystem_subset
+from plasma_network_generator.generation import (
+    instantiate_plasma_subnetwork,
+    merge_plasma_subnetworks,
+    plasma_subnetworks_to_instantiate,
+    postprocess_plasma_network,
+)
+from plasma_network_generator.utils import (
+    check_positive_integer,
+    float_between_0_and_1,
+    network_size_string,
+    set_of_strings,
+)
+
+DEFAULT_SIZE = "3 30 300k 3k"
+DEFAULT_NATIONS = "IT,FI,CY"
+DEFAULT_SCALES = (1, 2, 4, 8)
+DEFAULT_NB_PARTITIONS = 4
+DEFAULT_CAPACITY_FRACTION = 0.5
+DEFAULT_SEED = 42
+DEFAULT_MODEL_PARAMS_FILE = (
+    Path(__file__).parent.parent.parent
+    / "plasma_network_generator"
+    / "defaultModelParams.json"
+)
+DEFAULT_OUTPUT_FILE = Path("topology_benchmark.json")
+
+
+@dataclasses.dataclass(frozen=True)
+class Args:
+    model_params_file: Path
+    output_file: Path
+    size: tuple[int, int, int, int]
+    nations: frozenset[str]
+    scales: Sequence[int]
+    nb_partitions: int
+    capacity_fraction: float
+    seed: int
+    scale_free_2_2: bool = False
+
+
+def get_description() -> str:
+    return dedent(
+        """\
+    Example usage: benchmark the experiment-3 topologies, up to 120 intermediaries
+
+        $ python -m benchmarks topology --size "3 30 300k 3k" --scales 1 2 4 \\
+            --model-params-file ../experiments/2025_COMCOM/PCN_model_params.json \\
+            --output-file topology_benchmark.json
+    """,
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks topology",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=get_description(),
+    )
+    parser.add_argument(
+        "-m",
+        "--model-params-file",
+        type=Path,
+        default=DEFAULT_MODEL_PARAMS_FILE,
+        help="the model params file (default: the default model params)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-file",
+        type=Path,
+        default=DEFAULT_OUTPUT_FILE,
+        help=f"the JSON results file (default: {DEFAULT_OUTPUT_FILE})",
+    )
+    parser.add_argument(
+        "--size",
+        type=network_size_string,
+        default=DEFAULT_SIZE,
+        help=f"the size specification of the network at scale 1 (default '{DEFAULT_SIZE}')",
+    )
+    parser.add_argument(
+        "--nations",
+        type=set_of_strings,
+        default=DEFAULT_NATIONS,
+        help=f"the nations of the network (default: {DEFAULT_NATIONS})",
+    )
+    parser.add_argument(
+        "--scales",
+        type=check_positive_integer,
+        nargs="+",
+        default=DEFAULT_SCALES,
+        help="the scales of the network size (default: 1 2 4 8)",
+    )
+    parser.add_argument(
+        "-k",
+        "--nb-partitions",
+        type=check_positive_integer,
+        default=DEFAULT_NB_PARTITIONS,
+        help=f"the number of METIS partitions (default: {DEFAULT_NB_PARTITIONS})",
+    )
+    parser.add_argument(
+        "-f",
+        "--capacity-fraction",
+        type=float_between_0_and_1,
+        default=DEFAULT_CAPACITY_FRACTION,
+        help=f"the capacity fraction (default: {DEFAULT_CAPACITY_FRACTION})",
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        default=DEFAULT_SEED,
+        help=f"random seed (default: {DEFAULT_SEED})",
+    )
+    parser.add_argument(
+        "-sf",
+        "--scale-free-2-2",
+        action="store_true",
+        help="force layer 2 subnetwork to be scale free",
+    )
+    return parser
+
+
+def parse_args(argv: Sequence[str] | None = None) -> Args:
+    raw_args = get_parser().parse_args(argv)
+    return Args(
+        model_params_file=raw_args.model_params_file.resolve(),
+        output_file=raw_args.output_file,
+        size=tuple(raw_args.size),
+        nations=frozenset(raw_args.nations),
+        scales=tuple(raw_args.scales),
+        nb_partitions=raw_args.nb_partitions,
+        capacity_fraction=raw_args.capacity_fraction,
+        seed=raw_args.seed,
+        scale_free_2_2=raw_args.scale_free_2_2,
+    )
+
+
+def scaled_size(
+    size: tuple[int, int, int, int], scale: int
+) -> tuple[int, int, int, int]:
+    nb_cb, nb_intermediaries, nb_retail, nb_merchants = size
+    return nb_cb, nb_intermediaries * scale, nb_retail * scale, nb_merchants * scale
+
+
+def _benchmark_scale(args: Args, scale: int) -> list[StageResult]:
+    """Run all the stages of the generator at a scale, in this process."""
+    nb_cb, nb_intermediaries, nb_retail, nb_merchants = scaled_size(args.size, scale)
+    benchmark = Benchmark("topology")
+    with tempfile.TemporaryDirectory() as output_dir:
+        generate_all_args = GenerateAllArgs(
+            version=False,
+            verbose=False,
+            model_params_file=args.model_params_file,
+            output_dir=Path(output_dir),
+            nb_partitions=(args.nb_partitions,),
+            nb_cb=nb_cb,
+            nb_intermediaries=nb_intermediaries,
+            nb_retail=nb_retail,
+            nb_merchants=nb_merchants,
+            fraction_of_unbanked_retail_users=0.0,
+            p_small_merchants=0.4,
+            p_medium_merchants=0.3,
+            p_large_merchants=0.3,
+            capacity_fractions=(args.capacity_fraction,),
+            nations=select_eurosystem_subset(args.nations),
+            seed=args.seed,
+            scale_free_2_2=args.scale_free_2_2,
+        )
+        nx_args = networkx_generator_args(generate_all_args)
+
+        with benchmark.stage("payment_subnetworks_random_models", scale=scale):
+            _, subnetworks_models, _ = _subnetworks_models(nx_args)
+
+        subnetwork_instances = []
+        for rnd_model, nations in plasma_subnetworks_to_instantiate(
+            subnetworks_models, nx_args.rnd_model.nations
+        ):
+            subnetwork = f"{rnd_model['ID']}_{'-'.join(nations)}"
+            with benchmark.stage(
+                "instantiate_plasma_subnetwork", scale=scale, subnetwork=subnetwork
+            ):
+                subnetwork_instances.append(
+                    instantiate_plasma_subnetwork(
+                        rnd_model,
+                        nx_args.seed,
+                        nations,
+                        unique_cb=nx_args.rnd_model.unique_cb,
+                    )
+                )
+
+        with benchmark.stage("merge_plasma_subnetworks", scale=scale):
+            plasma_network = merge_plasma_subnetworks(subnetwork_instances)
+        del subnetwork_instances
+
+        with benchmark.stage("postprocess_plasma_network", scale=scale):
+            postprocess_plasma_network(plasma_network, {})
+
+        with benchmark.stage("scale_capacities", scale=scale):
+            plasma_network = scale_capacities(plasma_network, args.capacity_fraction)
+
+        with benchmark.stage("partition_network", scale=scale):
+            g = partition_network(plasma_network, args.nb_partitions)
+
+        with benchmark.stage("write_cloth_network", scale=scale):
+            write_cloth_network(plasma_network, g, Path(output_dir))
+
+        with benchmark.stage("write_plasma_paths", scale=scale):
+            write_plasma_paths(plasma_network, Path(output_dir))
+
+    logging.info(
+        "Scale %d: %d nodes, %d edges",
+        scale,
+        plasma_network.number_of_nodes(),
+        plasma_network.number_of_edges(),
+    )
+    return benchmark.results
+
+
+def _execute(args: Args) -> None:
+    benchmark = Benchmark(
+        "topology",
+        params={
+            "model_params_file": str(args.model_params_file),
+            "size": args.size,
+            "nations": sorted(args.nations),
+            "scales": args.scales,
+            "nb_partitions": args.nb_partitions,
+            "capacity_fraction": args.capacity_fraction,
+            "seed": args.seed,
+            "scale_free_2_2": args.scale_free_2_2,
+        },
+    )
+    for scale in args.scales:
+        logging.info(
+            "Benchmarking scale %d: size %s", scale, scaled_size(args.size, scale)
+        )
+        benchmark.results.extend(run_in_new_process(_benchmark_scale, args, scale))
+        # write the results of every scale, in case a larger scale runs out of memory
+        write_results(args.output_file, benchmark.to_dict())
+    logging.info("Results written to %s", args.output_file)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    _execute(parse_args(argv))
@@ -0,0 +1,176 @@
+import dataclasses
+import datetime
+import json
+import math
+import multiprocessing
+import platform
+import subprocess
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from plasma_network_generator.profiling import current_rss, peak_rss, reset_peak_rss
+
+# A stage is a regression if it is slower (or uses more memory) by this fraction
+DEFAULT_THRESHOLD = 0.1
+# Stages shorter than this are too noisy to be compared
+MIN_COMPARED_SECONDS = 0.05
+# Peak memory increases smaller than this (in bytes) are too noisy to be compared
+MIN_COMPARED_RSS = 16 << 20
+
+
+@dataclasses.dataclass
+class StageResult:
+    """The resources used by a stage of a benchmark.
+
+    peak_rss_delta is the increase of the peak resident set size of the process
+    over the resident set size at the start of the stage.
+    """
+
+    name: str
+    labels: dict[str, object]
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss: int
+    peak_rss_delta: int
+
+    @property
+    def key(self) -> str:
+        labels = ",".join(f"{k}={v}" for k, v in sorted(self.labels.items()))
+        return f"{self.name}[{labels}]" if labels else self.name
+
+
+class Benchmark:
+    """Record the resources used by the stages of a benchmark."""
+
+    def __init__(self, name: str, params: dict[str, object] | None = None) -> None:
+        self.name = name
+        self.params = params or {}
+        self.results: list[StageResult] = []
+
+    @contextmanager
+    def stage(self, name: str, **labels: object) -> Iterator[None]:
+        reset_peak_rss()
+        start_rss = current_rss()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        yield
+        wall_seconds = time.perf_counter() - start_wall
+        cpu_seconds = time.process_time() - start_cpu
+        stage_peak_rss = peak_rss()
+        self.results.append(
+            StageResult(
+                name=name,
+                labels=labels,
+                wall_seconds=wall_seconds,
+                cpu_seconds=cpu_seconds,
+                peak_rss=stage_peak_rss,
+                peak_rss_delta=max(stage_peak_rss - start_rss, 0),
+            )
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "benchmark": self.name,
+            "metadata": benchmark_metadata(),
+            "params": self.params,
+            "stages": [dataclasses.asdict(r) for r in self.results],
+        }
+
+
+def run_in_new_process(
+    function: Callable[..., list[StageResult]], *args: object
+) -> list[StageResult]:
+    """Run a benchmark function in a new process, and get its stage results.
+
+    The peak memory of the function is then not affected by the memory still
+    held by the previous ones.
+    """
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(function, *args).result()
+
+
+def git_commit() -> str | None:
+    """Get the commit of the working tree, with a -dirty suffix if it has changes."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty", "--abbrev=12"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_metadata() -> dict[str, object]:
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+    }
+
+
+def write_results(path: Path, results: dict) -> None:
+    path.write_text(json.dumps(results, indent=2) + "\n")
+
+
+def read_stages(path: Path) -> dict[str, StageResult]:
+    """Read the stages of a results file, by key."""
+    results = json.loads(path.read_text())
+    stages = [StageResult(**stage) for stage in results["stages"]]
+    return {stage.key: stage for stage in stages}
+
+
+@dataclasses.dataclass(frozen=True)
+class StageComparison:
+    key: str
+    base_wall_seconds: float
+    wall_seconds: float
+    base_peak_rss_delta: int
+    peak_rss_delta: int
+
+    @property
+    def wall_ratio(self) -> float:
+        if self.base_wall_seconds == 0:
+            return math.inf if self.wall_seconds > 0 else math.nan
+        return self.wall_seconds / self.base_wall_seconds
+
+    @property
+    def memory_ratio(self) -> float:
+        if self.base_peak_rss_delta == 0:
+            return math.inf if self.peak_rss_delta > 0 else math.nan
+        return self.peak_rss_delta / self.base_peak_rss_delta
+
+    def is_regression(self, threshold: float) -> bool:
+        slower = (
+            max(self.base_wall_seconds, self.wall_seconds) >= MIN_COMPARED_SECONDS
+            and self.wall_ratio > 1 + threshold
+        )
+        more_memory = (
+            max(self.base_peak_rss_delta, self.peak_rss_delta) >= MIN_COMPARED_RSS
+            and self.memory_ratio > 1 + threshold
+        )
+        return slower or more_memory
+
+
+def compare_results(base_path: Path, path: Path) -> list[StageComparison]:
+    """Compare the stages of two results files, in the order of the second one."""
+    base_stages = read_stages(base_path)
+    return [
+        StageComparison(
+            key=key,
+            base_wall_seconds=base_stages[key].wall_seconds,
+            wall_seconds=stage.wall_seconds,
+            base_peak_rss_delta=base_stages[key].peak_rss_delta,
+            peak_rss_delta=stage.peak_rss_delta,
+        )
+        for key, stage in read_stages(path).items()
+        if key in base_stages
+    ]
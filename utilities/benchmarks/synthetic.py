@@ -0,0 +1,456 @@
+"""Synthetic simulator outputs, to benchmark the statistics analyzer.
+
+The payments_output_<rank>.csv and channels_output_<rank>.csv files have the
+layout written by src/utils/utils.c, and blockchain_output_0.csv the one written
+by src/model/blockchain.c. The outputs are fully determined by their
+SyntheticOutputsSpec, which is stored with them in synthetic_outputs.json.
+
+Only the layout and the distributions relevant to the analyzer are realistic:
+e.g. the routes have random lengths, through random intermediaries, but do not
+follow the channels.
+"""
+
+import dataclasses
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+SPEC_FILE = "synthetic_outputs.json"
+
+PAYMENTS_HEADER = (
+    "id,type,sender_id,receiver_id,amount,start_time,end_time,mpp,is_success,"
+    "no_balance_count,offline_node_count,timeout_exp,attempts,"
+    "first_no_balance_error,route,route_ids,total_fee"
+)
+# the simulator writes 7 fields per channel under the 8 columns of the header
+CHANNELS_HEADER = "id,edge1,edge2,node1,node2,capacity,is_closed,is_private"
+BLOCKCHAIN_HEADER = (
+    "confirmed, block.height, block.time, tx.type, tx.sender, tx.receiver,"
+    "tx.amount, tx.start_time, tx.originator"
+)
+
+# The payment types of src/features/payments.h
+TRANSACTION, DEPOSIT, WITHDRAWAL, SUBMARINE_SWAP = range(4)
+MAX_ROUTE_LENGTH = 6
+
+
+@dataclasses.dataclass(frozen=True)
+class SyntheticOutputsSpec:
+    """The parameters of the synthetic outputs.
+
+    The payments start at a constant rate of tps payments per second, over the
+    duration (in ms). The network has, in each nation, a CB and the given numbers
+    of intermediaries, retail users and merchants; its nodes are assigned to the
+    ranks round robin, and each payment is written by the rank of its sender.
+
+    The payment type mix is given by p_deposit, p_withdrawal and p_submarine_swap
+    (the rest are transactions), and the failure mix by p_no_balance, p_no_route
+    and p_timeout (the rest succeed).
+
+    The payments are generated in chunks of chunk_size payments, so that the
+    memory needed does not depend on their number.
+    """
+
+    tps: float = 100.0
+    duration: int = 86_400_000
+    nb_ranks: int = 4
+    nations: tuple[str, ...] = ("IT", "FI", "CY")
+    nb_intermediaries: int = 10
+    nb_retail: int = 10_000
+    nb_merchants: int = 1_000
+    p_deposit: float = 0.02
+    p_withdrawal: float = 0.02
+    p_submarine_swap: float = 0.005
+    p_no_balance: float = 0.05
+    p_no_route: float = 0.01
+    p_timeout: float = 0.005
+    block_time: int = 60_000
+    seed: int = 42
+    chunk_size: int = 1_000_000
+
+    def __post_init__(self) -> None:
+        for mix in [
+            (self.p_deposit, self.p_withdrawal, self.p_submarine_swap),
+            (self.p_no_balance, self.p_no_route, self.p_timeout),
+        ]:
+            if min(mix) < 0 or sum(mix) > 1:
+                msg = (
+                    f"The probabilities {mix} must be non-negative, with sum at most 1"
+                )
+                raise ValueError(msg)
+        if min(self.tps, self.duration, self.nb_ranks, self.chunk_size) <= 0:
+            msg = "The tps, duration, number of ranks and chunk size must be positive"
+            raise ValueError(msg)
+
+    @property
+    def nb_payments(self) -> int:
+        return round(self.tps * self.duration / 1000)
+
+
+class _Network(NamedTuple):
+    labels: np.ndarray
+    # 1 for the CBs, 2 for the intermediaries, 3 for the retail users and merchants
+    tiers: np.ndarray
+    # the intermediary of each node (the node itself for CBs and intermediaries)
+    intermediaries: np.ndarray
+
+
+def _network(spec: SyntheticOutputsSpec) -> _Network:
+    labels: list[str] = []
+    tiers: list[int] = []
+    intermediaries: list[int] = []
+    for nation in spec.nations:
+        first_intermediary = len(labels) + 1
+        nodes = [
+            (f"CB{nation}1", 1),
+            *(
+                (f"Intermediary{nation}{i + 1}", 2)
+                for i in range(spec.nb_intermediaries)
+            ),
+            *((f"Retail{nation}{i + 1}", 3) for i in range(spec.nb_retail)),
+            *(
+                (f"Merchant-{size}-{nation}{i + 1}", 3)
+                for i, size in enumerate(
+                    np.resize(["small", "medium", "large"], spec.nb_merchants)
+                )
+            ),
+        ]
+        for i, (label, tier) in enumerate(nodes):
+            labels.append(label)
+            tiers.append(tier)
+            intermediaries.append(
+                len(intermediaries)
+                if tier < 3
+                else first_intermediary + i % spec.nb_intermediaries
+            )
+    return _Network(
+        labels=np.array(labels, dtype=object),
+        tiers=np.array(tiers, dtype=np.int8),
+        intermediaries=np.array(intermediaries, dtype=np.int64),
+    )
+
+
+def _channels_df(spec: SyntheticOutputsSpec, network: _Network) -> pd.DataFrame:
+    """Connect the CBs together, each intermediary to its CB and to the next
+    intermediaries, and each user to its intermediary."""
+    cbs = np.flatnonzero(network.tiers == 1)
+    intermediaries = np.flatnonzero(network.tiers == 2)
+    users = np.flatnonzero(network.tiers == 3)
+    intermediary_cbs = cbs[np.searchsorted(cbs, intermediaries) - 1]
+    cb_pairs = np.array(
+        [(u, v) for i, u in enumerate(cbs) for v in cbs[i + 1 :]], dtype=np.int64
+    ).reshape(-1, 2)
+    node1 = np.concatenate(
+        [cb_pairs[:, 0], intermediary_cbs, intermediaries, users]
+    ).astype(np.int64)
+    node2 = np.concatenate(
+        [
+            cb_pairs[:, 1],
+            intermediaries,
+            np.roll(intermediaries, -1),
+            network.intermediaries[users],
+        ]
+    ).astype(np.int64)
+    rng = np.random.default_rng([spec.seed, 0])
+    capacity = np.concatenate(
+        [
+            rng.integers(10**9, 10**10, len(cb_pairs)),
+            rng.integers(10**8, 10**9, 2 * len(intermediaries)),
+            rng.integers(10**4, 10**6, len(users)),
+        ]
+    )
+    channel_id = np.arange(len(node1))
+    return pd.DataFrame(
+        {
+            "id": channel_id,
+            "edge1": 2 * channel_id,
+            "edge2": 2 * channel_id + 1,
+            "node1": network.labels[node1],
+            "node2": network.labels[node2],
+            "capacity": capacity,
+            "is_closed": 0,
+            "rank": node1 % spec.nb_ranks,
+        }
+    )
+
+
+def _join_edge_ids(edge_ids: np.ndarray, route_length: np.ndarray) -> np.ndarray:
+    """Format the edge ids of the routes as the simulator does: "1-2-3"."""
+    route_ids = edge_ids[:, 0].copy()
+    for j in range(1, edge_ids.shape[1]):
+        has_edge = route_length > j
+        route_ids[has_edge] += "-" + edge_ids[has_edge, j]
+    return route_ids
+
+
+def _join_hops(
+    first: np.ndarray, hops: np.ndarray, last: np.ndarray, route_length: np.ndarray
+) -> np.ndarray:
+    """Format the routes as the simulator does: "a->b-b->c-c->d".
+
+    hops holds the intermediate nodes of each route, of which only the first
+    route_length - 1 are used.
+    """
+    routes: np.ndarray = first + "->"
+    for j in range(hops.shape[1]):
+        has_hop = route_length > j + 1
+        routes[has_hop] += hops[has_hop, j] + "-" + hops[has_hop, j] + "->"
+    routes += last
+    return routes
+
+
+def _payments_chunk(
+    spec: SyntheticOutputsSpec,
+    network: _Network,
+    first_id: int,
+    start_time: np.ndarray,
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    n = len(start_time)
+    payment_type = rng.choice(
+        4,
+        size=n,
+        p=[
+            1 - spec.p_deposit - spec.p_withdrawal - spec.p_submarine_swap,
+            spec.p_deposit,
+            spec.p_withdrawal,
+            spec.p_submarine_swap,
+        ],
+    )
+    users = np.flatnonzero(network.tiers == 3)
+    intermediaries = np.flatnonzero(network.tiers == 2)
+    cbs = np.flatnonzero(network.tiers == 1)
+    # transactions among users, deposits (withdrawals) from (to) a user to (from)
+    # its intermediary, swaps between intermediaries and CBs
+    sender = users[rng.integers(0, len(users), n)]
+    receiver = users[rng.integers(0, len(users), n)]
+    is_deposit = payment_type == DEPOSIT
+    receiver[is_deposit] = network.intermediaries[sender[is_deposit]]
+    is_withdrawal = payment_type == WITHDRAWAL
+    sender[is_withdrawal] = network.intermediaries[receiver[is_withdrawal]]
+    is_swap = payment_type == SUBMARINE_SWAP
+    swap_nodes = np.concatenate([cbs, intermediaries])
+    sender[is_swap] = swap_nodes[rng.integers(0, len(swap_nodes), is_swap.sum())]
+    receiver[is_swap] = swap_nodes[rng.integers(0, len(swap_nodes), is_swap.sum())]
+
+    outcome = rng.choice(
+        4,
+        size=n,
+        p=[
+            1 - spec.p_no_balance - spec.p_no_route - spec.p_timeout,
+            spec.p_no_balance,
+            spec.p_no_route,
+            spec.p_timeout,
+        ],
+    )
+    is_success = outcome == 0
+    is_no_balance = outcome == 1
+    has_route = outcome != 2
+    attempts = np.where(is_no_balance, 3, rng.geometric(0.7, n))
+    end_time = start_time + np.ceil(rng.lognormal(7, 1, n) * attempts).astype(np.int64)
+
+    route_length = rng.integers(2, MAX_ROUTE_LENGTH + 1, n)
+    route_length[is_deposit | is_withdrawal] = 1
+    hop_nodes = np.concatenate([intermediaries, cbs])
+    hop_weights = np.where(np.arange(len(hop_nodes)) < len(intermediaries), 10.0, 1.0)
+    hops = rng.choice(
+        hop_nodes, size=(n, MAX_ROUTE_LENGTH - 1), p=hop_weights / hop_weights.sum()
+    )
+    route = _join_hops(
+        network.labels[sender],
+        network.labels[hops],
+        network.labels[receiver],
+        route_length,
+    )
+    edge_ids = (
+        rng.integers(0, 10**6, size=(n, MAX_ROUTE_LENGTH)).astype(str).astype(object)
+    )
+    route_ids = _join_edge_ids(edge_ids, route_length)
+    # the simulator writes ",-1," for the payments without a route
+    route[~has_route] = ""
+    route_ids[~has_route] = "-1"
+    total_fee = pd.array(rng.integers(0, 100, n), dtype="Int64")
+    total_fee[~has_route] = pd.NA
+
+    first_no_balance_error = np.full(n, "", dtype=object)
+    error_edge = rng.integers(0, 10**6, is_no_balance.sum()).astype(str)
+    # the edge out of the sender failed
+    error_hop = np.where(route_length > 1, hops[:, 0], receiver)[is_no_balance]
+    first_no_balance_error[is_no_balance] = (
+        error_edge.astype(object)
+        + ":"
+        + start_time[is_no_balance].astype(str).astype(object)
+        + ":"
+        + network.labels[sender[is_no_balance]]
+        + "->"
+        + network.labels[error_hop]
+    )
+
+    return pd.DataFrame(
+        {
+            "id": np.arange(first_id, first_id + n),
+            "type": payment_type,
+            "sender_id": network.labels[sender],
+            "receiver_id": network.labels[receiver],
+            "amount": rng.integers(100, 10**5, n),
+            "start_time": start_time,
+            "end_time": end_time,
+            "mpp": 0,
+            "is_success": is_success.astype(np.int8),
+            "no_balance_count": np.where(is_success, attempts - 1, attempts),
+            "offline_node_count": 0,
+            "timeout_exp": (outcome == 3).astype(np.int8),
+            "attempts": attempts,
+            "first_no_balance_error": first_no_balance_error,
+            "route": route,
+            "route_ids": route_ids,
+            "total_fee": total_fee,
+            "rank": sender % spec.nb_ranks,
+            "sender": sender,
+            "receiver": receiver,
+        }
+    )
+
+
+def _payments_chunks(
+    spec: SyntheticOutputsSpec, network: _Network
+) -> Iterator[pd.DataFrame]:
+    """Generate the payments by start time, in chunks of chunk_size payments."""
+    rng = np.random.default_rng([spec.seed, 1])
+    nb_payments = spec.nb_payments
+    for first_id in range(0, nb_payments, spec.chunk_size):
+        nb_chunk_payments = min(spec.chunk_size, nb_payments - first_id)
+        start = first_id * spec.duration // nb_payments
+        end = (first_id + nb_chunk_payments) * spec.duration // nb_payments
+        start_time = np.sort(
+            rng.integers(start, max(end, start + 1), nb_chunk_payments)
+        )
+        yield _payments_chunk(spec, network, first_id, start_time, rng)
+
+
+def _format_blockchain_rows(txs: pd.DataFrame) -> list[str]:
+    confirmed = txs["block_height"] >= 0
+    return [
+        f"1, {height:3d}, {block_time:10.2f}, {tx_type}, {sender:6d}, {receiver:6d}, "
+        f"{amount:6d}, {start_time:10.2f}, {sender:6d}\n"
+        if is_confirmed
+        else f"0,    ,           , {tx_type}, {sender:6d}, {receiver:6d}, "
+        f"{amount:6d}, {start_time:10.2f}, {sender:6d}\n"
+        for is_confirmed, height, block_time, tx_type, sender, receiver, amount, start_time in zip(
+            confirmed,
+            txs["block_height"],
+            txs["block_time"],
+            txs["tx_type"],
+            txs["sender"],
+            txs["receiver"],
+            txs["amount"],
+            txs["start_time"],
+            strict=True,
+        )
+    ]
+
+
+def _blockchain_txs(spec: SyntheticOutputsSpec, swaps: pd.DataFrame) -> pd.DataFrame:
+    """Put the HTLCs of the submarine swaps in blocks.
+
+    The prepare HTLC of a swap is sent when the swap starts, and the claim HTLC
+    when the prepare is confirmed. The blocks are mined at exponential intervals,
+    of mean block_time, and include all the transactions sent before them. The
+    transactions sent after the last block are left in the mempool.
+    """
+    rng = np.random.default_rng([spec.seed, 2])
+    nb_blocks = 2 * spec.duration // spec.block_time + 1
+    block_times = np.cumsum(rng.exponential(spec.block_time, nb_blocks))
+    block_times = block_times[block_times < spec.duration]
+    # the time of the block of each height, and of the mempool
+    height_times = np.append(block_times, np.inf)
+
+    prepare_time = swaps["start_time"].to_numpy(dtype=np.float64) + rng.uniform(
+        0, 1, len(swaps)
+    )
+    prepare_block = np.searchsorted(block_times, prepare_time)
+    claim_time = height_times[prepare_block] + rng.uniform(0, 1000, len(swaps))
+    claim_block = np.searchsorted(block_times, claim_time)
+    txs: pd.DataFrame = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "tx_type": tx_type,
+                    "start_time": start_time,
+                    "block_height": block,
+                    "sender": swaps["sender"].to_numpy(),
+                    "receiver": swaps["receiver"].to_numpy(),
+                    "amount": swaps["amount"].to_numpy(),
+                }
+            )[np.isfinite(start_time)]
+            for tx_type, start_time, block in [
+                ("PREPARE_HTLC", prepare_time, prepare_block),
+                ("CLAIM_HTLC  ", claim_time, claim_block),
+            ]
+        ],
+        ignore_index=True,
+    ).sort_values(["block_height", "start_time"], kind="stable")
+    is_confirmed = txs["block_height"] < len(block_times)
+    txs["block_time"] = height_times[txs["block_height"].to_numpy()]
+    txs.loc[~is_confirmed, "block_height"] = -1
+    # the simulator writes the blocks, and then the mempool
+    return pd.concat([txs[is_confirmed], txs[~is_confirmed]])
+
+
+def write_synthetic_outputs(output_dir: Path, spec: SyntheticOutputsSpec) -> None:
+    """Write the synthetic outputs of spec in output_dir."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    network = _network(spec)
+
+    channels_df = _channels_df(spec, network)
+    for rank in range(spec.nb_ranks):
+        with (output_dir / f"channels_output_{rank}.csv").open("w") as f:
+            f.write(CHANNELS_HEADER + "\n")
+            channels_df[channels_df["rank"] == rank].drop(columns="rank").to_csv(
+                f, header=False, index=False
+            )
+
+    payments_files = [
+        (output_dir / f"payments_output_{rank}.csv").open("w")
+        for rank in range(spec.nb_ranks)
+    ]
+    swaps = []
+    try:
+        for f in payments_files:
+            f.write(PAYMENTS_HEADER + "\n")
+        for payments_df in _payments_chunks(spec, network):
+            swaps.append(
+                payments_df.loc[
+                    payments_df["type"] == SUBMARINE_SWAP,
+                    ["start_time", "sender", "receiver", "amount"],
+                ]
+            )
+            for rank, f in enumerate(payments_files):
+                payments_df[payments_df["rank"] == rank].drop(
+                    columns=["rank", "sender", "receiver"]
+                ).to_csv(f, header=False, index=False)
+    finally:
+        for f in payments_files:
+            f.close()
+
+    txs = _blockchain_txs(spec, pd.concat(swaps, ignore_index=True))
+    with (output_dir / "blockchain_output_0.csv").open("w") as f:
+        f.write(BLOCKCHAIN_HEADER + "\n")
+        f.writelines(_format_blockchain_rows(txs))
+
+    (output_dir / SPEC_FILE).write_text(
+        json.dumps(dataclasses.asdict(spec), indent=2) + "\n"
+    )
+
+
+def read_synthetic_outputs_spec(output_dir: Path) -> SyntheticOutputsSpec | None:
+    """Read the spec of the synthetic outputs in output_dir, None if missing."""
+    spec_file = output_dir / SPEC_FILE
+    if not spec_file.is_file():
+        return None
+    spec = json.loads(spec_file.read_text())
+    return SyntheticOutputsSpec(**spec | {"nations": tuple(spec["nations"])})
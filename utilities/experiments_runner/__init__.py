@@ -1,18 +1,52 @@
+import dataclasses
+import functools
 import hashlib
 import itertools
 import json
 import pathlib
+import queue
 import re
 import subprocess
+import threading
+import time
+import traceback
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from enum import Enum
 from typing import Literal, assert_never
 
-import numpy as np
 import pandas as pd
 
+from experiments_runner.archive import (
+    CLEANUP_POLICY,
+    CompressionFormat,
+    OutputArchiver,
+    OutputPolicy,
+    apply_output_policy,
+)
+from experiments_runner.metrics import directory_size, run_with_rusage
+from experiments_runner.results_store import (
+    RESULTS_CSV_FILE,
+    RESULTS_STORE_FILE,
+    ResultsStore,
+    SimulationState,
+)
 from plasma_network_generator.utils import fraction_format_str, nb_digits_after_comma
 from statistics_analyzer.commands.analyzer import Args as Statistics_analyzer_args
 from statistics_analyzer.commands.analyzer import _execute as statistics_analyze
+from statistics_analyzer.core import MILLISECONDS_IN_A_MINUTE, N_BATCHES
+from statistics_analyzer.results import (
+    CLOTH_OUTPUT_FILE,
+    EXPERIMENT_MANIFEST_FILE,
+    RUN_METRICS_FILE,
+    STATS_PER_MINUTE,
+    analysis_parameters,
+    simulation_results,
+    stats_per_minute_from_columns,
+)
+
+# How often the scheduler checks for new simulations while others are running
+INCOMING_POLL_INTERVAL_S = 1.0
 
 
 class RebalancingMode(Enum):
@@ -34,17 +68,8 @@ def select_rebalancing_mode(
 
 
 def cleanup_pcn_simulation(output_dir: pathlib.Path, simulation_log_file: str) -> None:
-    for f in output_dir.glob("node_logs_file_*.txt"):
-        f.unlink()
-    for f in output_dir.glob("edges_output_*.csv"):
-        f.unlink()
-    for f in output_dir.glob("nodes_output_*.csv"):
-        f.unlink()
-    for f in output_dir.glob("payments_output_*.csv"):
-        f.unlink()
-    for f in output_dir.glob("channels_output_*.csv"):
-        f.unlink()
-    (output_dir / simulation_log_file).unlink()
+    apply_output_policy(output_dir, CLEANUP_POLICY)
+    (output_dir / simulation_log_file).unlink(missing_ok=True)
 
     # Remove everything
     # shutil.rmtree(output_dir)
@@ -104,6 +129,67 @@ def compute_experiment_hash(
     return m.hexdigest()
 
 
+def _run_simulation_command(
+    command: str,
+    output_dir: pathlib.Path,
+    simulation_log_file: str,
+) -> dict[str, float]:
+    """Run mpirun, logging its output to simulation_log_file.
+
+    Returns the resources used by mpirun and its ranks.
+    """
+    with (output_dir / simulation_log_file).open(mode="w+") as logf:
+        start_time = time.perf_counter()
+        returncode, rusage, sampler = run_with_rusage(command, logf, logf)
+        wall_time = time.perf_counter() - start_time
+    if returncode != 0:
+        # the output of mpirun, including its stderr, is in the simulation log
+        print(
+            f"The simulation exited with return code {returncode}, "
+            f"see {output_dir / simulation_log_file}"
+        )
+        raise subprocess.CalledProcessError(returncode, command)
+
+    return {
+        "simulation_wall_time_s": wall_time,
+        "simulation_user_cpu_time_s": rusage.ru_utime,
+        "simulation_system_cpu_time_s": rusage.ru_stime,
+        # ru_maxrss is in KiB, and is the peak of the largest single process
+        "simulation_max_process_rss_bytes": rusage.ru_maxrss * 1024,
+        # sampled peak of the sum over mpirun and all its ranks
+        "simulation_peak_rss_bytes": sampler.peak_rss,
+        "simulation_peak_processes": sampler.peak_processes,
+    }
+
+
+def _update_run_metrics(output_dir: pathlib.Path, **metrics: float) -> dict:
+    """Add the given metrics to the run_metrics.json of a simulation.
+
+    The metrics of the phases run by a previous, interrupted sweep are kept.
+    """
+    run_metrics_file = output_dir / RUN_METRICS_FILE
+    run_metrics = (
+        json.loads(run_metrics_file.read_text()) if run_metrics_file.is_file() else {}
+    )
+    run_metrics |= metrics
+    tmp_file = run_metrics_file.with_name(run_metrics_file.name + ".tmp")
+    tmp_file.write_text(json.dumps(run_metrics, indent=4))
+    tmp_file.replace(run_metrics_file)
+    return run_metrics
+
+
+def _write_experiment_manifest(output_dir: pathlib.Path, experiment: dict) -> None:
+    """Write the experiment.json manifest of a simulation: its input parameters.
+
+    Unlike the simulation log, the manifest survives the cleanup, and lets a
+    simulation be found by its parameters without parsing the log.
+    """
+    manifest_file = output_dir / EXPERIMENT_MANIFEST_FILE
+    tmp_file = manifest_file.with_name(manifest_file.name + ".tmp")
+    tmp_file.write_text(json.dumps(experiment, indent=4))
+    tmp_file.replace(manifest_file)
+
+
 def run_pcn_simulation(
     cloth_root_dir: pathlib.Path,
     topologies_dir: pathlib.Path,
@@ -125,7 +211,28 @@ def run_pcn_simulation(
     num_processes: int,
     cleanup: bool,
     verbose: bool,
+    skip_simulation: bool = False,
+    skip_analysis: bool = False,
+    on_state_change: Callable[[SimulationState], None] | None = None,
+    output_policy: OutputPolicy | None = None,
+    archiver: OutputArchiver | None = None,
 ) -> dict:
+    """Run a simulation, analyze its output and build its results record.
+
+    When resuming an interrupted sweep, skip_simulation reuses the output of a
+    completed simulation, and skip_analysis also reuses its cloth_output.json.
+    on_state_change, if given, is called as the simulation progresses.
+
+    Once analysed, the simulator outputs are deleted or compressed according to
+    output_policy (by default, CLEANUP_POLICY if cleanup is set, otherwise they
+    are kept). The compressions are run in the background by archiver, if given.
+    cleanup also deletes the simulation log.
+    """
+
+    def set_state(state: SimulationState) -> None:
+        if on_state_change is not None:
+            on_state_change(state)
+
     # Calculate the input dir
     topologies_seed_dir = (topologies_dir / f"seed_{seed}").resolve()
     capacity_dir_name = f"capacity-{capacity}"
@@ -141,13 +248,39 @@ def run_pcn_simulation(
     tps_cfg_flag = tps_cfg is not None
     assert tps_flag + tps_cfg_flag == 1, "Specify exactly one of tps or tps_cfg"
 
-    # Create the output directory
+    # Create the output directory, with the manifest of the simulation inputs
     output_dir.mkdir(parents=True, exist_ok=True)
+    simulation_inputs = {
+        "block_congestion_rate": block_congestion_rate,
+        "block_size": block_size,
+        "seed": seed,
+        "capacity": capacity,
+        "num_processes": num_processes,
+        "simulation_end": simulation_end,
+        "tps": tps,
+        "tps_cfg": str(tps_cfg),
+        "submarine_swap_threshold": submarine_swap_threshold,
+        "waterfall": waterfall,
+        "reverse_waterfall": reverse_waterfall,
+        "submarine_swaps": submarine_swaps,
+        "use_known_path": use_known_path,
+        "sync": sync,
+    }
+    # the analysis parameters are recorded, so that the batch command of the
+    # statistics analyzer analyses the simulation again in the same way
+    manifest = simulation_inputs | {
+        "input_dir": str(input_dir),
+        "nb_batches": N_BATCHES,
+        "bucket_ms": MILLISECONDS_IN_A_MINUTE,
+    }
+    _write_experiment_manifest(output_dir, manifest)
 
-    # Prepare and execute the simulation command
+    # Prepare and execute the simulation command. The ranks are not bound to
+    # cores: mpirun would bind the ranks of every concurrent simulation (see
+    # schedule_pcn_simulations()) to the same cores, starting from core 0
     command = f"""
     cd {cloth_root_dir} && \
-    mpirun -np {num_processes} build/itcoin-pcn-simulator \\
+    mpirun -np {num_processes} --bind-to none build/itcoin-pcn-simulator \\
       --input-dir={input_dir} \\
       --output-dir={output_dir} \\
       --synch={sync} --extramem=400000 \\
@@ -161,98 +294,266 @@ def run_pcn_simulation(
       --submarine-swap-threshold={submarine_swap_threshold}
     """
     verbose and print(command)
-    try:
-        with (output_dir / simulation_log_file).open(mode="w+") as logf:
-            subprocess.run(
-                command, shell=True, check=True, stdout=logf, stderr=logf, text=True
-            )
-    except subprocess.CalledProcessError as e:
-        print("An error occurred while executing the script:", e.stderr)
+
+    if not skip_simulation:
+        set_state(SimulationState.SIMULATING)
+        simulation_metrics = _run_simulation_command(
+            command, output_dir, simulation_log_file
+        )
+        _update_run_metrics(
+            output_dir, **simulation_metrics, output_bytes=directory_size(output_dir)
+        )
+        set_state(SimulationState.SIMULATED)
 
     # Analyze results
-    stat_analyzer_args = Statistics_analyzer_args(
-        input_dir=output_dir,
-        output_dir=output_dir,
-        verbose=False,
-        rank_idx=None,
-    )
-    statistics_analyze(stat_analyzer_args)
+    if not skip_analysis:
+        stat_analyzer_args = Statistics_analyzer_args(
+            input_dir=output_dir,
+            output_dir=output_dir,
+            verbose=False,
+            rank_idx=None,
+            **analysis_parameters(manifest),
+        )
+        start_time, start_cpu_time = time.perf_counter(), time.thread_time()
+        statistics_analyze(stat_analyzer_args)
+        _update_run_metrics(
+            output_dir,
+            analysis_wall_time_s=time.perf_counter() - start_time,
+            analysis_cpu_time_s=time.thread_time() - start_cpu_time,
+        )
+        set_state(SimulationState.ANALYSED)
 
     # Create simulation results record
-    cloth_output_file = (output_dir / "cloth_output.json").resolve()
+    cloth_output_file = (output_dir / CLOTH_OUTPUT_FILE).resolve()
     with cloth_output_file.open(mode="r") as f:
         cloth_output = json.load(f)
 
-    DAILY_LIQUDITY_COST = 0.0001271488302
-    SUBMARINE_SWAP_COST = 0.10 * 2
-    cost_wholesale_liquidity = (
-        DAILY_LIQUDITY_COST * float(cloth_output["TotalWholeSaleCapacity"]) / 100
+    simulation_result = simulation_inputs | simulation_results(cloth_output)
+
+    # Cleanup and compression
+    start_time = time.perf_counter()
+    if output_policy is None and cleanup:
+        output_policy = CLEANUP_POLICY
+    if output_policy is not None:
+        apply_output_policy(output_dir, output_policy, archiver)
+    if cleanup:
+        (output_dir / simulation_log_file).unlink(missing_ok=True)
+
+    # Resource usage
+    run_metrics = _update_run_metrics(
+        output_dir, cleanup_wall_time_s=time.perf_counter() - start_time
     )
-    cost_submarine_swaps = SUBMARINE_SWAP_COST * (
-        float(cloth_output["TotalSubmarineSwaps1<>2"])
-        + float(cloth_output["TotalSubmarineSwaps2<>2"])
+    simulation_result |= run_metrics
+
+    return simulation_result
+
+
+def list_topology_capacities(topologies_seed_dir: pathlib.Path) -> list[float]:
+    """List the capacity fractions of the capacity-<fraction> topologies of a seed."""
+    return sorted(topology_capacity_names(topologies_seed_dir))
+
+
+def topology_capacity_names(topologies_seed_dir: pathlib.Path) -> dict[float, str]:
+    """Map the capacity fractions of the topologies of a seed to their <fraction> name.
+
+    The names are usually formatted with the same number of digits, but the
+    topology cache of generate_all.py keeps the existing directories when
+    capacity fractions with more digits are added.
+    """
+    capacity_names: dict[float, str] = {}
+    for f in topologies_seed_dir.iterdir():
+        if not f.is_dir():
+            continue
+        match = re.search(
+            r"capacity-([0-9]*\.[0-9]*)",
+            f.name,
+            re.IGNORECASE,
+        )
+        if match is None:
+            continue
+        capacity_names[float(match.group(1))] = match.group(1)
+    return capacity_names
+
+
+def format_capacity(capacity: float, capacity_names: dict[float, str]) -> str:
+    """Format a capacity fraction as the name of its topology directory.
+
+    The name is the one of the existing directory, so that the experiment hashes
+    computed from it do not change when topologies with more digits are added.
+    Missing capacities are formatted with the largest number of digits.
+    """
+    if capacity in capacity_names:
+        return capacity_names[capacity]
+    max_nb_digits = max(map(nb_digits_after_comma, capacity_names), default=0)
+    return fraction_format_str(capacity, max_nb_digits)
+
+
+def _legacy_result(row: pd.Series) -> dict:
+    """Turn a row of a legacy results.csv into a simulation results record."""
+    result = row.to_dict()
+    result[STATS_PER_MINUTE] = stats_per_minute_from_columns(result)
+    return result
+
+
+def _legacy_result_key(
+    row: pd.Series, capacity_names: dict[float, str]
+) -> tuple[str, int]:
+    """Compute the (experiment_hash, seed) key of a row of a legacy results.csv.
+
+    The parameters are converted back to the types they are given with to
+    compute_experiment_hash() by run_all_simulations().
+    """
+    rebalancing_modes: dict[tuple[int, int, int], RebalancingMode] = {
+        select_rebalancing_mode(mode): mode for mode in RebalancingMode
+    }
+    rebalancing_mode = rebalancing_modes[
+        (
+            int(row["waterfall"]),
+            int(row["reverse_waterfall"]),
+            int(row["submarine_swaps"]),
+        )
+    ]
+    tps = None if pd.isna(row["tps"]) else int(row["tps"])
+    tps_cfg = (
+        None
+        if pd.isna(row["tps_cfg"]) or row["tps_cfg"] == "None"
+        else pathlib.Path(row["tps_cfg"])
     )
+    experiment_hash = compute_experiment_hash(
+        row["block_congestion_rate"],
+        int(row["block_size"]),
+        format_capacity(float(row["capacity"]), capacity_names),
+        int(row["num_processes"]),
+        int(row["simulation_end"]),
+        row["submarine_swap_threshold"],
+        rebalancing_mode,
+        1 if int(row["use_known_path"]) else 0,
+        row["sync"],
+        tps,
+        tps_cfg,
+    )
+    return experiment_hash, int(row["seed"])
 
-    simulation_result = {
-        # Simulation inputs
-        "block_congestion_rate": block_congestion_rate,
-        "block_size": block_size,
-        "seed": seed,
-        "capacity": capacity,
-        "num_processes": num_processes,
-        "simulation_end": simulation_end,
-        "tps": tps,
-        "tps_cfg": str(tps_cfg),
-        "submarine_swap_threshold": submarine_swap_threshold,
-        "waterfall": waterfall,
-        "reverse_waterfall": reverse_waterfall,
-        "submarine_swaps": submarine_swaps,
-        "use_known_path": use_known_path,
-        "sync": sync,
-        # Simulation results
-        "success": float(str(cloth_output["Success"]["Mean"])[:6]),
-        "fail_no_path": cloth_output["FailNoPath"]["Mean"],
-        "fail_no_balance": cloth_output["FailNoBalance"]["Mean"],
-        "fail_offline_node": cloth_output["FailOfflineNode"]["Mean"],
-        "fail_timeout_expired": cloth_output["FailTimeoutExpired"]["Mean"],
-        "time": cloth_output["Time"]["Mean"],
-        "attempts": cloth_output["Attempts"]["Mean"],
-        "route_length": cloth_output["RouteLength"]["Mean"],
-        "wholesale_capacity": float(cloth_output["TotalWholeSaleCapacity"]) / 100,
-        "total_success_volume": cloth_output["TotalSuccessVolume"],
-        "volume_capacity_ratio": cloth_output["VolumeCapacityRatio"],
-        "total_payments": cloth_output["TotalPayments"],
-        "total_deposits": cloth_output["TotalDeposits"],
-        "total_withdrawals": cloth_output["TotalWithdrawals"],
-        "route_length_distr": json.dumps(cloth_output["RouteLengthDistr"]),
-        "transactions_per_minute": json.dumps(cloth_output["TransactionsPerMinute"]),
-        "success_per_minute": json.dumps(cloth_output["SuccessPerMinute"]),
-        "deposits_per_minute": json.dumps(cloth_output["DepositsPerMinute"]),
-        "withdrawals_per_minute": json.dumps(cloth_output["WithdrawalsPerMinute"]),
-        "submarine_swaps_per_minute": json.dumps(
-            cloth_output["SubmarineSwapsPerMinute"]
-        ),
-        "mean_submarine_swaps_per_minute": np.mean(
-            np.array(
-                list(cloth_output["SubmarineSwapsPerMinute"].values()), dtype=float
+
+def schedule_pcn_simulations(
+    simulations: list[tuple[str, dict]],
+    max_cores: int | None,
+    incoming: queue.Queue | None = None,
+) -> Iterator[tuple[str, dict, dict | None, BaseException | None]]:
+    """Run the given simulations concurrently, within a budget of cores.
+
+    Each simulation is a (simulation_string, run_pcn_simulation kwargs) pair, and
+    takes num_processes cores. Pending simulations are started largest first, as
+    soon as enough cores are free; a simulation larger than the whole budget is
+    run alone. If max_cores is None, the simulations are run one at a time.
+
+    If incoming is given, more lists of simulations can be put in it while the
+    others run, until None is put: they are scheduled together with the pending
+    ones.
+
+    Yields (simulation_string, kwargs, result, error) tuples as the simulations
+    complete: exactly one between result and error is None.
+    """
+
+    def needed_cores(kwargs: dict) -> int:
+        num_processes = int(kwargs["num_processes"])
+        return num_processes if max_cores is None else min(num_processes, max_cores)
+
+    pending = list(simulations)
+    running: dict[Future, tuple[str, dict]] = {}
+    free_cores = max_cores
+    with ThreadPoolExecutor(max_workers=max_cores or 1) as executor:
+        while pending or running or incoming is not None:
+            while incoming is not None:
+                try:
+                    # only wait for new simulations if there is nothing to run
+                    new_simulations = incoming.get(block=not (pending or running))
+                except queue.Empty:
+                    break
+                if new_simulations is None:
+                    incoming = None
+                else:
+                    pending.extend(new_simulations)
+            if max_cores is not None:
+                pending.sort(key=lambda s: s[1]["num_processes"], reverse=True)
+
+            for simulation in list(pending):
+                simulation_string, kwargs = simulation
+                if max_cores is None and running:
+                    break
+                if free_cores is not None and needed_cores(kwargs) > free_cores:
+                    continue
+                pending.remove(simulation)
+                if free_cores is not None:
+                    free_cores -= needed_cores(kwargs)
+                print(f"Running {simulation_string}")
+                future = executor.submit(run_pcn_simulation, **kwargs)
+                running[future] = simulation
+
+            if not running:
+                continue
+            done, _ = wait(
+                running,
+                timeout=INCOMING_POLL_INTERVAL_S if incoming is not None else None,
+                return_when=FIRST_COMPLETED,
             )
-        ),
-        "cost_submarine_swaps": cost_submarine_swaps,
-        "cost_wholesale_liquidity": cost_wholesale_liquidity,
-        "total_cost": cost_wholesale_liquidity + cost_submarine_swaps,
-    }
+            for future in done:
+                simulation_string, kwargs = running.pop(future)
+                if free_cores is not None:
+                    free_cores += needed_cores(kwargs)
+                error = future.exception()
+                result = None if error is not None else future.result()
+                yield simulation_string, kwargs, result, error
 
-    # Cleanup
-    if cleanup:
-        cleanup_pcn_simulation(output_dir, simulation_log_file)
 
-    return simulation_result
+@dataclasses.dataclass
+class _Sweep:
+    """The results directory of a sweep, with its store, archiver and failures."""
 
+    results_dir: pathlib.Path
+    store: ResultsStore
+    archiver: OutputArchiver
+    failures: list[dict[str, str]] = dataclasses.field(default_factory=list)
 
-def run_all_simulations(
+
+def _open_sweep(
+    results_dir: pathlib.Path,
+    capacity_names: dict[float, str],
+    compression: CompressionFormat,
+) -> _Sweep:
+    """Open the store of the existing experiments, importing a legacy results.csv."""
+    results_file = results_dir / RESULTS_CSV_FILE
+    store = ResultsStore(results_dir / RESULTS_STORE_FILE)
+    if len(store) == 0 and results_file.is_file():
+        legacy_results = pd.read_csv(results_file)
+        store.add_many(
+            [
+                (*_legacy_result_key(row, capacity_names), _legacy_result(row))
+                for _, row in legacy_results.iterrows()
+            ]
+        )
+        print(f"Imported {len(legacy_results)} results from {results_file}")
+    return _Sweep(results_dir, store, OutputArchiver(compression))
+
+
+def _close_sweep(sweep: _Sweep) -> pd.DataFrame:
+    """Export the results of a sweep and list its failures."""
+    sweep.store.export_csv(sweep.results_dir / RESULTS_CSV_FILE)
+    results = sweep.store.to_dataframe()
+
+    failures_file = sweep.results_dir / "failed_simulations.csv"
+    failures_file.unlink(missing_ok=True)
+    if sweep.failures:
+        pd.DataFrame(sweep.failures).to_csv(failures_file, index=False)
+        print(f"{len(sweep.failures)} simulations failed, see {failures_file}")
+    return results
+
+
+def _sweep_simulations(
+    sweep: _Sweep,
+    capacity_names: dict[float, str],
     cloth_root_dir: pathlib.Path,
     topologies_dir: pathlib.Path,
-    results_dir: pathlib.Path,
     block_congestion_rates: float | list[float],
     block_sizes: int | list[int],
     capacities: float | list[float],
@@ -266,18 +567,9 @@ def run_all_simulations(
     tpss: int | list[int] | None,
     tps_cfgs: pathlib.Path | list[pathlib.Path] | None,
     cleanup: bool,
-) -> pd.DataFrame:
-    """Simulation results are placed in the following directory structure:
-        <results_dir> / <experiment_parameters_hash> / seed_<seed>
-
-    Where experiment_parameters_hash is computed via compute_experiment_hash().
-    """
-    # Read existing experiments
-    results = pd.DataFrame()
-    results_file = results_dir / "results.csv"
-    if results_file.is_file():
-        results = pd.read_csv(results_file)
-
+    output_policy: OutputPolicy | None,
+) -> list[tuple[str, dict]]:
+    """Get the (simulation_string, run_pcn_simulation kwargs) of a sweep to be run."""
     block_congestion_rates = (
         block_congestion_rates
         if isinstance(block_congestion_rates, list)
@@ -320,52 +612,46 @@ def run_all_simulations(
         else [tps_cfgs]
     )
 
-    # Calculate the max_nb_digits in topologies_dir
-    a_seed = seeds[0]
-    a_topologies_seed_dir = topologies_dir / f"seed_{a_seed}"
-    capacities_in_a_topologies_seed_dir: list[float] = []
-    for f in a_topologies_seed_dir.iterdir():
-        if not f.is_dir():
-            continue
-        match = re.search(
-            r"capacity-([0-9]*\.[0-9]*)",
-            f.name,
-            re.IGNORECASE,
-        )
-        if match is None:
-            continue
-        capacities_in_a_topologies_seed_dir.append(float(match.group(1)))
-    max_nb_digits = max(map(nb_digits_after_comma, capacities_in_a_topologies_seed_dir))
-    capacities_formatted = [
-        fraction_format_str(cap, max_nb_digits) for cap in capacities
-    ]
+    capacities_formatted = [format_capacity(cap, capacity_names) for cap in capacities]
+    store = sweep.store
 
+    simulations: list[tuple[str, dict]] = []
+    # itertools.product() is typed for at most 6 iterables: the product of two
+    # products of 6 iterables is the same sequence, with typed items
     for (
-        block_congestion_rate,
-        block_size,
-        capacity,
-        num_processes,
-        seed,
-        simulation_end,
-        submarine_swap_threshold,
-        rebalancing_mode,
-        use_known_path,
-        sync,
-        tps,
-        tps_cfg,
+        (
+            block_congestion_rate,
+            block_size,
+            capacity,
+            num_processes,
+            seed,
+            simulation_end,
+        ),
+        (
+            submarine_swap_threshold,
+            rebalancing_mode,
+            use_known_path,
+            sync,
+            tps,
+            tps_cfg,
+        ),
     ) in itertools.product(
-        block_congestion_rates,
-        block_sizes,
-        capacities_formatted,
-        num_processess,
-        seeds,
-        simulation_ends,
-        submarine_swap_thresholds,
-        rebalancing,
-        use_known_paths,
-        syncs,
-        tpss_iterable,
-        tps_cfgs_iterable,
+        itertools.product(
+            block_congestion_rates,
+            block_sizes,
+            capacities_formatted,
+            num_processess,
+            seeds,
+            simulation_ends,
+        ),
+        itertools.product(
+            submarine_swap_thresholds,
+            rebalancing,
+            use_known_paths,
+            syncs,
+            tpss_iterable,
+            tps_cfgs_iterable,
+        ),
     ):
         # Define the simulation string
         simulation_string = f"{block_congestion_rate=}, {block_size=}, {capacity=}, {num_processes=}, {seed=}, {simulation_end=}, {submarine_swap_threshold=}, {rebalancing_mode.value=}, {use_known_path=}, {tps=}, {tps_cfg=}, {sync=}"
@@ -374,29 +660,6 @@ def run_all_simulations(
             rebalancing_mode
         )
 
-        if (not results.empty) and (
-            (results["block_congestion_rate"] == block_congestion_rate)
-            & (results["block_size"] == block_size)
-            & (results["capacity"] == float(capacity))
-            & (results["num_processes"] == num_processes)
-            & (results["seed"] == seed)
-            & (results["simulation_end"] == simulation_end)
-            & (results["submarine_swap_threshold"] == submarine_swap_threshold)
-            & (results["waterfall"] == waterfall)
-            & (results["reverse_waterfall"] == reverse_waterfall)
-            & (results["submarine_swaps"] == submarine_swaps)
-            & (results["use_known_path"] == use_known_path)
-            & (
-                (results["tps_cfg"] == tps_cfg)
-                if tps_cfg is not None
-                else (results["tps"] == tps)
-            )
-            & (results["sync"] == sync)
-        ).any():
-            print(f"Skipping {simulation_string}")
-            continue
-        print(f"Running {simulation_string}")
-
         experiment_hash = compute_experiment_hash(
             block_congestion_rate,
             block_size,
@@ -410,33 +673,208 @@ def run_all_simulations(
             tps,
             tps_cfg,
         )
+        if (experiment_hash, seed) in store:
+            print(f"Skipping {simulation_string}")
+            continue
+
+        # Resume the simulations interrupted by a previous sweep: the completed
+        # ones are only re-analysed, the in-flight ones are run again
+        state = store.get_state(experiment_hash, seed)
+        skip_simulation = state in (SimulationState.SIMULATED, SimulationState.ANALYSED)
+        skip_analysis = state == SimulationState.ANALYSED
+        if skip_simulation and state is not None:
+            print(f"Resuming {state.value} {simulation_string}")
+        elif state == SimulationState.SIMULATING:
+            print(f"Retrying interrupted {simulation_string}")
+        if not skip_simulation:
+            store.set_state(experiment_hash, seed, SimulationState.QUEUED)
+
         simulation_log_file = "simulation_log.txt"
-        simulation_result = run_pcn_simulation(
-            cloth_root_dir=cloth_root_dir,
-            topologies_dir=topologies_dir,
-            results_dir=results_dir / experiment_hash,
-            seed=seed,
-            capacity=capacity,
-            simulation_end=simulation_end,
-            tps=tps,
-            tps_cfg=tps_cfg,
-            block_size=block_size,
-            block_congestion_rate=block_congestion_rate,
-            submarine_swap_threshold=submarine_swap_threshold,
-            waterfall=waterfall,
-            reverse_waterfall=reverse_waterfall,
-            submarine_swaps=submarine_swaps,
-            use_known_path=use_known_path,
-            simulation_log_file=simulation_log_file,
-            sync=sync,
-            num_processes=num_processes,
-            cleanup=cleanup,
-            verbose=False,
+        simulations.append(
+            (
+                simulation_string,
+                {
+                    "cloth_root_dir": cloth_root_dir,
+                    "topologies_dir": topologies_dir,
+                    "results_dir": sweep.results_dir / experiment_hash,
+                    "seed": seed,
+                    "capacity": capacity,
+                    "simulation_end": simulation_end,
+                    "tps": tps,
+                    "tps_cfg": tps_cfg,
+                    "block_size": block_size,
+                    "block_congestion_rate": block_congestion_rate,
+                    "submarine_swap_threshold": submarine_swap_threshold,
+                    "waterfall": waterfall,
+                    "reverse_waterfall": reverse_waterfall,
+                    "submarine_swaps": submarine_swaps,
+                    "use_known_path": use_known_path,
+                    "simulation_log_file": simulation_log_file,
+                    "sync": sync,
+                    "num_processes": num_processes,
+                    "cleanup": cleanup,
+                    "verbose": False,
+                    "skip_simulation": skip_simulation,
+                    "skip_analysis": skip_analysis,
+                    "on_state_change": functools.partial(
+                        store.set_state, experiment_hash, seed
+                    ),
+                    "output_policy": output_policy,
+                    "archiver": sweep.archiver,
+                },
+            )
         )
 
-        results = pd.concat(
-            [results, pd.DataFrame([simulation_result])], ignore_index=True
-        )
-        results.to_csv(results_file, index=False)
+    return simulations
+
+
+def run_simulation_sweeps(
+    sweeps: Iterable[dict],
+    max_cores: int | None = None,
+    compression: CompressionFormat = CompressionFormat.GZIP,
+) -> dict[pathlib.Path, pd.DataFrame]:
+    """Run several sweeps, sharing a budget of cores between their simulations.
 
+    Each sweep is a dict of the arguments of run_all_simulations(), but
+    max_cores and compression. The sweeps are consumed by a background thread,
+    and the simulations of each one are scheduled as soon as it is produced,
+    together with those already pending: sweeps can be a generator that waits,
+    e.g., for the topologies of the sweep to be generated. The sweeps with the
+    same results_dir share its results store.
+
+    Returns the results of each results_dir. See run_all_simulations() for the
+    files written to each results_dir.
+    """
+    opened_sweeps: dict[pathlib.Path, _Sweep] = {}
+    incoming: queue.Queue = queue.Queue()
+    feed_errors: list[BaseException] = []
+
+    def feed_simulations() -> None:
+        try:
+            for sweep_args in sweeps:
+                results_dir = sweep_args["results_dir"]
+                seeds = sweep_args["seeds"]
+                capacity_names = topology_capacity_names(
+                    sweep_args["topologies_dir"]
+                    / f"seed_{seeds[0] if isinstance(seeds, list) else seeds}"
+                )
+                if results_dir not in opened_sweeps:
+                    opened_sweeps[results_dir] = _open_sweep(
+                        results_dir, capacity_names, compression
+                    )
+                sweep_args = {k: v for k, v in sweep_args.items() if k != "results_dir"}
+                incoming.put(
+                    _sweep_simulations(
+                        opened_sweeps[results_dir], capacity_names, **sweep_args
+                    )
+                )
+        except BaseException as e:
+            feed_errors.append(e)
+        finally:
+            incoming.put(None)
+
+    feeder = threading.Thread(target=feed_simulations, daemon=True)
+    feeder.start()
+    try:
+        for (
+            simulation_string,
+            kwargs,
+            simulation_result,
+            error,
+        ) in schedule_pcn_simulations([], max_cores, incoming):
+            # the results_dir of a simulation is <results_dir> / <experiment_hash>
+            sweep = opened_sweeps[kwargs["results_dir"].parent]
+            if simulation_result is None:
+                print(f"Failed {simulation_string}:")
+                traceback.print_exception(error)
+                sweep.failures.append(
+                    {
+                        "simulation": simulation_string,
+                        "output_dir": str(
+                            kwargs["results_dir"] / f"seed_{kwargs['seed']}"
+                        ),
+                        "error": repr(error),
+                    }
+                )
+                continue
+            print(f"Completed {simulation_string}")
+            sweep.store.add(
+                kwargs["results_dir"].name, kwargs["seed"], simulation_result
+            )
+        feeder.join()
+    finally:
+        # Export the results, also when the sweeps are interrupted
+        results = {}
+        for results_dir, sweep in list(opened_sweeps.items()):
+            with sweep.store, sweep.archiver:
+                results[results_dir] = _close_sweep(sweep)
+    if feed_errors:
+        raise feed_errors[0]
     return results
+
+
+def run_all_simulations(
+    cloth_root_dir: pathlib.Path,
+    topologies_dir: pathlib.Path,
+    results_dir: pathlib.Path,
+    block_congestion_rates: float | list[float],
+    block_sizes: int | list[int],
+    capacities: float | list[float],
+    num_processess: int | list[int],
+    seeds: int | list[int],
+    simulation_ends: int | list[int],
+    submarine_swap_thresholds: float | list[float],
+    rebalancing: RebalancingMode | list[RebalancingMode],
+    use_known_paths: Literal[0, 1] | list[Literal[0, 1]],
+    syncs: int | list[int],
+    tpss: int | list[int] | None,
+    tps_cfgs: pathlib.Path | list[pathlib.Path] | None,
+    cleanup: bool,
+    max_cores: int | None = None,
+    output_policy: OutputPolicy | None = None,
+    compression: CompressionFormat = CompressionFormat.GZIP,
+) -> pd.DataFrame:
+    """Simulation results are placed in the following directory structure:
+        <results_dir> / <experiment_parameters_hash> / seed_<seed>
+
+    Where experiment_parameters_hash is computed via compute_experiment_hash().
+    Each simulation keeps its own log and cloth_output.json in that directory.
+
+    If max_cores is set, several simulations are run at once, using at most
+    max_cores MPI ranks in total (see schedule_pcn_simulations()). A failed
+    simulation does not stop the others: the failures are listed at the end and
+    written to <results_dir> / failed_simulations.csv.
+
+    The results are stored in <results_dir> / results.sqlite (see ResultsStore),
+    and exported to <results_dir> / results.csv at the end of the sweep. The
+    store also journals the state of each simulation: when a sweep is run again
+    after an interruption, the simulations that completed are only re-analysed,
+    and those that were in flight are run again.
+
+    The outputs of each simulation are deleted or compressed according to
+    output_policy (see run_pcn_simulation()). The compressions run in a
+    background thread pool while the next simulations run, and the sweep waits
+    for them before returning.
+
+    To run several sweeps at once, see run_simulation_sweeps().
+    """
+    sweep = {
+        "cloth_root_dir": cloth_root_dir,
+        "topologies_dir": topologies_dir,
+        "results_dir": results_dir,
+        "block_congestion_rates": block_congestion_rates,
+        "block_sizes": block_sizes,
+        "capacities": capacities,
+        "num_processess": num_processess,
+        "seeds": seeds,
+        "simulation_ends": simulation_ends,
+        "submarine_swap_thresholds": submarine_swap_thresholds,
+        "rebalancing": rebalancing,
+        "use_known_paths": use_known_paths,
+        "syncs": syncs,
+        "tpss": tpss,
+        "tps_cfgs": tps_cfgs,
+        "cleanup": cleanup,
+        "output_policy": output_policy,
+    }
+    return run_simulation_sweeps([sweep], max_cores, compression)[results_dir]
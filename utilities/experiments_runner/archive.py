@@ -0,0 +1,156 @@
+import gzip
+import io
+import pathlib
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+
+CHUNK_SIZE = 1 << 20
+# The level of compress.sh
+GZIP_LEVEL = 8
+ZSTD_LEVEL = 3
+DEFAULT_COMPRESSION_WORKERS = 4
+
+
+class OutputKind(Enum):
+    """The simulator output files of a simulation, by file name pattern."""
+
+    PAYMENTS = "payments_output_*.csv"
+    CHANNELS = "channels_output_*.csv"
+    EDGES = "edges_output_*.csv"
+    NODES = "nodes_output_*.csv"
+    BLOCKCHAIN = "blockchain_output_*.csv"
+    NODE_LOGS = "node_logs_file_*.txt"
+
+
+class OutputAction(Enum):
+    KEEP = "Keep"
+    COMPRESS = "Compress"
+    DELETE = "Delete"
+
+
+class CompressionFormat(Enum):
+    GZIP = ".gz"
+    ZSTD = ".zst"
+
+
+# What to do with each kind of simulator output once the simulation is analysed.
+# The kinds not in the policy are kept.
+OutputPolicy = dict[OutputKind, OutputAction]
+
+# The outputs deleted by cleanup_pcn_simulation()
+CLEANUP_POLICY: OutputPolicy = {
+    OutputKind.PAYMENTS: OutputAction.DELETE,
+    OutputKind.CHANNELS: OutputAction.DELETE,
+    OutputKind.EDGES: OutputAction.DELETE,
+    OutputKind.NODES: OutputAction.DELETE,
+    OutputKind.NODE_LOGS: OutputAction.DELETE,
+}
+
+# Compress all the csv outputs, as compress.sh does
+COMPRESS_CSV_POLICY: OutputPolicy = {
+    kind: OutputAction.COMPRESS for kind in OutputKind if kind != OutputKind.NODE_LOGS
+}
+
+
+def _open_compressor(
+    path: pathlib.Path, compression: CompressionFormat
+) -> io.BufferedIOBase:
+    if compression == CompressionFormat.GZIP:
+        return gzip.open(path, "wb", compresslevel=GZIP_LEVEL)
+    try:
+        import zstandard
+    except ImportError:
+        msg = f"compressing {path} requires the 'zstandard' package (poetry install --extras zstd)"
+        raise ModuleNotFoundError(msg) from None
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    writer: io.BufferedIOBase = compressor.stream_writer(path.open("wb"))
+    return writer
+
+
+def compress_file(
+    path: pathlib.Path, compression: CompressionFormat = CompressionFormat.GZIP
+) -> pathlib.Path:
+    """Compress a file to <path><suffix> and remove it.
+
+    The file is compressed in chunks, to a temporary file renamed at the end, so
+    that an interrupted compression never leaves a truncated archive. zlib and
+    zstd release the GIL while compressing, so several files can be compressed
+    in parallel by a thread pool.
+    """
+    compressed_path = path.with_name(path.name + compression.value)
+    tmp_path = compressed_path.with_name(compressed_path.name + ".tmp")
+    with path.open("rb") as source, _open_compressor(tmp_path, compression) as sink:
+        shutil.copyfileobj(source, sink, CHUNK_SIZE)
+    # as gzip does, keep the modification time, which tells whether the analysis
+    # of the file is up to date
+    shutil.copystat(path, tmp_path)
+    tmp_path.replace(compressed_path)
+    path.unlink()
+    return compressed_path
+
+
+class OutputArchiver:
+    """Compress simulation outputs in a background thread pool.
+
+    This lets the next simulation run while the outputs of the previous ones are
+    being compressed. close() (or leaving the context) waits for all the
+    compressions, and returns their errors.
+    """
+
+    def __init__(
+        self,
+        compression: CompressionFormat = CompressionFormat.GZIP,
+        max_workers: int = DEFAULT_COMPRESSION_WORKERS,
+    ) -> None:
+        self.compression = compression
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="compress"
+        )
+        self._lock = threading.Lock()
+        self._futures: list[Future] = []
+
+    def submit(self, path: pathlib.Path) -> Future:
+        future = self._executor.submit(compress_file, path, self.compression)
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def close(self) -> list[BaseException]:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            errors = [
+                error for f in self._futures if (error := f.exception()) is not None
+            ]
+            self._futures.clear()
+        return errors
+
+    def __enter__(self) -> "OutputArchiver":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        for error in self.close():
+            print(f"Compression failed with error: {error}")
+
+
+def apply_output_policy(
+    output_dir: pathlib.Path,
+    policy: OutputPolicy,
+    archiver: OutputArchiver | None = None,
+    compression: CompressionFormat = CompressionFormat.GZIP,
+) -> None:
+    """Delete or compress the simulator outputs in output_dir, according to policy.
+
+    The files are compressed in the background by archiver if given, or right
+    away in the given format otherwise.
+    """
+    for kind, action in policy.items():
+        for f in sorted(output_dir.glob(kind.value)):
+            if action == OutputAction.DELETE:
+                f.unlink()
+            elif action == OutputAction.COMPRESS:
+                if archiver is not None:
+                    archiver.submit(f)
+                else:
+                    compress_file(f, compression)
@@ -0,0 +1,186 @@
+import math
+import pathlib
+from collections.abc import Callable
+from enum import Enum
+from typing import Literal
+
+import numpy as np
+
+from experiments_runner import (
+    RebalancingMode,
+    compute_experiment_hash,
+    format_capacity,
+    run_all_simulations,
+    topology_capacity_names,
+)
+from experiments_runner.results_store import RESULTS_STORE_FILE, ResultsStore
+
+GOLDEN_RATIO_CONJUGATE = (math.sqrt(5) - 1) / 2
+
+
+class CapacitySearchGoal(Enum):
+    # smallest capacity whose metric is at least the target (e.g. success >= 0.95),
+    # assuming the metric increases with the capacity
+    AT_LEAST = "AtLeast"
+    # smallest capacity whose metric is at most the target (e.g. fail_no_balance
+    # <= 0.01), assuming the metric decreases with the capacity
+    AT_MOST = "AtMost"
+    # capacity minimizing the metric (e.g. total_cost), assuming the metric is
+    # unimodal in the capacity
+    MINIMUM = "Minimum"
+
+
+def search_capacity(
+    cloth_root_dir: pathlib.Path,
+    topologies_dir: pathlib.Path,
+    results_dir: pathlib.Path,
+    metric: str,
+    goal: CapacitySearchGoal,
+    target: float | None,
+    capacity_interval: tuple[float, float],
+    seeds: list[int],
+    block_congestion_rate: float,
+    block_size: int,
+    num_processes: int,
+    simulation_end: int,
+    submarine_swap_threshold: float,
+    rebalancing_mode: RebalancingMode,
+    use_known_path: Literal[0, 1],
+    sync: int,
+    tps: int | None,
+    tps_cfg: pathlib.Path | None,
+    cleanup: bool,
+    max_cores: int | None = None,
+) -> tuple[float | None, dict[float, float]]:
+    """Search the capacity fraction meeting a goal on a metric of the results.
+
+    Instead of simulating the whole grid of capacities, the capacities are
+    bisected (AT_LEAST, AT_MOST goals) or golden-section searched (MINIMUM goal),
+    among the capacity-<fraction> topologies of the first seed within
+    capacity_interval. Each capacity is evaluated as the mean of the metric (a
+    column of the results, e.g. "success" or "total_cost") over the seeds, by
+    running the missing simulations via run_all_simulations(): the results end up
+    in results_dir as for a regular sweep, and are reused by later searches.
+    There is no command line for the search: it is meant to be called by the
+    experiment scripts, once the topologies of the seeds have been generated.
+
+    Returns the capacity meeting the goal (None if no capacity reaches the
+    target), and the mean metric of every evaluated capacity. Raises a
+    RuntimeError if no simulation of an evaluated capacity succeeded.
+    """
+    if goal != CapacitySearchGoal.MINIMUM and target is None:
+        msg = f"A target is needed for the {goal.value} goal"
+        raise ValueError(msg)
+    target_value = math.nan if target is None else target
+
+    capacity_names = topology_capacity_names(topologies_dir / f"seed_{seeds[0]}")
+    low, high = capacity_interval
+    capacities = sorted(cap for cap in capacity_names if low <= cap <= high)
+    if not capacities:
+        msg = f"No capacity-<fraction> topologies in the interval [{low}, {high}]"
+        raise ValueError(msg)
+
+    evaluated: dict[float, float] = {}
+
+    def evaluate(index: int) -> float:
+        capacity = capacities[index]
+        if capacity in evaluated:
+            return evaluated[capacity]
+        run_all_simulations(
+            cloth_root_dir=cloth_root_dir,
+            topologies_dir=topologies_dir,
+            results_dir=results_dir,
+            block_congestion_rates=block_congestion_rate,
+            block_sizes=block_size,
+            capacities=capacity,
+            num_processess=num_processes,
+            seeds=seeds,
+            simulation_ends=simulation_end,
+            submarine_swap_thresholds=submarine_swap_threshold,
+            rebalancing=rebalancing_mode,
+            use_known_paths=use_known_path,
+            syncs=sync,
+            tpss=tps,
+            tps_cfgs=tps_cfg,
+            cleanup=cleanup,
+            max_cores=max_cores,
+        )
+        experiment_hash = compute_experiment_hash(
+            block_congestion_rate,
+            block_size,
+            format_capacity(capacity, capacity_names),
+            num_processes,
+            simulation_end,
+            submarine_swap_threshold,
+            rebalancing_mode,
+            use_known_path,
+            sync,
+            tps,
+            tps_cfg,
+        )
+        with ResultsStore(results_dir / RESULTS_STORE_FILE) as store:
+            results = [store.get(experiment_hash, seed) for seed in seeds]
+        values = [float(result[metric]) for result in results if result is not None]
+        values = [value for value in values if not math.isnan(value)]
+        # a NaN would make every comparison of the search false
+        if not values:
+            msg = (
+                f"No {metric} for capacity {capacity}: all its simulations failed, "
+                f"see {results_dir / 'failed_simulations.csv'}"
+            )
+            raise RuntimeError(msg)
+        if len(values) < len(seeds):
+            print(
+                f"Capacity {capacity}: {metric} of {len(values)} out of "
+                f"{len(seeds)} seeds"
+            )
+        evaluated[capacity] = float(np.mean(values))
+        print(f"Capacity {capacity}: mean {metric} = {evaluated[capacity]}")
+        return evaluated[capacity]
+
+    if goal == CapacitySearchGoal.MINIMUM:
+        best_index = _golden_section_search(evaluate, 0, len(capacities) - 1)
+        return capacities[best_index], evaluated
+
+    def reached(index: int) -> bool:
+        value = evaluate(index)
+        return (
+            value >= target_value
+            if goal == CapacitySearchGoal.AT_LEAST
+            else value <= target_value
+        )
+
+    first_index = _bisect(reached, 0, len(capacities) - 1)
+    return (capacities[first_index] if first_index is not None else None), evaluated
+
+
+def _bisect(reached: Callable[[int], bool], low: int, high: int) -> int | None:
+    """Find the first index in [low, high] for which reached() holds, assuming it
+    keeps holding for all the following indices."""
+    if not reached(high):
+        return None
+    if reached(low):
+        return low
+    # invariant: reached(high) and not reached(low)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if reached(middle):
+            high = middle
+        else:
+            low = middle
+    return high
+
+
+def _golden_section_search(
+    evaluate: Callable[[int], float], low: int, high: int
+) -> int:
+    """Find the index in [low, high] minimizing evaluate(), assuming it is unimodal."""
+    while high - low > 2:
+        left = high - round(GOLDEN_RATIO_CONJUGATE * (high - low))
+        right = low + round(GOLDEN_RATIO_CONJUGATE * (high - low))
+        left, right = min(left, right - 1), max(right, left + 1)
+        if evaluate(left) <= evaluate(right):
+            high = right
+        else:
+            low = left
+    return min(range(low, high + 1), key=evaluate)
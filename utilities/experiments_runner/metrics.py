@@ -0,0 +1,99 @@
+import os
+import pathlib
+import resource
+import subprocess
+import threading
+from typing import IO
+
+PROC_DIR = pathlib.Path("/proc")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _process_table() -> dict[int, tuple[int, int]]:
+    """Read the (parent pid, resident set size in bytes) of every process in /proc."""
+    table = {}
+    for stat_file in PROC_DIR.glob("[0-9]*/stat"):
+        try:
+            stat = stat_file.read_text()
+        except OSError:
+            # the process exited in the meantime
+            continue
+        # the command name may contain spaces, and is enclosed in parentheses
+        fields = stat[stat.rfind(")") + 2 :].split()
+        table[int(stat_file.parent.name)] = (
+            int(fields[1]),
+            int(fields[21]) * PAGE_SIZE,
+        )
+    return table
+
+
+def process_tree_rss(root_pid: int) -> tuple[int, int]:
+    """Get the total resident set size (in bytes) and the number of the processes
+    in the tree rooted at root_pid (e.g. a shell, mpirun and its ranks).
+
+    Returns (0, 0) where /proc is not available.
+    """
+    table = _process_table()
+    children: dict[int, list[int]] = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    total_rss, nb_processes = 0, 0
+    stack = [root_pid] if root_pid in table else []
+    while stack:
+        pid = stack.pop()
+        total_rss += table[pid][1]
+        nb_processes += 1
+        stack.extend(children.get(pid, []))
+    return total_rss, nb_processes
+
+
+class ProcessTreeSampler:
+    """Periodically sample the memory of a process tree, keeping the peak."""
+
+    def __init__(self, root_pid: int, interval: float = 1.0) -> None:
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_processes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            rss, nb_processes = process_tree_rss(self.root_pid)
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_processes = max(self.peak_processes, nb_processes)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "ProcessTreeSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_with_rusage(
+    command: str, stdout: IO, stderr: IO
+) -> tuple[int, resource.struct_rusage, ProcessTreeSampler]:
+    """Run a shell command, accounting for the resources used by its process tree.
+
+    Unlike getrusage(RUSAGE_CHILDREN), the resource usage returned by wait4() only
+    covers this command, even if other commands are running concurrently.
+
+    Returns the exit code, the resource usage of the command and of all its
+    (waited for) descendants, and the sampler of its peak memory.
+    """
+    process = subprocess.Popen(
+        command, shell=True, stdout=stdout, stderr=stderr, text=True
+    )
+    with ProcessTreeSampler(process.pid) as sampler:
+        _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, rusage, sampler
+
+
+def directory_size(path: pathlib.Path) -> int:
+    """Get the total size in bytes of the files in a directory tree."""
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
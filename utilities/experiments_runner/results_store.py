@@ -0,0 +1,261 @@
+import io
+import json
+import pathlib
+import sqlite3
+import threading
+from enum import Enum
+
+import numpy as np
+import pandas as pd
+
+from statistics_analyzer.core import MILLISECONDS_IN_A_MINUTE
+from statistics_analyzer.results import (
+    STATS_PER_MINUTE,
+    stats_per_minute_columns,
+    stats_per_minute_from_columns,
+)
+
+RESULTS_STORE_FILE = "results.sqlite"
+RESULTS_CSV_FILE = "results.csv"
+
+
+class SimulationState(Enum):
+    """The states of a simulation of a sweep, in the order they are reached."""
+
+    QUEUED = "queued"
+    SIMULATING = "simulating"
+    SIMULATED = "simulated"
+    ANALYSED = "analysed"
+    RECORDED = "recorded"
+
+
+def _to_json(value: object) -> object:
+    if isinstance(value, np.generic):
+        return value.item()
+    msg = f"Object of type {type(value)} is not JSON serializable"
+    raise TypeError(msg)
+
+
+def _stats_bucket_ms(result: dict) -> int:
+    """Get the length of the time buckets of the per-minute statistics of a result.
+
+    The results analysed before the length was configurable have one-minute buckets.
+    """
+    bucket_ms = result.get("stats_bucket_ms")
+    if bucket_ms is None or pd.isna(bucket_ms):
+        return MILLISECONDS_IN_A_MINUTE
+    return int(bucket_ms)
+
+
+def _array_to_blob(array: np.ndarray | None) -> bytes | None:
+    if array is None:
+        return None
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _blob_to_array(blob: bytes) -> np.ndarray:
+    array: np.ndarray = np.load(io.BytesIO(blob), allow_pickle=False)
+    return array
+
+
+class ResultsStore:
+    """Append-only store of the simulation results of a sweep.
+
+    Each result is a simulation result record (see run_pcn_simulation()), stored
+    as JSON in a SQLite database and keyed by (experiment_hash, seed), so that
+    checking whether a simulation has already been run and adding a new result
+    do not depend on the number of results already stored. The records can be
+    exported to the usual results.csv via export_csv().
+
+    The per-minute statistics of a record (its STATS_PER_MINUTE array) are stored
+    apart, as a binary .npy column, and can be stacked by stats_per_minute().
+
+    The store also journals the state of each simulation (see SimulationState),
+    so that an interrupted sweep can be resumed. Every write is a SQLite
+    transaction, hence atomic. The store can be shared by several threads.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    experiment_hash TEXT NOT NULL,
+                    seed INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    stats_per_minute BLOB,
+                    PRIMARY KEY (experiment_hash, seed)
+                )
+                """
+            )
+            columns = {
+                row[1] for row in self._connection.execute("PRAGMA table_info(results)")
+            }
+            if "stats_per_minute" not in columns:
+                # a store written before the per-minute statistics were stored
+                self._connection.execute(
+                    "ALTER TABLE results ADD COLUMN stats_per_minute BLOB"
+                )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS journal (
+                    experiment_hash TEXT NOT NULL,
+                    seed INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (experiment_hash, seed)
+                )
+                """
+            )
+
+    def __contains__(self, key: tuple[str, int]) -> bool:
+        experiment_hash, seed = key
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT 1 FROM results WHERE experiment_hash = ? AND seed = ?",
+                (experiment_hash, int(seed)),
+            )
+            return cursor.fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM results"
+            ).fetchone()
+        return int(count)
+
+    def _set_state(
+        self, experiment_hash: str, seed: int, state: SimulationState
+    ) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO journal VALUES (?, ?, ?, datetime('now'))",
+            (experiment_hash, int(seed), state.value),
+        )
+
+    def set_state(
+        self, experiment_hash: str, seed: int, state: SimulationState
+    ) -> None:
+        """Journal the state of a simulation."""
+        with self._lock, self._connection:
+            self._set_state(experiment_hash, seed, state)
+
+    def get_state(self, experiment_hash: str, seed: int) -> SimulationState | None:
+        """Get the journaled state of a simulation, None if it was never queued."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT state FROM journal WHERE experiment_hash = ? AND seed = ?",
+                (experiment_hash, int(seed)),
+            ).fetchone()
+        return None if row is None else SimulationState(row[0])
+
+    def get(self, experiment_hash: str, seed: int) -> dict | None:
+        """Get the result of a simulation, None if it is not stored."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT result, stats_per_minute FROM results "
+                "WHERE experiment_hash = ? AND seed = ?",
+                (experiment_hash, int(seed)),
+            ).fetchone()
+        if row is None:
+            return None
+        result, blob = row
+        record: dict = json.loads(result)
+        return record | {
+            STATS_PER_MINUTE: None if blob is None else _blob_to_array(blob)
+        }
+
+    def add(self, experiment_hash: str, seed: int, result: dict) -> None:
+        """Store the result of a simulation, replacing any previous one."""
+        self.add_many([(experiment_hash, seed, result)])
+
+    def add_many(self, results: list[tuple[str, int, dict]]) -> None:
+        """Store several results in a single transaction."""
+        with self._lock, self._connection:
+            for experiment_hash, seed, result in results:
+                scalars = {k: v for k, v in result.items() if k != STATS_PER_MINUTE}
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (
+                        experiment_hash,
+                        int(seed),
+                        json.dumps(scalars, default=_to_json),
+                        _array_to_blob(result.get(STATS_PER_MINUTE)),
+                    ),
+                )
+                self._set_state(experiment_hash, seed, SimulationState.RECORDED)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Get all the results, in insertion order.
+
+        The per-minute statistics are columns of compact json lists, as in
+        results.csv.
+        """
+        with self._lock:
+            results = self._connection.execute(
+                "SELECT result, stats_per_minute FROM results ORDER BY rowid"
+            ).fetchall()
+        records = []
+        for result, blob in results:
+            record = json.loads(result)
+            if blob is not None:
+                record |= stats_per_minute_columns(_blob_to_array(blob))
+            records.append(record)
+        return pd.DataFrame(records)
+
+    def stats_per_minute(self) -> np.ndarray:
+        """Stack the per-minute statistics of all the results, in insertion order.
+
+        Returns an array of shape (number of results, len(StatsPerMinute), number
+        of minutes), NaN in the minutes in which no payment started and for the
+        results without per-minute statistics. The shorter time axes are padded
+        with NaN. Raises a ValueError if the results have time buckets of
+        different lengths (see the --bucket-ms option of the analyzer).
+        """
+        with self._lock:
+            results = self._connection.execute(
+                "SELECT result, stats_per_minute FROM results ORDER BY rowid"
+            ).fetchall()
+        bucket_ms = {_stats_bucket_ms(json.loads(result)) for result, _ in results}
+        if len(bucket_ms) > 1:
+            msg = (
+                "The per-minute statistics of the results have time buckets of "
+                f"different lengths ({sorted(bucket_ms)} ms): they can not be stacked"
+            )
+            raise ValueError(msg)
+        # the results stored before the per-minute statistics were stored apart
+        # have them as results.csv columns
+        arrays = [
+            _blob_to_array(blob)
+            if blob is not None
+            else stats_per_minute_from_columns(json.loads(result))
+            for result, blob in results
+        ]
+        shapes = [array.shape for array in arrays if array is not None]
+        if not shapes:
+            return np.empty((len(arrays), 0, 0))
+        nb_rows, nb_minutes = (max(sizes) for sizes in zip(*shapes, strict=True))
+        stacked = np.full((len(arrays), nb_rows, nb_minutes), np.nan)
+        for i, array in enumerate(arrays):
+            if array is not None:
+                stacked[i, : array.shape[0], : array.shape[1]] = array
+        return stacked
+
+    def export_csv(self, path: pathlib.Path) -> None:
+        """Atomically write all the results to a csv file, in insertion order."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        self.to_dataframe().to_csv(tmp_path, index=False)
+        tmp_path.replace(path)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
@@ -11,6 +11,7 @@ import metis
 import networkx as nx
 
 from plasma_network_generator.core import NodeType
+from plasma_network_generator.profiling import span
 from plasma_network_generator.utils import configure_logging
 
 
@@ -48,9 +49,8 @@ def parse_commandline_args(argv):
     return cmdline_flags
 
 
-def cloth_output(
-    plasma_network: nx.MultiDiGraph, output_dir: pathlib.Path, n_partitions: int
-) -> None:
+def partition_network(plasma_network: nx.MultiDiGraph, n_partitions: int) -> nx.DiGraph:
+    """Partition the nodes with METIS, in the partition and color node attributes."""
     g = nx.DiGraph(plasma_network)
     g.graph["edge_weight_attr"] = "weight"
     g.graph["node_weight_attr"] = "weight"
@@ -73,7 +73,16 @@ def cloth_output(
         counter[p][g.nodes[i]["type"]] += 1
 
     logging.info("%s", json.dumps(counter, indent=4))
+    return g
+
 
+def write_cloth_network(
+    plasma_network: nx.MultiDiGraph, g: nx.DiGraph, output_dir: pathlib.Path
+) -> None:
+    """Write the nodes, edges and channels CSV files of CLoTH.
+
+    The CLoTH edge ids are stored in the cloth_edge_id edge attribute.
+    """
     with (output_dir / "plasma_network_nodes.csv").open(mode="w") as node_file:
         node_writer = csv.writer(node_file)
         node_writer.writerow(["id", "label", "country", "partition", "intermediary"])
@@ -177,6 +186,11 @@ def cloth_output(
             channel_id += 1
             edge_id += 2
 
+
+def write_plasma_paths(
+    plasma_network: nx.MultiDiGraph, output_dir: pathlib.Path
+) -> None:
+    """Write the shortest paths among the intermediaries, as CLoTH edge ids."""
     all_intermediaries = [
         key
         for key, node in plasma_network.nodes(data=True)
@@ -210,6 +224,17 @@ def cloth_output(
                         )
 
 
+def cloth_output(
+    plasma_network: nx.MultiDiGraph, output_dir: pathlib.Path, n_partitions: int
+) -> None:
+    with span("partition_network", n_partitions=n_partitions):
+        g = partition_network(plasma_network, n_partitions)
+    with span("write_cloth_network"):
+        write_cloth_network(plasma_network, g, output_dir)
+    with span("write_plasma_paths"):
+        write_plasma_paths(plasma_network, output_dir)
+
+
 def plasma_network_generator_cloth_dump_main(argv) -> int:
     cmdline_flags = parse_commandline_args(argv)
     configure_logging(True)
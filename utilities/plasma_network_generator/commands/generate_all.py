@@ -48,7 +48,14 @@ from plasma_network_generator.commands.networkx_generator import (
     _execute as execute_networkx_generator,
 )
 from plasma_network_generator.core import NationSpecs, select_eurosystem_subset
+from plasma_network_generator.dump import add_analysis_arguments
 from plasma_network_generator.exceptions import CliArgsValidationError
+from plasma_network_generator.profiling import (
+    add_profiling_arguments,
+    profiling,
+    span,
+)
+from plasma_network_generator.topology_cache import TopologyCache, topology_cache_key
 from plasma_network_generator.utils import (
     EXIT_FAILURE,
     EXIT_SUCCESS,
@@ -93,6 +100,10 @@ class Args:
     nations: NationSpecs
     seed: int | None = None
     scale_free_2_2: bool = False
+    use_cache: bool = False
+    profile: Path | None = None
+    profile_stage: str | None = None
+    analysis_workers: int | None = None
 
     def __post_init__(self) -> None:
         """Post initialization checks."""
@@ -222,6 +233,14 @@ def get_parser() -> argparse.ArgumentParser:
         help=f"force layer 2 subnetwork to be scale free (default: {DEFAULT_SCALE_FREE_2_2})",
         default=DEFAULT_SCALE_FREE_2_2,
     )
+    parser.add_argument(
+        "--use-cache",
+        action="store_true",
+        help="reuse the topologies already generated in the output directory with the same parameters, "
+        "only generating the missing capacity fractions and partitions",
+    )
+    add_analysis_arguments(parser)
+    add_profiling_arguments(parser)
     return parser
 
 
@@ -256,6 +275,10 @@ def parse_args() -> Args:
         nations=nations,
         seed=raw_args.seed,
         scale_free_2_2=raw_args.scale_free_2_2,
+        use_cache=raw_args.use_cache,
+        profile=raw_args.profile,
+        profile_stage=raw_args.profile_stage,
+        analysis_workers=raw_args.analysis_workers,
     )
 
 
@@ -315,18 +338,8 @@ def scale_capacities(
     return cast(nx.MultiDiGraph, scaled_plasma_network)
 
 
-def _do_job(args: Args) -> None:
-    """Do the main job."""
-    logging.info("Reading the input directory content %s", args.model_params_file)
-
-    seed_gen = SeedGenerator(args.seed)
-
-    logging.info("Reading file %s", args.model_params_file)
-
-    logging.info(
-        "Selected nation size specifications:\n%s", pprint.pformat(args.nations)
-    )
-
+def networkx_generator_args(args: Args) -> NetworkxGeneratorArgs:
+    """Get the arguments of the networkx generator."""
     networkx_generator_output_dir = args.output_dir / "generator_output"
     rnd_model = RndModel.initialize_from_cli_args(
         number_of_nodes_in_simulation=None,
@@ -348,11 +361,7 @@ def _do_job(args: Args) -> None:
         nations=args.nations,
         scale_free_2_2=args.scale_free_2_2,
     )
-    logging.info(
-        "********** calling networkx generator using model params file %s **********",
-        args.model_params_file,
-    )
-    networkx_generator_args = NetworkxGeneratorArgs(
+    return NetworkxGeneratorArgs(
         version=False,
         verbose=args.verbose,
         input_file=args.model_params_file,
@@ -362,15 +371,46 @@ def _do_job(args: Args) -> None:
         seed=args.seed,
         dump_network=False,
         dump_subnetworks=False,
+        analysis_workers=args.analysis_workers,
+    )
+
+
+def _generate_plasma_network(args: Args) -> nx.MultiDiGraph:
+    """Generate the plasma network, before capacity scaling."""
+    logging.info("Reading the input directory content %s", args.model_params_file)
+
+    seed_gen = SeedGenerator(args.seed)
+
+    logging.info("Reading file %s", args.model_params_file)
+
+    logging.info(
+        "Selected nation size specifications:\n%s", pprint.pformat(args.nations)
+    )
+
+    logging.info(
+        "********** calling networkx generator using model params file %s **********",
+        args.model_params_file,
     )
-    plasma_network, _ = execute_networkx_generator(networkx_generator_args)
+    with span("generate_plasma_network"):
+        plasma_network, _ = execute_networkx_generator(networkx_generator_args(args))
+    return plasma_network
+
+
+def _do_job(args: Args) -> None:
+    """Do the main job."""
+    if args.use_cache:
+        _do_job_with_cache(args)
+        return
+
+    plasma_network = _generate_plasma_network(args)
 
     max_nb_digits = max(map(nb_digits_after_comma, args.capacity_fractions))
     for cap_fraction in args.capacity_fractions:
-        scaled_plasma_network = scale_capacities(
-            plasma_network,
-            cap_fraction,
-        )
+        with span("scale_capacities", capacity_fraction=cap_fraction):
+            scaled_plasma_network = scale_capacities(
+                plasma_network,
+                cap_fraction,
+            )
         capacity_output_dir = args.output_dir / (
             "capacity-" + fraction_format_str(cap_fraction, max_nb_digits)
         )
@@ -381,11 +421,68 @@ def _do_job(args: Args) -> None:
             )
             cloth_dump_output_dir = capacity_output_dir / f"k_{n_partitions:02d}"
             cloth_dump_output_dir.mkdir(parents=True, exist_ok=True)
-            cloth_output(
-                scaled_plasma_network,
-                cloth_dump_output_dir,
+            with span(
+                "cloth_output",
+                capacity_fraction=cap_fraction,
+                n_partitions=n_partitions,
+            ):
+                cloth_output(
+                    scaled_plasma_network,
+                    cloth_dump_output_dir,
+                    n_partitions,
+                )
+
+    logging.info("*" * 30)
+    logging.info("Done!")
+
+
+def _do_job_with_cache(args: Args) -> None:
+    """Do the main job, only generating the outputs missing from the cache."""
+    cache = TopologyCache(
+        args.output_dir, topology_cache_key(args, args.model_params_file)
+    )
+    missing = cache.missing(args.capacity_fractions, args.nb_partitions)
+    if not missing:
+        logging.info("All the topologies are already in %s", args.output_dir)
+        return
+
+    with span("load_network"):
+        plasma_network = cache.load_network()
+    if plasma_network is None:
+        plasma_network = _generate_plasma_network(args)
+        with span("save_network"):
+            cache.save_network(plasma_network)
+    else:
+        logging.info("Loaded the plasma network from %s", cache.network_file)
+
+    cache.set_nb_digits(max(map(nb_digits_after_comma, args.capacity_fractions)))
+    for cap_fraction in dict.fromkeys(cap for cap, _ in missing):
+        with span("scale_capacities", capacity_fraction=cap_fraction):
+            scaled_plasma_network = scale_capacities(
+                plasma_network,
+                cap_fraction,
+            )
+        for _, n_partitions in filter(lambda x: x[0] == cap_fraction, missing):
+            logging.info(
+                "### Calling cloth dump with capacity fraction %s and number of partitions %d ###",
+                cap_fraction,
                 n_partitions,
             )
+            cloth_dump_output_dir = (
+                cache.capacity_dir(cap_fraction) / f"k_{n_partitions:02d}"
+            )
+            cloth_dump_output_dir.mkdir(parents=True, exist_ok=True)
+            with span(
+                "cloth_output",
+                capacity_fraction=cap_fraction,
+                n_partitions=n_partitions,
+            ):
+                cloth_output(
+                    scaled_plasma_network,
+                    cloth_dump_output_dir,
+                    n_partitions,
+                )
+            cache.add(cap_fraction, n_partitions)
 
     logging.info("*" * 30)
     logging.info("Done!")
@@ -401,14 +498,20 @@ def _execute(args: Args) -> None:
     # Check input dir exists and that is not empty
     check_file_is_file(args.model_params_file, CliArgsValidationError)
 
+    if args.profile_stage is not None and args.profile is None:
+        msg = "the profile stage requires a profile output file"
+        raise CliArgsValidationError(msg)
+
     # Validate output directory. Create it if it does not exist.
     args.output_dir.mkdir(parents=True, exist_ok=True)
     check_path_is_directory(args.output_dir, CliArgsValidationError)
-    check_dir_is_empty(args.output_dir, CliArgsValidationError)
+    if not (args.use_cache and TopologyCache.is_cache_dir(args.output_dir)):
+        check_dir_is_empty(args.output_dir, CliArgsValidationError)
 
     logging.info("Plasma Network Generator v%s", get_version())
     logging.debug("Arguments: %s", args.print_args())
-    _do_job(args)
+    with profiling(args.profile, args.profile_stage), span("generate_all"):
+        _do_job(args)
 
 
 def main() -> None:
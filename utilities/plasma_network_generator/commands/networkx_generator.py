@@ -20,6 +20,7 @@ from plasma_network_generator.core import (
     get_eurosystem_nation_specs,
 )
 from plasma_network_generator.dump import (
+    add_analysis_arguments,
     dump_info_about_layeers_and_nodes,
     dump_info_about_network_random_models,
     dump_network_analysis,
@@ -34,6 +35,11 @@ from plasma_network_generator.model import payment_subnetworks_random_models
 from plasma_network_generator.params import (
     infer_missing_rnd_model_params,
 )
+from plasma_network_generator.profiling import (
+    add_profiling_arguments,
+    profiling,
+    span,
+)
 from plasma_network_generator.utils import (
     EXIT_FAILURE,
     EXIT_SUCCESS,
@@ -345,6 +351,9 @@ class Args:
         subnetwork_filter: Optional[str], subnetwork filter
         fake_demo_names: bool, whether to use fake demo names
         deploy_node_count: int, the number of nodes to deploy
+        profile: Optional[Path], the file to write the profile of the stages to
+        profile_stage: Optional[str], the stage to run cProfile on
+        analysis_workers: Optional[int], the number of processes analysing the subnetworks in verbose mode
     """
 
     version: bool
@@ -359,6 +368,9 @@ class Args:
     subnetwork_filter: str | None = DEFAULT_SUBNETWORK_FILTER
     fake_demo_names: bool = DEFAULT_FAKE_DEMO_NAMES
     deploy_node_count: int = DEFAULT_DEPLOY_NODE_COUNT
+    profile: Path | None = None
+    profile_stage: str | None = None
+    analysis_workers: int | None = None
 
     def __post_init__(self) -> None:
         """Post init checks."""
@@ -602,6 +614,8 @@ def get_parser() -> argparse.ArgumentParser:
         help=f"the (default: {DEFAULT_DEPLOY_NODE_COUNT})",
         default=DEFAULT_DEPLOY_NODE_COUNT,
     )
+    add_analysis_arguments(parser)
+    add_profiling_arguments(parser)
 
     # add group for nation specification
     nation_group = parser.add_mutually_exclusive_group()
@@ -738,11 +752,18 @@ def parse_args() -> Args:
         subnetwork_filter=raw_args.filter,
         fake_demo_names=raw_args.fake_demo_names,
         deploy_node_count=raw_args.deploy_node_count,
+        profile=raw_args.profile,
+        profile_stage=raw_args.profile_stage,
+        analysis_workers=raw_args.analysis_workers,
     )
 
 
-def _generate_network(args: Args) -> tuple[nx.Graph, list[nx.Graph]]:
-    """Do the main job."""
+def _subnetworks_models(args: Args) -> tuple[dict, list[dict], dict]:
+    """Build the random models of the subnetworks to generate.
+
+    Returns the layer nodes, the subnetworks models and the random model
+    parameters.
+    """
     logging.info("Reading input file %s", args.input_file)
 
     # TODO: this is a workaround to avoid changing the legacy code
@@ -775,31 +796,41 @@ def _generate_network(args: Args) -> tuple[nx.Graph, list[nx.Graph]]:
         subnetworks_models,
     )
     subnetworks_models = [flatten_attribute_names(sn) for sn in subnetworks_models]
+    return layer_nodes, subnetworks_models, rnd_model_dict
+
+
+def _generate_network(args: Args) -> tuple[nx.MultiDiGraph, list[nx.MultiDiGraph]]:
+    """Do the main job."""
+    with span("payment_subnetworks_random_models"):
+        layer_nodes, subnetworks_models, rnd_model_dict = _subnetworks_models(args)
 
     logging.debug("Dumping network information")
     with patch("builtins.print", logging.debug):
         dump_info_about_layeers_and_nodes(layer_nodes, rnd_model_dict)
         dump_info_about_network_random_models(subnetworks_models)
 
-    (plasma_network, subnetwork_instances) = generate_plasma_network(
-        subnetworks_models,
-        args.seed,
-        args.rnd_model.nations,
-        args.rnd_model.unique_cb,
-    )
-    postprocess_plasma_network(plasma_network, {})
+    with span("generate_plasma_network"):
+        (plasma_network, subnetwork_instances) = generate_plasma_network(
+            subnetworks_models,
+            args.seed,
+            args.rnd_model.nations,
+            args.rnd_model.unique_cb,
+        )
+    with span("postprocess_plasma_network"):
+        postprocess_plasma_network(plasma_network, {})
     plasma_network.graph["name"] = "Plasma Network"
     plasma_network.graph["description"] = "A 3-layer payment network"
 
     if args.fake_demo_names:
         logging.info("Add fake demo names")
-        plasma_network = demoize_node_names(plasma_network)
+        with span("demoize_node_names"):
+            plasma_network = demoize_node_names(plasma_network)
         subnetwork_instances = filter(demoize_node_names, subnetwork_instances)
 
     return plasma_network, subnetwork_instances
 
 
-def _execute(args: Args) -> tuple[nx.Graph, list[nx.Graph]] | None:
+def _execute(args: Args) -> tuple[nx.MultiDiGraph, list[nx.MultiDiGraph]] | None:
     if args.version:
         print(get_version())
         return None
@@ -809,6 +840,10 @@ def _execute(args: Args) -> tuple[nx.Graph, list[nx.Graph]] | None:
     # Check input file exists
     check_file_exists(args.input_file, CliArgsValidationError)
 
+    if args.profile_stage is not None and args.profile is None:
+        msg = "the profile stage requires a profile output file"
+        raise CliArgsValidationError(msg)
+
     if args.dump:
         # Validate output directory. Create it if it does not exist.
         args.output_dir.mkdir(parents=True, exist_ok=True)
@@ -818,21 +853,30 @@ def _execute(args: Args) -> tuple[nx.Graph, list[nx.Graph]] | None:
     logging.info("Plasma Network Generator v%s", get_version())
     logging.debug("Arguments: %s", args.print_args())
 
-    plasma_network, subnetwork_instances = _generate_network(args)
-
-    if args.verbose:
-        logging.debug("Dumping network analysis")
-        with patch("builtins.print", logging.debug):
-            dump_network_analysis(plasma_network, subnetwork_instances)
+    with profiling(args.profile, args.profile_stage), span("networkx_generator"):
+        plasma_network, subnetwork_instances = _generate_network(args)
+
+        if args.verbose:
+            logging.debug("Dumping network analysis")
+            with (
+                span("dump_network_analysis"),
+                patch("builtins.print", logging.debug),
+            ):
+                dump_network_analysis(
+                    plasma_network,
+                    subnetwork_instances,
+                    max_workers=args.analysis_workers,
+                )
 
-    if args.dump:
-        logging.info("Saving plasma network")
-        args.output_dir.mkdir(parents=True, exist_ok=True)
-        dump_plasma_network(
-            plasma_network,
-            subnetwork_instances,
-            args.legacy_args_dict(),
-        )
+        if args.dump:
+            logging.info("Saving plasma network")
+            args.output_dir.mkdir(parents=True, exist_ok=True)
+            with span("dump_plasma_network"):
+                dump_plasma_network(
+                    plasma_network,
+                    subnetwork_instances,
+                    args.legacy_args_dict(),
+                )
 
     return plasma_network, subnetwork_instances
 
@@ -1,11 +1,23 @@
+import argparse
+import dataclasses
 import pathlib
+from collections import Counter
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
 
 import networkx as nx
 
 from plasma_network_generator.utils import (
+    check_positive_integer,
+    diameter_bounds,
+    try_is_strongly_connected,
     try_is_weakly_connected,
 )
 
+# The number of channels of the subnetworks below which they are analysed in this process:
+# pickling them to other processes would take longer than analysing them
+PARALLEL_ANALYSIS_MIN_CHANNELS = 100_000
+
 ########################################################################################################################
 #                     Dumping the network(s) plus possibly some network information (verbose mode)                     #
 ########################################################################################################################
@@ -67,53 +79,150 @@ def dump_info_about_auxiliary_network_random_models(subnetworks_models):
         print(f"\t\t- over nodes: {' + '.join(node_sets_desc)}")
 
 
-def dump_network_analysis(plasma_network, subnetwork_instances):
-    def _dump_network_analysis(subnetwork):
-        print(f"\t-Number of channels: {subnetwork.number_of_edges()}")
+@dataclasses.dataclass
+class NetworkAnalysis:
+    """The statistics of a (sub)network printed by dump_network_analysis.
+
+    The diameter bounds are only computed for strongly connected networks, the
+    number of strongly connected components for the other ones. The out-degrees
+    are counted by node type.
+    """
+
+    nb_nodes: int
+    nb_channels: int
+    is_weakly_connected: bool | None
+    is_strongly_connected: bool | None
+    nb_strongly_connected_components: int | None = None
+    diameter_bounds: tuple[int, int] | None = None
+    out_degree_counts: dict[str | None, Counter[int]] = dataclasses.field(
+        default_factory=dict
+    )
+
+
+def analyze_network(subnetwork: nx.MultiDiGraph) -> NetworkAnalysis:
+    """Compute the statistics of a (sub)network, in linear time but for the diameter.
+
+    See diameter_bounds() for the bounded number of breadth-first searches of the
+    diameter bounds.
+    """
+    analysis = NetworkAnalysis(
+        nb_nodes=subnetwork.number_of_nodes(),
+        nb_channels=subnetwork.number_of_edges(),
+        is_weakly_connected=try_is_weakly_connected(subnetwork),
+        is_strongly_connected=try_is_strongly_connected(subnetwork),
+    )
+    if analysis.is_strongly_connected is False:
+        analysis.nb_strongly_connected_components = (
+            nx.number_strongly_connected_components(subnetwork)
+        )
+    elif analysis.is_strongly_connected is True:
+        analysis.diameter_bounds = diameter_bounds(subnetwork)
+    out_degrees = subnetwork.out_degree()
+    for node, data in subnetwork.nodes(data=True):
+        analysis.out_degree_counts.setdefault(data.get("type"), Counter())[
+            out_degrees[node]
+        ] += 1
+    return analysis
+
+
+def _yes_no_unknown(value: bool | None) -> str:
+    return "YES" if value else "NO" if value is not None else "UNKNOWN"
+
+
+def _log2_histogram(counts: Counter[int]) -> str:
+    """Format the counts of the values in power of 2 buckets: 0, 1, 2-3, 4-7, ..."""
+    buckets: Counter[int] = Counter()
+    for value, count in counts.items():
+        buckets[0 if value == 0 else 1 << (value.bit_length() - 1)] += count
+    return ", ".join(
+        f"{low if low <= 1 else f'{low}-{2 * low - 1}'}: {buckets[low]}"
+        for low in sorted(buckets)
+    )
+
+
+def _dump_network_analysis(analysis: NetworkAnalysis) -> None:
+    print(f"\t-Number of channels: {analysis.nb_channels}")
+    print(
+        f"\t-Average channels per node: "
+        f"{float(analysis.nb_channels) / analysis.nb_nodes if analysis.nb_nodes > 0 else float('nan')}"
+    )
+    print(
+        "\t-Is connected (i.e., not made of disjoint components): "
+        f"{_yes_no_unknown(analysis.is_weakly_connected)}"
+    )
+    print(
+        "\t-Is strongly connected (i.e., can follow channels from every node to every other node): "
+        f"{_yes_no_unknown(analysis.is_strongly_connected)}"
+    )
+    if analysis.nb_strongly_connected_components is not None:
         print(
-            f"\t-Average channels per node: "
-            f"{float(subnetwork.number_of_edges()) / subnetwork.number_of_nodes() if subnetwork.number_of_nodes() > 0 else float('nan')}"
+            f"\t-Number of strongly connected components: {analysis.nb_strongly_connected_components}",
         )
-        is_weakly_connected = try_is_weakly_connected(subnetwork)
+    if analysis.diameter_bounds is not None:
+        lower, upper = analysis.diameter_bounds
         print(
-            "\t-Is connected (i.e., not made of disjoint components): {}".format(
-                (
-                    "YES"
-                    if is_weakly_connected
-                    else "NO"
-                    if is_weakly_connected is not None
-                    else "UNKNOWN"
-                ),
-            ),
+            f"\t-Diameter (max number of hops): {lower if lower == upper else f'between {lower} and {upper}'}",
         )
-        is_strongly_connected = try_is_weakly_connected(subnetwork)
+    print("\t-Out-degree by node type:")
+    for node_type, counts in sorted(
+        analysis.out_degree_counts.items(), key=lambda item: str(item[0])
+    ):
+        nb_nodes = counts.total()
+        mean = sum(degree * count for degree, count in counts.items()) / nb_nodes
         print(
-            "\t-Is strongly connected (i.e., can follow channels from every node to every other node): {}".format(
-                (
-                    "YES"
-                    if is_strongly_connected
-                    else "NO"
-                    if is_weakly_connected is not None
-                    else "UNKNOWN"
-                ),
-            ),
+            f"\t\t- {node_type} ({nb_nodes} nodes): min {min(counts)}, mean {mean:.2f}, "
+            f"max {max(counts)}; histogram {_log2_histogram(counts)}"
         )
-        if is_strongly_connected is False:
-            print(
-                f"\t-Number of strongly connected components: {nx.number_strongly_connected_components(subnetwork)}",
-            )
-        elif is_strongly_connected is True:
-            print(
-                f"\t-Diameter (max number of hops): {nx.algorithms.distance_measures.diameter(subnetwork)}",
-            )
+
+
+def dump_network_analysis(
+    plasma_network: nx.MultiDiGraph,
+    subnetwork_instances: Iterable[nx.MultiDiGraph],
+    max_workers: int | None = None,
+) -> None:
+    """Print the analysis of the subnetworks and of the plasma network.
+
+    The subnetworks are analysed by max_workers other processes (by default, as
+    many as the CPUs), while this one analyses the plasma network. They are
+    analysed in this process if max_workers is 1, or if they have less than
+    PARALLEL_ANALYSIS_MIN_CHANNELS channels in total.
+    """
+    subnetwork_instances = list(subnetwork_instances)
+    nb_channels = sum(
+        subnetwork.number_of_edges() for subnetwork in subnetwork_instances
+    )
+    if max_workers == 1 or nb_channels < PARALLEL_ANALYSIS_MIN_CHANNELS:
+        subnetwork_analyses = [
+            analyze_network(subnetwork) for subnetwork in subnetwork_instances
+        ]
+        plasma_network_analysis = analyze_network(plasma_network)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            subnetwork_futures = executor.map(analyze_network, subnetwork_instances)
+            plasma_network_analysis = analyze_network(plasma_network)
+            subnetwork_analyses = list(subnetwork_futures)
 
     print("***** PAYMENT NETWORK INSTANCES ANALYSIS *****")
-    for subnetwork in subnetwork_instances:
+    for subnetwork, analysis in zip(
+        subnetwork_instances, subnetwork_analyses, strict=True
+    ):
         print(f"Subnetwork: {subnetwork.name}")
-        _dump_network_analysis(subnetwork)
+        _dump_network_analysis(analysis)
 
     print(plasma_network.graph["description"] + ":")
-    _dump_network_analysis(plasma_network)
+    _dump_network_analysis(plasma_network_analysis)
+
+
+def add_analysis_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--analysis-workers",
+        type=check_positive_integer,
+        default=None,
+        metavar="N",
+        help="the number of processes analysing the subnetworks in verbose mode "
+        "(default: the number of CPUs); with 1, or for subnetworks of less than "
+        f"{PARALLEL_ANALYSIS_MIN_CHANNELS} channels, they are analysed in the main process",
+    )
 
 
 # Dumping the plasma network (and possibly its subnetworks individually) to file or stdout
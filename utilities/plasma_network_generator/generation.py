@@ -1,11 +1,12 @@
 """Plasma Network Generation Procedures."""
 
 from collections import defaultdict
-from functools import reduce
+from typing import cast
 
 import networkx as nx
 
 from plasma_network_generator.core import ChannelType, NationSpecs, NodeType
+from plasma_network_generator.profiling import span
 from plasma_network_generator.utils import (
     EU_COUNTRY_CODE,
     eu,
@@ -14,56 +15,44 @@ from plasma_network_generator.utils import (
 )
 
 
-def generate_plasma_network(
-    payment_subnetworks_random_models,
-    rnd_seed,
+def plasma_subnetworks_to_instantiate(
+    payment_subnetworks_random_models: list[dict],
     nations: NationSpecs,
-    unique_cb: bool = False,
-):
-    # The different subnetworks are generated one by one, according to the rnd_model_params in their random model
-    # (we reify the list and do nt allow "map" to work lazily here with the subsequent "reduce" because we need to
-    # individually return the subnetwork instances for possibly dumping them to file)
+) -> list[tuple[dict, list[str]]]:
+    """Get the (random model, nations) of each subnetwork to instantiate, in order.
 
-    subnetwork_instances = []
-
-    # national models
+    Each national model is instantiated once per nation, then each international
+    model once for all the nations.
+    """
     # sorted for reproducibility
     nations_list = sorted(nations.nations)
-    for nation in nations_list:
-        subnetwork_instances.extend(
-            [
-                instantiate_plasma_subnetwork(
-                    rnd_model,
-                    rnd_seed,
-                    [nation],
-                    unique_cb=unique_cb,
-                )
-                for rnd_model in payment_subnetworks_random_models
-                if rnd_model["type"] == ChannelType.NATIONAL.value
-            ],
-        )
-    # international models
-    subnetwork_instances.extend(
-        [
-            instantiate_plasma_subnetwork(
-                rnd_model,
-                rnd_seed,
-                nations_list,
-                unique_cb=unique_cb,
-            )
-            for rnd_model in payment_subnetworks_random_models
-            if rnd_model["type"] == ChannelType.INTERNATIONAL.value
-        ],
+    subnetworks = [
+        (rnd_model, [nation])
+        for nation in nations_list
+        for rnd_model in payment_subnetworks_random_models
+        if rnd_model["type"] == ChannelType.NATIONAL.value
+    ]
+    subnetworks.extend(
+        (rnd_model, nations_list)
+        for rnd_model in payment_subnetworks_random_models
+        if rnd_model["type"] == ChannelType.INTERNATIONAL.value
     )
+    return subnetworks
 
-    # The subnetworks are merged into the full plasma network; the core funtion here is nx.compose,
-    # which takes 2 graphs and combines them by cumulating all nodes and arcs from both graphs.
+
+def merge_plasma_subnetworks(
+    subnetwork_instances: list[nx.MultiDiGraph],
+) -> nx.MultiDiGraph:
+    # The subnetworks are merged into the full plasma network; the core funtion here is nx.compose_all,
+    # which combines the graphs by cumulating all their nodes and arcs.
     # The "key" used to identify nodes in the join is their "label", so the idea for a proper combination is to
     # name nodes consistently in different subnetworks even when looked at separately, which we do.
-    plasma_network = reduce(nx.compose, subnetwork_instances)
-    plasma_network = nx.convert_node_labels_to_integers(
-        plasma_network,
-        label_attribute="label",
+    plasma_network = cast(
+        nx.MultiDiGraph,
+        nx.convert_node_labels_to_integers(
+            nx.compose_all(subnetwork_instances),
+            label_attribute="label",
+        ),
     )
     # clean up global network attributes
     plasma_network.graph.pop("ID", None)
@@ -74,7 +63,37 @@ def generate_plasma_network(
             and "intermediary" in plasma_network.nodes[target]
         ):
             plasma_network.nodes[target]["intermediary"] = src
+    return plasma_network
 
+
+def generate_plasma_network(
+    payment_subnetworks_random_models,
+    rnd_seed,
+    nations: NationSpecs,
+    unique_cb: bool = False,
+):
+    # The different subnetworks are generated one by one, according to the rnd_model_params in their random model
+    # (we reify the list and do nt allow "map" to work lazily here with the subsequent merge because we need to
+    # individually return the subnetwork instances for possibly dumping them to file)
+    subnetwork_instances = []
+    for rnd_model, subnetwork_nations in plasma_subnetworks_to_instantiate(
+        payment_subnetworks_random_models, nations
+    ):
+        with span(
+            "instantiate_plasma_subnetwork",
+            subnetwork=rnd_model["ID"],
+            nations="-".join(subnetwork_nations),
+        ):
+            subnetwork_instances.append(
+                instantiate_plasma_subnetwork(
+                    rnd_model,
+                    rnd_seed,
+                    subnetwork_nations,
+                    unique_cb=unique_cb,
+                )
+            )
+    with span("merge_plasma_subnetworks"):
+        plasma_network = merge_plasma_subnetworks(subnetwork_instances)
     return (plasma_network, subnetwork_instances)
 
 
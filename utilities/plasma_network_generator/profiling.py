@@ -0,0 +1,262 @@
+"""Profiling of the stages of the generator.
+
+The stages are wrapped in span() context managers, which do nothing unless a
+profiler is active, see profiling(). Each span records its wall time, CPU time
+and peak resident set size, and the spans opened inside it as children.
+
+The spans are written to a JSON file in the Chrome trace format, which can be
+loaded in chrome://tracing or https://ui.perfetto.dev, with the tree of the
+spans under the "spans" key.
+"""
+
+import argparse
+import cProfile
+import dataclasses
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+PROC_SELF_DIR = Path("/proc/self")
+# Writing 5 to clear_refs resets the peak resident set size (VmHWM) of the process
+RESET_PEAK_RSS = "5"
+
+
+def _status_kb(field: str) -> int | None:
+    try:
+        status = (PROC_SELF_DIR / "status").read_text()
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1])
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak resident set size of the process, if the kernel allows it."""
+    try:
+        (PROC_SELF_DIR / "clear_refs").write_text(RESET_PEAK_RSS)
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss() -> int:
+    """Get the peak resident set size of the process, in bytes.
+
+    This is the peak since the last reset_peak_rss() where /proc is available, and
+    since the start of the process otherwise.
+    """
+    hwm_kb = _status_kb("VmHWM")
+    if hwm_kb is None:
+        # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    return hwm_kb * 1024
+
+
+def current_rss() -> int:
+    """Get the resident set size of the process in bytes, 0 if unknown."""
+    rss_kb = _status_kb("VmRSS")
+    return 0 if rss_kb is None else rss_kb * 1024
+
+
+@dataclasses.dataclass
+class Span:
+    """A profiled stage; start is in seconds since the start of the profiler."""
+
+    name: str
+    attributes: dict[str, object]
+    start: float
+    start_rss: int
+    peak_rss: int
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    children: list["Span"] = dataclasses.field(default_factory=list)
+
+    @property
+    def peak_rss_delta(self) -> int:
+        """The increase of the peak resident set size over the one at the start."""
+        return max(self.peak_rss - self.start_rss, 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "attributes": self.attributes,
+            "start": self.start,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_rss": self.peak_rss,
+            "peak_rss_delta": self.peak_rss_delta,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class Profiler:
+    """Record nested spans, optionally running cProfile on the spans of a stage.
+
+    The peak memory of the process is reset when a span starts or ends, and the
+    peak measured in between is propagated to all the open spans. The peak of a
+    span thus accounts for its children.
+    """
+
+    def __init__(self, cprofile_stage: str | None = None) -> None:
+        self.origin = time.perf_counter()
+        self.spans: list[Span] = []
+        self.cprofile_stage = cprofile_stage
+        self.cprofile = cProfile.Profile() if cprofile_stage is not None else None
+        self.nb_cprofiled_spans = 0
+        self._open_spans: list[Span] = []
+
+    def _update_peak_rss(self) -> None:
+        peak = peak_rss()
+        for s in self._open_spans:
+            s.peak_rss = max(s.peak_rss, peak)
+        reset_peak_rss()
+
+    @contextmanager
+    def span(self, name: str, **attributes: object) -> Iterator[Span]:
+        self._update_peak_rss()
+        start_rss = current_rss()
+        s = Span(
+            name=name,
+            attributes=attributes,
+            start=time.perf_counter() - self.origin,
+            start_rss=start_rss,
+            peak_rss=start_rss,
+        )
+        (self._open_spans[-1].children if self._open_spans else self.spans).append(s)
+        self._open_spans.append(s)
+        # cProfile can not be enabled twice, e.g. for nested spans of the stage
+        cprofile = (
+            self.cprofile
+            if name == self.cprofile_stage
+            and all(o.name != name for o in self._open_spans[:-1])
+            else None
+        )
+        if cprofile is not None:
+            self.nb_cprofiled_spans += 1
+            cprofile.enable()
+        start_cpu = time.process_time()
+        try:
+            yield s
+        finally:
+            s.cpu_seconds = time.process_time() - start_cpu
+            s.wall_seconds = time.perf_counter() - self.origin - s.start
+            if cprofile is not None:
+                cprofile.disable()
+            self._update_peak_rss()
+            self._open_spans.pop()
+
+    def trace_events(self) -> list[dict]:
+        """Get the spans as complete events of the Chrome trace format."""
+        pid = os.getpid()
+        events = []
+        spans = list(self.spans)
+        while spans:
+            s = spans.pop()
+            events.append(
+                {
+                    "name": s.name,
+                    "ph": "X",
+                    "ts": s.start * 1e6,
+                    "dur": s.wall_seconds * 1e6,
+                    "pid": pid,
+                    "tid": 0,
+                    "args": s.attributes
+                    | {
+                        "cpu_seconds": s.cpu_seconds,
+                        "peak_rss_delta": s.peak_rss_delta,
+                    },
+                }
+            )
+            spans.extend(s.children)
+        return sorted(events, key=lambda e: e["ts"])
+
+    def write(self, output_file: Path) -> None:
+        """Write the spans to output_file, and the cProfile stats next to it."""
+        output_file.write_text(
+            json.dumps(
+                {
+                    "traceEvents": self.trace_events(),
+                    "displayTimeUnit": "ms",
+                    "spans": [s.to_dict() for s in self.spans],
+                },
+                indent=2,
+            )
+        )
+        logging.info("Profile written in %s", output_file)
+        if self.cprofile is None:
+            return
+        if self.nb_cprofiled_spans == 0:
+            logging.warning(
+                "No %s stage was run: nothing to cProfile", self.cprofile_stage
+            )
+            return
+        stats_file = output_file.with_suffix(".prof")
+        self.cprofile.dump_stats(stats_file)
+        logging.info(
+            "cProfile stats of %d %s stages written in %s",
+            self.nb_cprofiled_spans,
+            self.cprofile_stage,
+            stats_file,
+        )
+
+
+_profiler: Profiler | None = None
+
+
+@contextmanager
+def span(name: str, **attributes: object) -> Iterator[None]:
+    """Profile a stage, with the given attributes, if a profiler is active."""
+    if _profiler is None:
+        yield
+        return
+    with _profiler.span(name, **attributes):
+        yield
+
+
+@contextmanager
+def profiling(
+    output_file: Path | None, cprofile_stage: str | None = None
+) -> Iterator[None]:
+    """Activate a profiler, and write its spans to output_file at the end.
+
+    Nothing is done if output_file is None, or if a profiler is already active
+    (e.g. networkx_generator called by generate_all): the spans are then recorded
+    by the active one.
+    """
+    global _profiler
+    if output_file is None or _profiler is not None:
+        yield
+        return
+    _profiler = Profiler(cprofile_stage)
+    try:
+        yield
+    finally:
+        profiler, _profiler = _profiler, None
+        profiler.write(output_file)
+
+
+def add_profiling_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=None,
+        metavar="OUTPUT_FILE",
+        help="profile the time and memory of each stage, and write them to this JSON "
+        "file, in the Chrome trace format",
+    )
+    parser.add_argument(
+        "--profile-stage",
+        default=None,
+        metavar="STAGE",
+        help="also run cProfile on the given stage (e.g. partition_network), and "
+        "write its stats next to the --profile file, with the .prof suffix",
+    )
@@ -0,0 +1,188 @@
+"""Cache of the topologies generated by generate-all, keyed by the generator parameters."""
+
+import dataclasses
+import hashlib
+import json
+import pickle
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import networkx as nx
+
+from plasma_network_generator.utils import fraction_format_str
+
+if TYPE_CHECKING:
+    from _typeshed import DataclassInstance
+
+TOPOLOGY_CACHE_FILE = "topology_cache.json"
+PLASMA_NETWORK_FILE = "plasma_network.pickle"
+
+# The generate-all arguments that do not affect the generated plasma network
+NON_KEY_ARGS = {
+    "version",
+    "verbose",
+    "output_dir",
+    "nb_partitions",
+    "capacity_fractions",
+    "use_cache",
+    "profile",
+    "profile_stage",
+    "analysis_workers",
+}
+
+
+def topology_cache_key(args: "DataclassInstance", model_params_file: Path) -> str:
+    """Compute the cache key of the plasma network generated with the given arguments.
+
+    The key is the hex encoding of a 16-byte blake2b hash of the generator
+    arguments (but the output directory, capacity fractions and number of
+    partitions, which are materialised on demand) and of the content of the model
+    parameters file.
+    """
+    key_args = {
+        name: value
+        for name, value in dataclasses.asdict(args).items()
+        if name not in NON_KEY_ARGS
+    }
+    key_args["model_params_file"] = model_params_file.name
+    m = hashlib.blake2b(digest_size=16)
+    m.update(json.dumps(key_args, sort_keys=True, default=str).encode("utf-8"))
+    m.update(model_params_file.read_bytes())
+    return m.hexdigest()
+
+
+def capacity_dir_name(capacity_fraction: float, nb_digits: int) -> str:
+    return "capacity-" + fraction_format_str(capacity_fraction, nb_digits)
+
+
+class TopologyCache:
+    """The topologies generated in an output directory, for a given cache key.
+
+    The manifest (topology_cache.json) records the key, the number of digits used
+    in the names of the new capacity directories, and the (capacity fraction,
+    number of partitions) outputs that have been completely written, with their
+    capacity directory. The plasma network
+    before capacity scaling is pickled next to it, so that a new capacity fraction
+    or number of partitions can be materialised without generating the network
+    again.
+    """
+
+    def __init__(self, output_dir: Path, key: str) -> None:
+        self.output_dir = output_dir
+        self.key = key
+        self.nb_digits = 0
+        self.outputs: set[tuple[float, int]] = set()
+        self.capacity_dir_names: dict[float, str] = {}
+        manifest_file = output_dir / TOPOLOGY_CACHE_FILE
+        if manifest_file.is_file():
+            manifest = json.loads(manifest_file.read_text())
+            if manifest["key"] != key:
+                msg = (
+                    f"the topologies in {output_dir} were generated with different "
+                    "parameters. Please empty it or choose another one"
+                )
+                raise ValueError(msg)
+            self.nb_digits = manifest["nb_digits"]
+            self.outputs = {
+                (output["capacity_fraction"], output["nb_partitions"])
+                for output in manifest["outputs"]
+            }
+            # the manifests written before the directory names were recorded
+            # formatted all of them with nb_digits
+            self.capacity_dir_names = {
+                output["capacity_fraction"]: output.get(
+                    "capacity_dir",
+                    capacity_dir_name(output["capacity_fraction"], self.nb_digits),
+                )
+                for output in manifest["outputs"]
+            }
+
+    @staticmethod
+    def is_cache_dir(output_dir: Path) -> bool:
+        return (output_dir / TOPOLOGY_CACHE_FILE).is_file()
+
+    @property
+    def network_file(self) -> Path:
+        return self.output_dir / "generator_output" / PLASMA_NETWORK_FILE
+
+    def missing(
+        self, capacity_fractions: Iterable[float], nb_partitions: Iterable[int]
+    ) -> list[tuple[float, int]]:
+        """Get the (capacity fraction, number of partitions) outputs to be generated."""
+        return [
+            (capacity_fraction, n_partitions)
+            for capacity_fraction in capacity_fractions
+            for n_partitions in nb_partitions
+            if (capacity_fraction, n_partitions) not in self.outputs
+        ]
+
+    def load_network(self) -> nx.MultiDiGraph | None:
+        """Load the cached plasma network, None if it is not cached."""
+        if not self.network_file.is_file():
+            return None
+        with self.network_file.open("rb") as f:
+            plasma_network: nx.MultiDiGraph = pickle.load(f)
+        return plasma_network
+
+    def save_network(self, plasma_network: nx.MultiDiGraph) -> None:
+        self.network_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.network_file.with_name(self.network_file.name + ".tmp")
+        with tmp_file.open("wb") as f:
+            pickle.dump(plasma_network, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(self.network_file)
+
+    def set_nb_digits(self, nb_digits: int) -> None:
+        """Set the number of digits of the new capacity directory names.
+
+        The existing capacity directories are never renamed, even if the number
+        of digits grows: the experiments runner hashes the capacity as written in
+        the directory name, and the results of the simulations run on them would
+        be orphaned.
+        """
+        if nb_digits <= self.nb_digits:
+            return
+        self.nb_digits = nb_digits
+        self._save()
+
+    def capacity_dir(self, capacity_fraction: float) -> Path:
+        """Get the directory of a capacity fraction, reusing the existing one."""
+        name = self.capacity_dir_names.get(capacity_fraction)
+        if name is not None:
+            return self.output_dir / name
+        # e.g. a directory partially written by an interrupted run
+        for existing_dir in self.output_dir.glob("capacity-*"):
+            try:
+                if float(existing_dir.name.removeprefix("capacity-")) == (
+                    capacity_fraction
+                ):
+                    return existing_dir
+            except ValueError:
+                continue
+        return self.output_dir / capacity_dir_name(capacity_fraction, self.nb_digits)
+
+    def add(self, capacity_fraction: float, n_partitions: int) -> None:
+        """Record that an output has been completely written."""
+        self.outputs.add((capacity_fraction, n_partitions))
+        self.capacity_dir_names[capacity_fraction] = self.capacity_dir(
+            capacity_fraction
+        ).name
+        self._save()
+
+    def _save(self) -> None:
+        manifest = {
+            "key": self.key,
+            "nb_digits": self.nb_digits,
+            "outputs": [
+                {
+                    "capacity_fraction": capacity_fraction,
+                    "nb_partitions": n_partitions,
+                    "capacity_dir": self.capacity_dir_names[capacity_fraction],
+                }
+                for capacity_fraction, n_partitions in sorted(self.outputs)
+            ],
+        }
+        manifest_file = self.output_dir / TOPOLOGY_CACHE_FILE
+        tmp_file = manifest_file.with_name(manifest_file.name + ".tmp")
+        tmp_file.write_text(json.dumps(manifest, indent=4))
+        tmp_file.replace(manifest_file)
@@ -5,7 +5,7 @@ import json
 import logging
 import math
 import re
-from collections.abc import Callable
+from collections.abc import Callable, Hashable
 from importlib import metadata
 from pathlib import Path
 
@@ -20,6 +20,9 @@ EU_COUNTRY_CODE = "EU"
 
 FLOAT_REGEX_PATTERN = r"[0-9]+\.[0-9]+"
 
+# The breadth-first searches after which diameter_bounds() stops refining the bounds
+DIAMETER_MAX_BFS = 64
+
 
 def string_represents_float(n):
     try:
@@ -486,6 +489,85 @@ def try_is_strongly_connected(subnetwork) -> bool | None:
         return None
 
 
+def _eccentricity(g: nx.DiGraph, source: Hashable) -> tuple[int, dict[Hashable, int]]:
+    """Get the eccentricity of source in g, and the distances from source."""
+    distances = nx.single_source_shortest_path_length(g, source)
+    return max(distances.values()), distances
+
+
+def _nodes_by_distance(distances: dict[Hashable, int]) -> dict[int, list[Hashable]]:
+    levels: dict[int, list[Hashable]] = {}
+    for node, distance in distances.items():
+        levels.setdefault(distance, []).append(node)
+    return levels
+
+
+def _twin_representatives(g: nx.DiGraph, nodes: list[Hashable]) -> list[Hashable]:
+    """Keep one of the given nodes for each set of twins.
+
+    The twins have the same predecessors and successors, and no self-loop: swapping
+    two of them is an automorphism of g, so they have the same eccentricities.
+    """
+    representatives: dict[Hashable, Hashable] = {}
+    for node in nodes:
+        key = (
+            node
+            if g.has_edge(node, node)
+            else (frozenset(g.pred[node]), frozenset(g.succ[node]))
+        )
+        representatives.setdefault(key, node)
+    return list(representatives.values())
+
+
+def diameter_bounds(g: nx.DiGraph, max_bfs: int = DIAMETER_MAX_BFS) -> tuple[int, int]:
+    """Get a lower and an upper bound of the diameter of a strongly connected graph.
+
+    This is the iFUB algorithm for directed graphs (Crescenzi et al., "On computing
+    the diameter of real-world directed (and undirected) graphs", 2013), stopped
+    after about max_bfs breadth-first searches; the bounds are equal if it
+    completes. A double sweep from the node of highest degree u gives the first
+    lower bound. Then the nodes at distance i from (or to) u are visited for
+    decreasing i, the eccentricity of each one raising the lower bound: all the
+    other pairs of nodes are at most 2 * (i - 1) hops apart. The eccentricity is
+    computed once for each set of twins, such as the users with a single channel
+    to the same intermediary.
+    """
+    reverse = g.reverse(copy=False)
+    root = max(g, key=lambda node: g.degree[node])
+    ecc_from_root, distances_from_root = _eccentricity(g, root)
+    ecc_to_root, distances_to_root = _eccentricity(reverse, root)
+    farthest_from_root = max(distances_from_root, key=distances_from_root.__getitem__)
+    farthest_to_root = max(distances_to_root, key=distances_to_root.__getitem__)
+    lower = max(
+        ecc_from_root,
+        ecc_to_root,
+        _eccentricity(reverse, farthest_from_root)[0],
+        _eccentricity(g, farthest_to_root)[0],
+    )
+    upper = ecc_from_root + ecc_to_root
+    nb_bfs = 4
+
+    levels_from_root = _nodes_by_distance(distances_from_root)
+    levels_to_root = _nodes_by_distance(distances_to_root)
+    for i in range(max(ecc_from_root, ecc_to_root), 0, -1):
+        fringe_from_root = _twin_representatives(g, levels_from_root.get(i, []))
+        fringe_to_root = _twin_representatives(g, levels_to_root.get(i, []))
+        if (
+            lower >= upper
+            or nb_bfs + len(fringe_from_root) + len(fringe_to_root) > max_bfs
+        ):
+            break
+        # the longest paths to the nodes at distance i from the root
+        for node in fringe_from_root:
+            lower = max(lower, _eccentricity(reverse, node)[0])
+        # the longest paths from the nodes at distance i to the root
+        for node in fringe_to_root:
+            lower = max(lower, _eccentricity(g, node)[0])
+        nb_bfs += len(fringe_from_root) + len(fringe_to_root)
+        upper = min(upper, max(lower, 2 * (i - 1)))
+    return lower, max(lower, upper)
+
+
 def float_to_str_with_decimals(f):
     """Convert the given float to a string, without resorting to scientific notation (as the builtin str does).
 
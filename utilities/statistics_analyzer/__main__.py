@@ -9,9 +9,19 @@
 # Written by ART (Applied Research Team) - email: appliedresearchteam@bancaditalia.it - web: https://www.bankit.art    #
 ########################################################################################################################
 
-"""Main entrypoint."""
+"""Main entrypoint.
 
-from statistics_analyzer.commands.analyzer import main
+python -m statistics_analyzer [args]            analyse a simulation
+python -m statistics_analyzer batch [args]      analyse a results tree
+"""
+
+import sys
+
+from statistics_analyzer.commands import analyzer, batch
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["batch"]:
+        del sys.argv[1]
+        batch.main()
+    else:
+        analyzer.main()
@@ -1,11 +1,16 @@
+import math
 import os
 from enum import Enum
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from statistics_analyzer.compression import read_output_csv
+
 
 class COLS(str, Enum):
+    CONFIRMED = "confirmed"
     BLOCK_HEIGHT = "block.height"
     BLOCK_TIME = "block.time"
     SWAP_LATENCY = "swap.latency"
@@ -15,65 +20,181 @@ class COLS(str, Enum):
     TX_START_TIME = "tx.start_time"
     TX_SENDER = "tx.sender"
     TX_TYPE = "tx.type"
+    TX_ORIGINATOR = "tx.originator"
+
+
+# The schema of the blockchain_output_*.csv files, in column order. The fields are
+# padded with spaces, and the block height and time of the transactions left in
+# the mempool are blank.
+BLOCKCHAIN_DTYPES = {
+    COLS.CONFIRMED.value: "int8",
+    COLS.BLOCK_HEIGHT.value: "Int64",
+    COLS.BLOCK_TIME.value: "float64",
+    COLS.TX_TYPE.value: "category",
+    COLS.TX_SENDER.value: "int64",
+    COLS.TX_RECEIVER.value: "int64",
+    COLS.TX_AMOUNT.value: "int64",
+    COLS.TX_START_TIME.value: "float64",
+    COLS.TX_ORIGINATOR.value: "int64",
+}
 
 
 def _df_from_blockchain_output(path: str | os.PathLike) -> pd.DataFrame:
-    blockchain_df = pd.read_csv(path)
-    blockchain_df.columns = blockchain_df.columns.str.replace(" ", "")
-    blockchain_df = blockchain_df.replace(r"^\s*$", np.nan, regex=True)
-    blockchain_df[COLS.BLOCK_TIME] = pd.to_numeric(blockchain_df[COLS.BLOCK_TIME])
-    blockchain_df[COLS.TX_START_TIME] = pd.to_numeric(blockchain_df[COLS.TX_START_TIME])
+    """Parse a blockchain output file with its fixed schema (see BLOCKCHAIN_DTYPES)."""
+    # parsing the nullable block height as float and then casting it is much
+    # faster than parsing it as a nullable integer
+    blockchain_df = read_output_csv(
+        Path(path),
+        header=0,
+        names=list(BLOCKCHAIN_DTYPES),
+        dtype=BLOCKCHAIN_DTYPES | {COLS.BLOCK_HEIGHT.value: "float64"},
+        skipinitialspace=True,
+    )
+    blockchain_df[COLS.BLOCK_HEIGHT.value] = blockchain_df[
+        COLS.BLOCK_HEIGHT.value
+    ].astype("Int64")
+    # the transaction types are also padded on the right
+    blockchain_df[COLS.TX_TYPE.value] = blockchain_df[
+        COLS.TX_TYPE.value
+    ].cat.rename_categories(str.strip)
     return blockchain_df
 
 
-def _add_swap_latencies_to_blockchain_df(blockchain_df: pd.DataFrame) -> pd.DataFrame:
-    prepare_htlcs = blockchain_df[
-        blockchain_df[COLS.TX_TYPE].str.contains("PREPARE_HTLC")
-    ].copy()
-    claim_htlcs = blockchain_df[
-        blockchain_df[COLS.TX_TYPE].str.contains("CLAIM_HTLC")
-    ].copy()
-    prepare_htlcs[COLS.SWAP_DISAMBIGUATE_IDX.value] = (
-        prepare_htlcs.groupby(
-            [COLS.TX_SENDER, COLS.TX_RECEIVER, COLS.TX_AMOUNT]
-        ).cumcount()
-        + 1
+def _group_number(*columns: np.ndarray) -> np.ndarray:
+    """Number the distinct rows of the given integer columns.
+
+    The columns are encoded into a single integer key when it can not overflow,
+    which is much faster to sort than the columns themselves.
+    """
+    offsets = [column.min() if len(column) > 0 else 0 for column in columns]
+    radixes = [
+        int(column.max()) - int(offset) + 1 if len(column) > 0 else 1
+        for column, offset in zip(columns, offsets, strict=True)
+    ]
+    if math.prod(radixes) < np.iinfo(np.int64).max:
+        key = np.zeros(len(columns[0]), dtype=np.int64)
+        for column, offset, radix in zip(columns, offsets, radixes, strict=True):
+            key = key * radix + (column - offset)
+        return np.unique(key, return_inverse=True)[1]
+    order = np.lexsort(columns[::-1])
+    is_new_group = np.ones(len(order), dtype=bool)
+    for column in columns:
+        is_new_group[1:] &= np.diff(column[order]) == 0
+    is_new_group[1:] = ~is_new_group[1:]
+    group = np.empty(len(order), dtype=np.int64)
+    group[order] = np.cumsum(is_new_group) - 1
+    return group
+
+
+def _occurrence_index(group: np.ndarray) -> np.ndarray:
+    """Number the occurrences of each group, from 1, in order of appearance."""
+    order = np.argsort(group, kind="stable")
+    sorted_group = group[order]
+    run_starts = np.flatnonzero(
+        np.concatenate(([True], sorted_group[1:] != sorted_group[:-1]))
     )
-    claim_htlcs[COLS.SWAP_DISAMBIGUATE_IDX.value] = (
-        claim_htlcs.groupby(
-            [COLS.TX_SENDER, COLS.TX_RECEIVER, COLS.TX_AMOUNT]
-        ).cumcount()
-        + 1
+    run_lengths = np.diff(np.append(run_starts, len(group)))
+    occurrence = np.empty(len(group), dtype=np.int64)
+    occurrence[order] = np.arange(len(group)) - np.repeat(run_starts, run_lengths) + 1
+    return occurrence
+
+
+def swaps_from_blockchain_df(blockchain_df: pd.DataFrame) -> pd.DataFrame:
+    """Match each PREPARE_HTLC with its CLAIM_HTLC, and compute the swap latency.
+
+    The n-th prepare and the n-th claim with the same (sender, receiver, amount)
+    belong to the same swap: n is the disambiguation index. (sender, receiver,
+    amount) is encoded as a group number, and then (group, index) as a single
+    integer key, so that the claims are matched by a binary search over their
+    sorted keys.
+
+    Returns one row per prepare, in order: the swap key, the prepare block height
+    and start time, the claim block height and time, and the latency (block time
+    of the claim - start time of the prepare, rounded to 2 decimals). The latter
+    three are missing if the prepare is unmatched, or its claim is unconfirmed.
+    """
+    # compare the few transaction types rather than every row
+    tx_type = blockchain_df[COLS.TX_TYPE].astype("category").cat
+    type_names = tx_type.categories.astype(str).str.strip()
+    codes = tx_type.codes.to_numpy()
+    # a missing type has code -1, and picks the trailing False
+    is_prepare = np.append(type_names == "PREPARE_HTLC", False)[codes]
+    is_claim = np.append(type_names == "CLAIM_HTLC", False)[codes]
+    blockchain_df = blockchain_df[is_prepare | is_claim]
+    is_prepare = is_prepare[is_prepare | is_claim]
+
+    # Group number of (sender, receiver, amount)
+    sender = blockchain_df[COLS.TX_SENDER].to_numpy(dtype=np.int64)
+    receiver = blockchain_df[COLS.TX_RECEIVER].to_numpy(dtype=np.int64)
+    amount = blockchain_df[COLS.TX_AMOUNT].to_numpy(dtype=np.int64)
+    group = _group_number(sender, receiver, amount)
+
+    # Single integer key of (group, disambiguation index)
+    prepare_group, claim_group = group[is_prepare], group[~is_prepare]
+    prepare_idx = _occurrence_index(prepare_group)
+    claim_idx = _occurrence_index(claim_group)
+    radix = max(len(prepare_idx), len(claim_idx)) + 1
+    prepare_key = prepare_group * radix + prepare_idx
+    claim_key = claim_group * radix + claim_idx
+
+    # Sort-merge join of the prepares with the claims
+    claim_order = np.argsort(claim_key)
+    sorted_claim_key = claim_key[claim_order]
+    position = np.searchsorted(sorted_claim_key, prepare_key)
+    position[position == len(sorted_claim_key)] = 0
+    is_matched = (
+        sorted_claim_key[position] == prepare_key
+        if len(sorted_claim_key) > 0
+        else np.zeros(len(prepare_key), dtype=bool)
     )
+    claim_row = claim_order[position]
 
-    columns_of_interest = [
-        COLS.TX_TYPE,
-        COLS.TX_SENDER,
-        COLS.TX_RECEIVER,
-        COLS.TX_AMOUNT,
-        COLS.BLOCK_HEIGHT,
-        COLS.SWAP_DISAMBIGUATE_IDX,
-    ]
-    merged = prepare_htlcs[columns_of_interest + [COLS.TX_START_TIME]].merge(
-        claim_htlcs[columns_of_interest + [COLS.BLOCK_TIME]],
-        how="left",
-        on=[
-            COLS.TX_SENDER,
-            COLS.TX_RECEIVER,
-            COLS.TX_AMOUNT,
-            COLS.SWAP_DISAMBIGUATE_IDX,
-        ],
-        suffixes=["_prepare", "_claim"],
-        validate="one_to_one",
+    prepares = blockchain_df[is_prepare]
+    claims = blockchain_df[~is_prepare]
+    claim_block_height = (
+        claims[COLS.BLOCK_HEIGHT].to_numpy(dtype=np.float64, na_value=np.nan)[claim_row]
+        if len(claims) > 0
+        else np.full(len(prepares), np.nan)
+    )
+    claim_block_time = (
+        claims[COLS.BLOCK_TIME].to_numpy(dtype=np.float64)[claim_row]
+        if len(claims) > 0
+        else np.full(len(prepares), np.nan)
     )
-    # If the above one_to_one validation fails, something like the following may be needed: merged.groupby(['tx.sender', 'tx.receiver', 'tx.amount']).first().reset_index()
-    merged = merged.dropna(
-        how="any", subset=[COLS.BLOCK_HEIGHT + "_claim", COLS.BLOCK_TIME]
+    claim_block_height[~is_matched] = np.nan
+    claim_block_time[~is_matched] = np.nan
+    # as for the unmatched prepares, no latency if the claim is unconfirmed
+    claim_block_time[np.isnan(claim_block_height)] = np.nan
+    start_time = prepares[COLS.TX_START_TIME].to_numpy(dtype=np.float64)
+
+    return pd.DataFrame(
+        {
+            COLS.TX_SENDER.value: sender[is_prepare],
+            COLS.TX_RECEIVER.value: receiver[is_prepare],
+            COLS.TX_AMOUNT.value: amount[is_prepare],
+            COLS.SWAP_DISAMBIGUATE_IDX.value: prepare_idx,
+            COLS.BLOCK_HEIGHT + "_prepare": prepares[COLS.BLOCK_HEIGHT]
+            .astype("Int64")
+            .array,
+            COLS.TX_START_TIME.value: start_time,
+            COLS.BLOCK_HEIGHT + "_claim": pd.array(claim_block_height, dtype="Int64"),
+            COLS.BLOCK_TIME.value: claim_block_time,
+            COLS.SWAP_LATENCY.value: np.round(claim_block_time - start_time, 2),
+        }
     )
-    merged[COLS.SWAP_LATENCY.value] = (
-        merged[COLS.BLOCK_TIME] - merged[COLS.TX_START_TIME]
-    ).apply(lambda x: round(x, 2))
-    return merged
+
+
+def _add_swap_latencies_to_blockchain_df(blockchain_df: pd.DataFrame) -> pd.DataFrame:
+    """Get the confirmed swaps of swaps_from_blockchain_df()."""
+    swaps = swaps_from_blockchain_df(blockchain_df)
+    return swaps.dropna(subset=[COLS.SWAP_LATENCY.value])
+
+
+def get_swaps_from_blockchain_output(
+    blockchain_output: str | os.PathLike,
+) -> pd.DataFrame:
+    """Get all the swaps of a blockchain output file, see swaps_from_blockchain_df()."""
+    return swaps_from_blockchain_df(_df_from_blockchain_output(blockchain_output))
 
 
 def get_swap_latencies_from_blockchain_output(
@@ -16,35 +16,85 @@ import json
 import logging
 import pprint
 import sys
+import threading
+import time
 from cmath import nan
 from pathlib import Path
 from textwrap import dedent, indent
 
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 
+from statistics_analyzer.compression import read_output_csv
 from statistics_analyzer.core import (
+    MILLISECONDS_IN_A_MINUTE,
     N_BATCHES,
     DistributionInnerStats,
     DistributionStats,
     GeneralStat,
     PaymentsStats,
-    StatsPerMinute,
-    StatType,
+    PercentileStat,
+    ProgressStat,
+    stats_per_minute_output,
+)
+from statistics_analyzer.counters import (
+    BatchCounter,
+    MinuteCounter,
+    add_minute_counters,
+    batch_counters,
+    batch_stats,
+    minute_counters,
+    stats_per_minute,
 )
 from statistics_analyzer.exceptions import CliArgsValidationError
+from statistics_analyzer.sketch import (
+    PAYMENTS_SKETCHES_FILE,
+    UNKNOWN_TIER,
+    PaymentsSketches,
+    merge_payments_sketches,
+    payments_sketches,
+    percentiles_output,
+    write_payments_sketches,
+)
+from statistics_analyzer.tail import CsvTail
 from statistics_analyzer.utils import (
     EXIT_FAILURE,
     EXIT_SUCCESS,
     check_path_is_directory,
     configure_logging,
     count_file_in_dir,
+    find_output_files,
 )
 
 DEFAULT_INPUT_DIR = Path("output_dir")
 DEFAULT_OUTPUT_DIR = Path("output_dir")
 PAYMENTS_OUTPUT_FILE_PATTERN = "payments_output_*.csv"
 CHANNEL_OUTPUT_FILE_PATTERN = "channels_output_*.csv"
+DEFAULT_FOLLOW_INTERVAL = 10.0
+DEFAULT_FOLLOW_IDLE_TIMEOUT = 3600.0
+PAYMENTS_DTYPES = {
+    "id": "int64",
+    "type": "category",
+    "sender_id": "category",
+    "receiver_id": "category",
+    "amount": "int64",
+    "start_time": "int64",
+    "end_time": "int64",
+    "mpp": "category",
+    "is_success": "category",
+    "no_balance_count": "int64",
+    "offline_node_count": "int64",
+    "timeout_exp": "category",
+    "attempts": "int64",
+    "first_no_balance_error": "string",
+    "route": "string",
+    "route_ids": "string",
+}
+NODE_LABEL_COLUMNS = ["sender_id", "receiver_id"]
+NODE_LABEL_NATION_REGEX = (
+    r"^(?:CB|Intermediary|Retail|Unbanked|Merchant-\w+-)([A-Z]+)\d+$"
+)
 
 
 @dataclasses.dataclass(frozen=True)
@@ -57,12 +107,30 @@ class Args:
         input_dir: Path, input directory
         rank_index: int, index of the rank to be analyzed
         output_dir: Path, output directory
+        route_length_breakdowns: bool, also compute the route length distribution
+            per payment type and per sender nation
+        follow: bool, follow the output files while the simulation is running
+        follow_interval: float, seconds between two reads of the output files
+        follow_idle_timeout: float | None, stop following after this many seconds
+            without new payments (None: only when the simulation ends)
+        simulation_end: int | None, simulation end time in milliseconds, used to
+            compute the batches and the progress while following
+        nb_batches: int, number of batches of the batch means confidence intervals
+        bucket_ms: int, length in milliseconds of the time buckets of the per-minute
+            statistics (the counts of each bucket are given as rates per minute)
     """
 
     verbose: bool
     input_dir: Path
     output_dir: Path
     rank_idx: int | None
+    route_length_breakdowns: bool = False
+    follow: bool = False
+    follow_interval: float = DEFAULT_FOLLOW_INTERVAL
+    follow_idle_timeout: float | None = DEFAULT_FOLLOW_IDLE_TIMEOUT
+    simulation_end: int | None = None
+    nb_batches: int = N_BATCHES
+    bucket_ms: int = MILLISECONDS_IN_A_MINUTE
 
     def print_args(self) -> str:
         """Get a string representation of the arguments."""
@@ -97,6 +165,17 @@ def get_description() -> str:
     Example 2: Generate the payment statistics for the simulation of a specific rank
 
         $ python cloth/cloth-statistics-analyzer/statistics_analyzer/commands/analyzer.py --input-dir ./output_dir --output-dir ./output_dir --rank-idx 0
+
+    The output files may also be compressed (e.g. payments_output_0.csv.gz or
+    payments_output_0.csv.zst): they are decompressed on the fly.
+
+    Example 3: Wait for a running simulation, checking its output files every 30
+    seconds, and compute the statistics as soon as it ends. A partial
+    cloth_output.json is rewritten whenever new payments are read. The simulator
+    writes the payments of each rank when the simulation ends, so the idle timeout
+    must be longer than the remaining simulation time
+
+        $ python cloth/cloth-statistics-analyzer/statistics_analyzer/commands/analyzer.py --input-dir ./output_dir --output-dir ./output_dir --follow --follow-interval 30 --follow-idle-timeout 7200 --simulation-end 86400000
     \
     """,
     )
@@ -130,6 +209,48 @@ def get_parser() -> argparse.ArgumentParser:
         help="the rank index to be analyzed",
         default=None,
     )
+    parser.add_argument(
+        "--route-length-breakdowns",
+        action="store_true",
+        help="also compute the route length distribution per payment type and per sender nation",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="follow the (uncompressed) payments output files while the simulation is running",
+    )
+    parser.add_argument(
+        "--follow-interval",
+        type=float,
+        help=f"seconds between two reads of the followed files (default: {DEFAULT_FOLLOW_INTERVAL})",
+        default=DEFAULT_FOLLOW_INTERVAL,
+    )
+    parser.add_argument(
+        "--follow-idle-timeout",
+        type=float,
+        help="stop following after this many seconds without new payments, if the "
+        f"simulation has not ended (default: {DEFAULT_FOLLOW_IDLE_TIMEOUT:.0f})",
+        default=DEFAULT_FOLLOW_IDLE_TIMEOUT,
+    )
+    parser.add_argument(
+        "--nb-batches",
+        type=int,
+        help=f"number of batches of the batch means confidence intervals (default: {N_BATCHES})",
+        default=N_BATCHES,
+    )
+    parser.add_argument(
+        "--bucket-ms",
+        type=int,
+        help="length in milliseconds of the time buckets of the per-minute statistics, "
+        f"whose counts are given as rates per minute (default: {MILLISECONDS_IN_A_MINUTE})",
+        default=MILLISECONDS_IN_A_MINUTE,
+    )
+    parser.add_argument(
+        "--simulation-end",
+        type=int,
+        help="simulation end time in milliseconds, used for the batches and the progress while following",
+        default=None,
+    )
     return parser
 
 
@@ -143,229 +264,250 @@ def parse_args() -> Args:
         input_dir=raw_args.input_dir.resolve(),
         output_dir=raw_args.output_dir.resolve(),
         rank_idx=raw_args.rank_idx,
+        route_length_breakdowns=raw_args.route_length_breakdowns,
+        follow=raw_args.follow,
+        follow_interval=raw_args.follow_interval,
+        follow_idle_timeout=raw_args.follow_idle_timeout,
+        simulation_end=raw_args.simulation_end,
+        nb_batches=raw_args.nb_batches,
+        bucket_ms=raw_args.bucket_ms,
     )
 
 
 def _read_channels_output_files(args: Args, pattern: str) -> pd.DataFrame:
     """Read the payments_output_*.csv files"""
     logging.debug("Reading input directory %s", args.input_dir)
-    channel_output_files = sorted(args.input_dir.glob(pattern))
+    channel_output_files = find_output_files(args.input_dir, pattern)
     if args.verbose:
         logging.debug(
             "Reading files:\n%s", "\n".join(file.name for file in channel_output_files)
         )
     all_channels_df = pd.concat(
-        (pd.read_csv(f) for f in channel_output_files), ignore_index=True
+        (read_output_csv(f) for f in channel_output_files), ignore_index=True
     ).sort_values(by=["id"])
     return all_channels_df
 
 
-def _read_payments_output_files(args: Args, pattern: str) -> pd.DataFrame:
-    """Read the payments_output_*.csv files"""
+def _summarize_routes(payments_df: pd.DataFrame) -> None:
+    """Add the compact route columns needed by the statistics.
+
+    The columns are:
+        route_length: number of hops of successful payments (NaN otherwise)
+        routed_by: "L1" if a successful payment crossed a CB, "L2" otherwise
+        no_route: True if no route was found for the payment
+    """
+    is_success = payments_df["is_success"] == "1"
+    payments_df["route_length"] = (
+        payments_df["route_ids"].str.count("-").add(1).astype("float64")
+    ).where(is_success)
+    payments_df["routed_by"] = pd.Categorical(
+        np.where(payments_df["route"].str.contains("CB", na=False), "L1", "L2"),
+        categories=["L1", "L2"],
+    )
+    payments_df.loc[~is_success, "routed_by"] = np.nan
+    # the simulator writes an empty route and -1 route ids when no route was found
+    payments_df["no_route"] = (
+        (payments_df["route_ids"] == "-1").fillna(False).astype(bool)
+    )
+
+
+def _concat_output_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate the per-rank frames, keeping the categorical columns categorical.
+
+    The sender and receiver columns share the same categories, i.e. the node labels.
+    """
+    categorical_columns = [
+        [column]
+        for column in frames[0].select_dtypes("category").columns
+        if column not in NODE_LABEL_COLUMNS
+    ]
+    if all(column in frames[0].columns for column in NODE_LABEL_COLUMNS):
+        categorical_columns.append(NODE_LABEL_COLUMNS)
+    for columns in categorical_columns:
+        categories = union_categoricals(
+            [df[column] for df in frames for column in columns], sort_categories=True
+        ).categories
+        for df in frames:
+            for column in columns:
+                df[column] = df[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _read_payments_output_files(
+    args: Args, pattern: str, keep_routes: bool = False
+) -> pd.DataFrame:
+    """Read the payments_output_*.csv files
+
+    The sender and receiver labels are loaded as categoricals. Unless keep_routes is
+    set, the route strings are reduced file by file to the compact columns added by
+    _summarize_routes, and are not kept in memory.
+    """
     logging.debug("Reading input directory %s", args.input_dir)
-    payments_output_files = sorted(args.input_dir.glob(pattern))
+    payments_output_files = find_output_files(args.input_dir, pattern)
     if args.verbose:
         logging.debug(
             "Reading files:\n%s", "\n".join(file.name for file in payments_output_files)
         )
-    all_payments_df = pd.concat(
-        (
-            pd.read_csv(
-                f,
-                dtype={
-                    "id": "int64",
-                    "type": "category",
-                    "sender_id": "string",
-                    "receiver_id": "string",
-                    "amount": "int64",
-                    "start_time": "int64",
-                    "end_time": "int64",
-                    "mpp": "category",
-                    "is_success": "category",
-                    "no_balance_count": "int64",
-                    "offline_node_count": "int64",
-                    "timeout_exp": "category",
-                    "attempts": "int64",
-                    "first_no_balance_error": "string",
-                    "route": "string",
-                    "route_ids": "string",
-                },
-            )
-            for f in payments_output_files
-        ),
-        ignore_index=True,
-    ).sort_values(by=["start_time"])
+    frames = []
+    for f in payments_output_files:
+        payments_df = read_output_csv(
+            f,
+            dtype=PAYMENTS_DTYPES,
+            usecols=lambda column: keep_routes or column != "first_no_balance_error",
+        )
+        _summarize_routes(payments_df)
+        if not keep_routes:
+            payments_df = payments_df.drop(columns=["route", "route_ids"])
+        frames.append(payments_df)
+    all_payments_df = _concat_output_frames(frames).sort_values(by=["start_time"])
     return all_payments_df
 
 
+def _nb_buckets(args: Args) -> int:
+    """Get the number of time buckets up to the simulation end, 0 if unknown."""
+    if args.simulation_end is None:
+        return 0
+    return -(-args.simulation_end // args.bucket_ms)
+
+
 def _compute_stats_per_minute(
-    payments_stats: PaymentsStats, all_payments_df: pd.DataFrame
+    args: Args, payments_stats: PaymentsStats, all_payments_df: pd.DataFrame
 ) -> None:
-    df = all_payments_df.copy()
-    milliseconds_in_a_minute = 60 * 1000
-    df["start_minute"] = (df["start_time"] // milliseconds_in_a_minute) % (60 * 24)
-    df["start_minute"] = df["start_minute"].astype("category")
-    df["is_success"] = df["is_success"].astype("int")
-    payments_stats.stats_per_minute[StatsPerMinute.TX_PER_MINUTE] = {
-        int(hour): float(value)
-        for hour, value in df[df["type"] == "0"]
-        .groupby(["start_minute"], observed=False)["id"]
-        .count()
-        .items()
-    }
-    payments_stats.stats_per_minute[StatsPerMinute.PSR_PER_MINUTE] = {
-        int(hour): float(value)
-        for hour, value in df[df["type"] == "0"]
-        .groupby(["start_minute"], observed=False)["is_success"]
-        .mean()
-        .round(2)
-        .items()
-    }
-    payments_stats.stats_per_minute[StatsPerMinute.DEPOSITS_PER_MINUTE] = {
-        int(hour): float(value)
-        for hour, value in df[df["type"] == "1"]
-        .groupby(["start_minute"], observed=False)["id"]
-        .count()
-        .items()
-    }
-    payments_stats.stats_per_minute[StatsPerMinute.WITHDRAWALS_PER_MINUTE] = {
-        int(hour): float(value)
-        for hour, value in df[df["type"] == "2"]
-        .groupby(["start_minute"], observed=False)["id"]
-        .count()
-        .items()
+    payments_stats.stats_per_minute = stats_per_minute(
+        minute_counters(all_payments_df, args.bucket_ms, _nb_buckets(args)),
+        args.bucket_ms,
+    )
+
+
+def _compute_per_batch_stats(
+    payments_stats: PaymentsStats, txs_df: pd.DataFrame, batch: np.ndarray
+) -> None:
+    counters = batch_counters(txs_df, batch, payments_stats.nb_batches)
+    # only the batches in which at least one transaction started are considered
+    counters = counters[:, counters[BatchCounter.TOTAL] > 0]
+    payments_stats.batches = batch_stats(counters)
+
+
+def _node_label_nations(labels: pd.Index) -> pd.Categorical:
+    """Extract the nation of each node label (NaN when the label has no nation)."""
+    return pd.Categorical(labels.str.extract(NODE_LABEL_NATION_REGEX, expand=False))
+
+
+def _route_length_counts(
+    df: pd.DataFrame, group_codes: np.ndarray, nb_groups: int
+) -> np.ndarray:
+    """Count the routed payments by group, route length and routed_by, in a single pass.
+
+    Returns an array of shape (nb_groups, max_route_length + 1, 3), whose last axis
+    holds the counts of payments routed by nobody (i.e. failed), by L1 and by L2.
+    Rows with a negative group code are ignored.
+    """
+    lengths = df["route_length"].to_numpy()
+    has_route = ~np.isnan(lengths) & (group_codes >= 0)
+    lengths = lengths[has_route].astype(np.int64)
+    routed_by = (
+        (df["routed_by"] == "L1").to_numpy(dtype=np.int64)
+        + 2 * (df["routed_by"] == "L2").to_numpy(dtype=np.int64)
+    )[has_route]
+    nb_lengths = int(lengths.max()) + 1 if lengths.size > 0 else 0
+    flat_index = (group_codes[has_route] * nb_lengths + lengths) * 3 + routed_by
+    return np.bincount(flat_index, minlength=nb_groups * nb_lengths * 3).reshape(
+        nb_groups, nb_lengths, 3
+    )
+
+
+def _route_length_distribution(
+    counts: np.ndarray,
+) -> dict[int, dict[DistributionInnerStats, float]]:
+    """Convert the (route length, routed_by) counts of one group to the output format."""
+    return {
+        int(length): {
+            DistributionInnerStats.TOTAL: int(counts[length].sum()),
+            DistributionInnerStats.ROUTED_BY_L1: int(counts[length, 1]),
+            DistributionInnerStats.ROUTED_BY_L2: int(counts[length, 2]),
+        }
+        for length in np.flatnonzero(counts.sum(axis=1))
     }
-    payments_stats.stats_per_minute[StatsPerMinute.SUBMARINE_SWAPS_PER_MINUTE] = {
-        int(hour): float(value)
-        for hour, value in df[df["type"] == "3"]
-        .groupby(["start_minute"], observed=False)["id"]
-        .count()
-        .items()
+
+
+def _route_length_distribution_by(
+    df: pd.DataFrame, groups: pd.Categorical
+) -> dict[str, dict[int, dict[DistributionInnerStats, float]]]:
+    """Compute the route length distribution for each category of groups."""
+    counts = _route_length_counts(df, groups.codes, len(groups.categories))
+    return {
+        str(group): _route_length_distribution(counts[code])
+        for code, group in enumerate(groups.categories)
+        if counts[code].any()
     }
 
 
-def _compute_per_batch_stats(
-    payments_stats: PaymentsStats, txs_df: pd.DataFrame
+def _compute_distribution_stats(
+    payments_stats: PaymentsStats,
+    txs_df: pd.DataFrame,
+    all_payments_df: pd.DataFrame,
+    breakdowns: bool = False,
 ) -> None:
-    total_per_batch = np.array(
-        txs_df.groupby(["batch"], observed=False)["batch"].count()
-    )
-    payments_stats.batches[StatType.SUCCESS] = np.array(
-        txs_df[txs_df["is_success"] == "1"]
-        .groupby(["batch"], observed=False)["batch"]
-        .count()
+    counts = _route_length_counts(txs_df, np.zeros(len(txs_df), dtype=np.int64), 1)
+    payments_stats.distributions_stats[DistributionStats.ROUTE_LENGTH_DISTR] = (
+        _route_length_distribution(counts[0])
     )
+    if not breakdowns:
+        return
 
-    payments_stats.batches[StatType.ATTEMPTS] = np.array(
-        txs_df[txs_df["is_success"] == "1"]
-        .groupby(["batch"], observed=False)["attempts"]
-        .sum()
+    payments_stats.distributions_stats[DistributionStats.ROUTE_LENGTH_DISTR_BY_TYPE] = (
+        _route_length_distribution_by(all_payments_df, all_payments_df["type"].array)
     )
-    payments_stats.batches[StatType.ATTEMPTS] = np.divide(
-        payments_stats.batches[StatType.ATTEMPTS],
-        payments_stats.batches[StatType.SUCCESS],
+    # the nation of a transaction is the nation of its sender
+    nations = _node_label_nations(txs_df["sender_id"].cat.categories)
+    sender_codes = txs_df["sender_id"].cat.codes.to_numpy()
+    sender_nations = pd.Categorical.from_codes(
+        np.where(sender_codes >= 0, nations.codes[sender_codes], -1),
+        categories=nations.categories,
     )
+    payments_stats.distributions_stats[
+        DistributionStats.ROUTE_LENGTH_DISTR_BY_NATION
+    ] = _route_length_distribution_by(txs_df, sender_nations)
 
-    payments_stats.batches[StatType.TIME] = np.array(
-        txs_df[txs_df["is_success"] == "1"]
-        .groupby(["batch"], observed=False)["time"]
-        .sum()
-    )
-    payments_stats.batches[StatType.TIME] = np.divide(
-        payments_stats.batches[StatType.TIME], payments_stats.batches[StatType.SUCCESS]
-    )
 
-    payments_stats.batches[StatType.ROUTE_LENGTH] = np.array(
-        txs_df[txs_df["is_success"] == "1"]
-        .groupby(["batch"], observed=False)["route_length"]
-        .sum()
-    )
-    payments_stats.batches[StatType.ROUTE_LENGTH] = np.divide(
-        payments_stats.batches[StatType.ROUTE_LENGTH],
-        payments_stats.batches[StatType.SUCCESS],
-    )
+def _node_label_tiers(labels: pd.Index) -> np.ndarray:
+    """Get the tier of each node label: 1 for CBs, 2 for intermediaries, 3 otherwise."""
+    return np.select(
+        [labels.str.startswith("CB"), labels.str.startswith("Intermediary")],
+        [1, 2],
+        default=3,
+    ).astype(np.int8)
 
-    payments_stats.batches[StatType.FAIL_TIMEOUT_EXPIRED] = np.array(
-        txs_df[(txs_df["is_success"] == "0") & (txs_df["timeout_exp"] == "1")]
-        .groupby(["batch"], observed=False)["batch"]
-        .count()
-    )
-    payments_stats.batches[StatType.FAIL_TIMEOUT_EXPIRED] = np.divide(
-        payments_stats.batches[StatType.FAIL_TIMEOUT_EXPIRED], total_per_batch
-    )
 
-    payments_stats.batches[StatType.FAIL_NO_PATH] = np.array(
-        txs_df[
-            (txs_df["is_success"] == "0")
-            & (txs_df["timeout_exp"] == "0")
-            & (txs_df["route"] == -1)
-        ]
-        .groupby(["batch"], observed=False)["batch"]
-        .count()
-    )
-    payments_stats.batches[StatType.FAIL_NO_PATH] = np.divide(
-        payments_stats.batches[StatType.FAIL_NO_PATH], total_per_batch
-    )
+def _node_tiers(nodes: pd.Series) -> np.ndarray:
+    """Get the tier of each node of a categorical column (see _node_label_tiers).
 
-    payments_stats.batches[StatType.FAIL_OFFLINE] = np.array(
-        txs_df[
-            (txs_df["is_success"] == "0")
-            & (txs_df["timeout_exp"] == "0")
-            & (txs_df["route"] != -1)
-            & (txs_df["offline_node_count"] > txs_df["no_balance_count"])
-        ]
-        .groupby(["batch"], observed=False)["batch"]
-        .count()
-    )
-    payments_stats.batches[StatType.FAIL_OFFLINE] = np.divide(
-        payments_stats.batches[StatType.FAIL_OFFLINE], total_per_batch
-    )
+    The tier is derived once per distinct node label, and then mapped onto the
+    categorical codes. It is UNKNOWN_TIER for the missing nodes (code -1).
+    """
+    tiers = _node_label_tiers(nodes.cat.categories)
+    codes = nodes.cat.codes.to_numpy()
+    return np.where(codes >= 0, tiers[codes], UNKNOWN_TIER).astype(np.int8)
 
-    payments_stats.batches[StatType.FAIL_NO_BALANCE] = np.array(
-        txs_df[
-            (txs_df["is_success"] == "0")
-            & (txs_df["timeout_exp"] == "0")
-            & (txs_df["route"] != -1)
-            & (txs_df["offline_node_count"] <= txs_df["no_balance_count"])
-        ]
-        .groupby(["batch"], observed=False)["batch"]
-        .count()
-    )
-    payments_stats.batches[StatType.FAIL_NO_BALANCE] = np.divide(
-        payments_stats.batches[StatType.FAIL_NO_BALANCE], total_per_batch
-    )
 
-    payments_stats.batches[StatType.SUCCESS] = np.divide(
-        payments_stats.batches[StatType.SUCCESS], total_per_batch
-    )
+def _sender_tiers(payments_df: pd.DataFrame) -> np.ndarray:
+    """Get the tier of the sender of each payment (see _node_tiers)."""
+    return _node_tiers(payments_df["sender_id"])
 
 
-def _compute_distribution_stats(
-    payments_stats: PaymentsStats, txs_df: pd.DataFrame
-) -> None:
-    # Initialize the dictionary to store the results
-    result_dict = {}
-    for length in txs_df["route_length"].dropna().unique():
-        # Filter the DataFrame for the current route_length
-        subset_df = txs_df[txs_df["route_length"] == length]
-
-        # Count total rows for the current route_length
-        total_count = len(subset_df)
-
-        # Count rows for 'L1' and 'L2'
-        l1_count = len(subset_df[subset_df["routed_by"] == "L1"])
-        l2_count = len(subset_df[subset_df["routed_by"] == "L2"])
-
-        # Store the counts in the result dictionary
-        result_dict[int(length)] = {
-            DistributionInnerStats.TOTAL: total_count,
-            DistributionInnerStats.ROUTED_BY_L1: l1_count,
-            DistributionInnerStats.ROUTED_BY_L2: l2_count,
-        }
+def _count_payments_by_type_and_tiers(all_payments_df: pd.DataFrame) -> pd.Series:
+    """Count the payments by (type, sender_tier, receiver_tier) (see _node_tiers).
 
-    payments_stats.distributions_stats[DistributionStats.ROUTE_LENGTH_DISTR] = (
-        result_dict
-    )
+    The payments with a missing sender or receiver are counted with UNKNOWN_TIER,
+    so that they still count in the totals per type.
+    """
+    return pd.DataFrame(
+        {
+            "type": all_payments_df["type"],
+            "sender_tier": _node_tiers(all_payments_df["sender_id"]),
+            "receiver_tier": _node_tiers(all_payments_df["receiver_id"]),
+        }
+    ).value_counts(sort=False)
 
 
 def _set_channel_type(x):
@@ -378,14 +520,6 @@ def _set_channel_type(x):
     return "2<>3"
 
 
-def _compute_routed_by(x):
-    if x["is_success"] == "1":
-        if "CB" in x["route"]:
-            return "L1"
-        return "L2"
-    return nan
-
-
 def _compute_total_capacity(args: Args) -> float:
     pattern = (
         CHANNEL_OUTPUT_FILE_PATTERN
@@ -401,35 +535,37 @@ def _compute_total_capacity(args: Args) -> float:
     )
 
 
-def _do_job(args: Args, pattern: str) -> None:
-    """Read the payments_output_*.csv files"""
-    all_payments_df = _read_payments_output_files(args, pattern)
-
+def _transactions_df(all_payments_df: pd.DataFrame) -> pd.DataFrame:
     """Filter transactions only (no withdrawals, deposits, and atomics swaps)"""
     txs_df = all_payments_df[all_payments_df["type"] == "0"].copy()
+    txs_df["time"] = txs_df["end_time"] - txs_df["start_time"]
+    return txs_df
+
 
-    """Find batch length"""
+def _transaction_batches(args: Args, txs_df: pd.DataFrame) -> np.ndarray:
+    """Find the batch of each transaction, splitting the simulated time evenly."""
     last_payment_time = txs_df.iloc[-1]["start_time"]
-    batch_length = (last_payment_time + 1) / N_BATCHES
+    batch_length = (last_payment_time + 1) / args.nb_batches
     if args.verbose:
         logging.info("Batch length: %.2f ms", batch_length)
         logging.info("Total simulated time: %d ms", last_payment_time)
+    start_times = txs_df["start_time"].to_numpy()
+    batches: np.ndarray = (start_times / batch_length).astype(np.int64)
+    return batches
 
-    """Add support columns"""
-    txs_df["time"] = txs_df["end_time"] - txs_df["start_time"]
-    txs_df["route_length"] = txs_df.apply(
-        lambda x: len(x["route_ids"].split("-")) if x["is_success"] == "1" else nan,
-        axis=1,
-    )
-    txs_df["routed_by"] = txs_df.apply(_compute_routed_by, axis=1)
-    txs_df["batch"] = (
-        (txs_df["start_time"] / batch_length).astype("int").astype("category")
-    )
+
+def _do_job(args: Args, pattern: str) -> None:
+    """Read the payments_output_*.csv files"""
+    all_payments_df = _read_payments_output_files(args, pattern)
+
+    """Filter transactions only and find their batches"""
+    txs_df = _transactions_df(all_payments_df)
+    batch = _transaction_batches(args, txs_df)
 
     """Compute per batch payment stats"""
-    payments_stats = PaymentsStats()
-    _compute_per_batch_stats(payments_stats, txs_df)
-    _compute_stats_per_minute(payments_stats, all_payments_df)
+    payments_stats = PaymentsStats(nb_batches=args.nb_batches)
+    _compute_per_batch_stats(payments_stats, txs_df, batch)
+    _compute_stats_per_minute(args, payments_stats, all_payments_df)
 
     """Compute batch means"""
     payments_stats.compute_batch_means()
@@ -440,43 +576,25 @@ def _do_job(args: Args, pattern: str) -> None:
 
     """Compute general stats"""
     payments_stats.general_stats[GeneralStat.TOTAL_PAYMENTS] = len(txs_df)
-    payments_stats.general_stats[GeneralStat.TOTAL_DEPOSITS] = len(
-        all_payments_df[all_payments_df["type"] == "1"]
+    payment_counts = _count_payments_by_type_and_tiers(all_payments_df)
+    payments_per_type = payment_counts.groupby(level="type", observed=True).sum()
+    payments_stats.general_stats[GeneralStat.TOTAL_DEPOSITS] = int(
+        payments_per_type.get("1", 0)
     )
-    payments_stats.general_stats[GeneralStat.TOTAL_WITHDRAWALS] = len(
-        all_payments_df[all_payments_df["type"] == "2"]
+    payments_stats.general_stats[GeneralStat.TOTAL_WITHDRAWALS] = int(
+        payments_per_type.get("2", 0)
     )
-    payments_stats.general_stats[GeneralStat.TOTAL_SUBMARINE_SWAPS] = len(
-        all_payments_df[all_payments_df["type"] == "3"]
+    payments_stats.general_stats[GeneralStat.TOTAL_SUBMARINE_SWAPS] = int(
+        payments_per_type.get("3", 0)
     )
-    payments_stats.general_stats[GeneralStat.TOTAL_SUBMARINE_SWAPS_1_1] = len(
-        all_payments_df[
-            (all_payments_df["type"] == "3")
-            & (all_payments_df["sender_id"].str.startswith("CB"))
-            & (all_payments_df["receiver_id"].str.startswith("CB"))
-        ]
+    payments_stats.general_stats[GeneralStat.TOTAL_SUBMARINE_SWAPS_1_1] = int(
+        payment_counts.get(("3", 1, 1), 0)
     )
-    payments_stats.general_stats[GeneralStat.TOTAL_SUBMARINE_SWAPS_2_2] = len(
-        all_payments_df[
-            (all_payments_df["type"] == "3")
-            & (all_payments_df["sender_id"].str.startswith("Intermediary"))
-            & (all_payments_df["receiver_id"].str.startswith("Intermediary"))
-        ]
+    payments_stats.general_stats[GeneralStat.TOTAL_SUBMARINE_SWAPS_2_2] = int(
+        payment_counts.get(("3", 2, 2), 0)
     )
-    payments_stats.general_stats[GeneralStat.TOTAL_SUBMARINE_SWAPS_1_2] = len(
-        all_payments_df[
-            (all_payments_df["type"] == "3")
-            & (
-                (
-                    (all_payments_df["sender_id"].str.startswith("CB"))
-                    & (all_payments_df["receiver_id"].str.startswith("Intermediary"))
-                )
-                | (
-                    (all_payments_df["sender_id"].str.startswith("Intermediary"))
-                    & (all_payments_df["receiver_id"].str.startswith("CB"))
-                )
-            )
-        ]
+    payments_stats.general_stats[GeneralStat.TOTAL_SUBMARINE_SWAPS_1_2] = int(
+        payment_counts.get(("3", 1, 2), 0) + payment_counts.get(("3", 2, 1), 0)
     )
     payments_stats.general_stats[GeneralStat.TOTAL_WHOLESALE_CAPACITY] = (
         _compute_total_capacity(args)
@@ -490,6 +608,7 @@ def _do_job(args: Args, pattern: str) -> None:
         if payments_stats.general_stats[GeneralStat.TOTAL_WHOLESALE_CAPACITY] > 0
         else nan
     )
+    payments_stats.general_stats[GeneralStat.STATS_BUCKET_MS] = args.bucket_ms
     if args.verbose:
         logging.info(
             "Total number of payments: %d",
@@ -520,42 +639,267 @@ def _do_job(args: Args, pattern: str) -> None:
             payments_stats.general_stats[GeneralStat.VOLUME_CAPACITY_RATIO],
         )
 
-    _compute_distribution_stats(payments_stats, txs_df)
+    _compute_distribution_stats(
+        payments_stats, txs_df, all_payments_df, args.route_length_breakdowns
+    )
+
+    """Compute percentiles"""
+    sketches = payments_sketches(all_payments_df, _sender_tiers(all_payments_df))
+    payments_stats.percentiles = percentiles_output(sketches)
+    if args.verbose:
+        logging.info(
+            "Transactions latency percentiles: %s",
+            payments_stats.percentiles[PercentileStat.TIME]["All"],
+        )
 
     """Write json output"""
-    output_filename = (
-        "cloth_output.json"
-        if args.rank_idx is None
-        else f"cloth_output_{args.rank_idx}.json"
-    )
-    output_file = args.output_dir / output_filename
+    output_file = _output_file(args)
     output_data = (
         payments_stats.data
         | payments_stats.general_stats
         | payments_stats.distributions_stats
-        | payments_stats.stats_per_minute
+        | stats_per_minute_output(payments_stats.stats_per_minute)
+        | {PercentileStat.PERCENTILES: payments_stats.percentiles}
     )
-    output_file.write_text(json.dumps(output_data, indent=4))
+    output_file.write_text(_dumps_output(output_data))
+    write_payments_sketches(_sketches_file(args), sketches)
     logging.info("Results written in %s", output_file)
 
 
+def _dumps_output(output_data: dict) -> str:
+    """Serialize the output to indented json, but for the lists (the per-minute
+    statistics), which are written on a single line."""
+    items = [
+        json.dumps(key)
+        + ": "
+        + (
+            json.dumps(value, separators=(",", ":"))
+            if isinstance(value, list)
+            else json.dumps(value, indent=4)
+        )
+        for key, value in output_data.items()
+    ]
+    return "{\n" + ",\n".join(indent(item, " " * 4) for item in items) + "\n}"
+
+
+def _output_file(args: Args) -> Path:
+    output_filename = (
+        "cloth_output.json"
+        if args.rank_idx is None
+        else f"cloth_output_{args.rank_idx}.json"
+    )
+    return args.output_dir / output_filename
+
+
+def _sketches_file(args: Args) -> Path:
+    """Get the file of the payments sketches, which can be merged across ranks and
+    seeds (see statistics_analyzer.sketch)."""
+    if args.rank_idx is None:
+        return args.output_dir / PAYMENTS_SKETCHES_FILE
+    return args.output_dir / f"payments_sketches_{args.rank_idx}.json"
+
+
+@dataclasses.dataclass
+class _FollowState:
+    """Counters accumulated while following the payments output files."""
+
+    minute_counters: np.ndarray = dataclasses.field(
+        default_factory=lambda: np.zeros((len(MinuteCounter), 0), dtype=np.int64)
+    )
+    batch_counters: np.ndarray = dataclasses.field(
+        default_factory=lambda: np.zeros((len(BatchCounter), N_BATCHES))
+    )
+    sketches: PaymentsSketches = dataclasses.field(default_factory=dict)
+    success_volume: float = 0.0
+    payments_read: int = 0
+    simulated_time: int = 0
+
+
+def _update_follow_state(
+    args: Args, state: _FollowState, payments_df: pd.DataFrame
+) -> None:
+    """Add the newly read payments to the counters."""
+    _summarize_routes(payments_df)
+    state.minute_counters = add_minute_counters(
+        state.minute_counters, minute_counters(payments_df, args.bucket_ms)
+    )
+    state.sketches = merge_payments_sketches(
+        [state.sketches, payments_sketches(payments_df, _sender_tiers(payments_df))]
+    )
+    state.payments_read += len(payments_df)
+    state.simulated_time = max(
+        state.simulated_time, int(payments_df["start_time"].max())
+    )
+
+    txs_df = payments_df[payments_df["type"] == "0"].copy()
+    txs_df["time"] = txs_df["end_time"] - txs_df["start_time"]
+    state.success_volume += float(txs_df[txs_df["is_success"] == "1"]["amount"].sum())
+    if args.simulation_end is not None:
+        batch_length = args.simulation_end / args.nb_batches
+        batch = np.minimum(
+            (txs_df["start_time"].to_numpy() / batch_length).astype(np.int64),
+            args.nb_batches - 1,
+        )
+        state.batch_counters += batch_counters(txs_df, batch, args.nb_batches)
+
+
+def _write_partial_output(args: Args, state: _FollowState) -> None:
+    """Write the statistics of the payments read so far.
+
+    The batch statistics are only available if the simulation end is known. The
+    general statistics that need the whole output (e.g. the wholesale capacity) are
+    computed at the end of the simulation.
+    """
+    payments_stats = PaymentsStats(nb_batches=args.nb_batches)
+    output_data: dict = {}
+    counters = state.batch_counters[:, state.batch_counters[BatchCounter.TOTAL] > 0]
+    if counters.shape[1] > 1:
+        payments_stats.batches = batch_stats(counters)
+        payments_stats.compute_batch_means()
+        output_data |= payments_stats.data
+    output_data |= {
+        GeneralStat.TOTAL_PAYMENTS: int(
+            state.minute_counters[MinuteCounter.TRANSACTIONS].sum()
+        ),
+        GeneralStat.TOTAL_DEPOSITS: int(
+            state.minute_counters[MinuteCounter.DEPOSITS].sum()
+        ),
+        GeneralStat.TOTAL_WITHDRAWALS: int(
+            state.minute_counters[MinuteCounter.WITHDRAWALS].sum()
+        ),
+        GeneralStat.TOTAL_SUBMARINE_SWAPS: int(
+            state.minute_counters[MinuteCounter.SUBMARINE_SWAPS].sum()
+        ),
+        GeneralStat.TOTAL_SUCCESS_VOLUME: state.success_volume,
+        GeneralStat.STATS_BUCKET_MS: args.bucket_ms,
+    }
+    output_data |= stats_per_minute_output(
+        stats_per_minute(state.minute_counters, args.bucket_ms)
+    )
+    output_data[PercentileStat.PERCENTILES] = percentiles_output(state.sketches)
+    output_data[ProgressStat.PROGRESS] = {
+        ProgressStat.SIMULATED_TIME: state.simulated_time,
+        ProgressStat.SIMULATION_END: args.simulation_end,
+        ProgressStat.COMPLETED: (
+            min(state.simulated_time / args.simulation_end, 1.0)
+            if args.simulation_end
+            else None
+        ),
+        ProgressStat.PAYMENTS_READ: state.payments_read,
+    }
+
+    # replace the file atomically, so that readers never see a partial json
+    output_file = _output_file(args)
+    tmp_file = output_file.with_name(output_file.name + ".tmp")
+    tmp_file.write_text(_dumps_output(output_data))
+    tmp_file.replace(output_file)
+    sketches_file = _sketches_file(args)
+    tmp_file = sketches_file.with_name(sketches_file.name + ".tmp")
+    write_payments_sketches(tmp_file, state.sketches)
+    tmp_file.replace(sketches_file)
+
+
+def _is_output_complete(args: Args) -> bool:
+    """Check whether the simulator has finished writing the payments output files.
+
+    When the simulation ends, each rank writes its channels, edges, payments and
+    nodes output files, in this order.
+    """
+    if args.rank_idx is None:
+        ranks = [
+            path.name.removeprefix("channels_output_").removesuffix(".csv")
+            for path in args.input_dir.glob("channels_output_*.csv")
+        ]
+    else:
+        ranks = [str(args.rank_idx)]
+    return bool(ranks) and all(
+        (args.input_dir / f"payments_output_{rank}.csv").is_file()
+        and (args.input_dir / f"nodes_output_{rank}.csv").is_file()
+        for rank in ranks
+    )
+
+
+def follow(args: Args, pattern: str, stop_event: threading.Event | None = None) -> None:
+    """Follow the payments output files, writing partial statistics as they grow.
+
+    Only the rows appended to the files since the previous read are parsed. The
+    simulator writes the payments of each rank when the simulation ends, so the
+    partial statistics are mostly written once all the ranks have ended.
+
+    Stop once stop_event is set (after a last read), once the simulator has
+    finished writing all the payments output files, or when no payment has been
+    appended for args.follow_idle_timeout seconds (if not None).
+    """
+    state = _FollowState(batch_counters=np.zeros((len(BatchCounter), args.nb_batches)))
+    tails: dict[Path, CsvTail] = {}
+    last_update = time.monotonic()
+    while True:
+        stopping = stop_event is not None and stop_event.is_set()
+        # checked before the last read, so that it reads the complete files
+        complete = _is_output_complete(args)
+        for path in sorted(args.input_dir.glob(pattern)):
+            tails.setdefault(path, CsvTail(path))
+        updated = False
+        for tail in tails.values():
+            payments_df = tail.read_new_rows(
+                dtype=PAYMENTS_DTYPES,
+                usecols=lambda column: column != "first_no_balance_error",
+            )
+            if payments_df is not None:
+                _update_follow_state(args, state, payments_df)
+                updated = True
+
+        now = time.monotonic()
+        if updated:
+            _write_partial_output(args, state)
+            last_update = now
+            logging.info(
+                "Read %d payments, simulated time: %d ms",
+                state.payments_read,
+                state.simulated_time,
+            )
+        if stopping:
+            return
+        if complete:
+            logging.info("The simulation has ended")
+            return
+        if (
+            args.follow_idle_timeout is not None
+            and now - last_update >= args.follow_idle_timeout
+        ):
+            logging.info("No new payments for %.0f s", now - last_update)
+            return
+        if stop_event is None:
+            time.sleep(args.follow_interval)
+        else:
+            stop_event.wait(args.follow_interval)
+
+
 def _execute(args: Args) -> None:
     configure_logging(args.verbose)
 
     # Validate input directory
     check_path_is_directory(args.input_dir, CliArgsValidationError)
-    # Check files payments_output_<rank_idx>.csv exists
+    if args.bucket_ms <= 0:
+        msg = f"The bucket length must be positive, got {args.bucket_ms} ms"
+        raise CliArgsValidationError(msg)
     pattern = (
         PAYMENTS_OUTPUT_FILE_PATTERN
         if args.rank_idx is None
         else f"payments_output_{args.rank_idx}.csv"
     )
-    n = count_file_in_dir(args.input_dir, pattern, CliArgsValidationError)
 
     # Validate output directory. Create it if it does not exist.
     args.output_dir.mkdir(parents=True, exist_ok=True)
     check_path_is_directory(args.output_dir, CliArgsValidationError)
 
+    if args.follow:
+        logging.info("Following the payments output files in %s", args.input_dir)
+        follow(args, pattern)
+
+    # Check files payments_output_<rank_idx>.csv exists
+    n = count_file_in_dir(args.input_dir, pattern, CliArgsValidationError)
+
     logging.info("CLoTH Statistics Analyzer running at %s", args.input_dir)
     if args.verbose:
         logging.debug("Arguments: %s", args.print_args())
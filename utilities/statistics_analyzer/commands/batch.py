@@ -0,0 +1,277 @@
+########################################################################################################################
+#                         Copyright (c) 2019-2021 Banca d'Italia - All Rights Reserved                                 #
+#                                                                                                                      #
+# This file is part of the "itCoin" project.                                                                           #
+# Unauthorized copying of this file, via any medium, is strictly prohibited.                                           #
+# The content of this and related source files is proprietary and confidential.                                        #
+#                                                                                                                      #
+# Written by ART (Applied Research Team) - email: appliedresearchteam@bancaditalia.it - web: https://www.bankit.art    #
+########################################################################################################################
+
+"""The batch analysis of a results tree."""
+
+import argparse
+import dataclasses
+import logging
+import os
+import pprint
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from textwrap import dedent, indent
+
+import pandas as pd
+
+from statistics_analyzer.commands.analyzer import (
+    CHANNEL_OUTPUT_FILE_PATTERN,
+    PAYMENTS_OUTPUT_FILE_PATTERN,
+)
+from statistics_analyzer.commands.analyzer import Args as AnalyzerArgs
+from statistics_analyzer.commands.analyzer import _execute as analyze
+from statistics_analyzer.exceptions import CliArgsValidationError
+from statistics_analyzer.results import (
+    CLOTH_OUTPUT_FILE,
+    analysis_parameters,
+    read_experiment_manifest,
+    read_simulation_record,
+)
+from statistics_analyzer.utils import (
+    EXIT_FAILURE,
+    EXIT_SUCCESS,
+    check_path_is_directory,
+    configure_logging,
+    find_output_files,
+)
+
+DEFAULT_OUTPUT_FILENAME = "batch_results.csv"
+SIMULATION_DIR_PATTERN = "seed_*"
+
+
+@dataclasses.dataclass(frozen=True)
+class Args:
+    """Data class to store command line arguments.
+
+    The supported arguments are:
+
+        verbose: bool, verbose output
+        results_root: Path, root of the results tree
+        output_file: Path, consolidated results table
+        jobs: int, number of simulations analysed at once
+        force: bool, analyse also the simulations whose cloth_output.json is up
+            to date
+        route_length_breakdowns: bool, also compute the route length distribution
+            per payment type and per sender nation
+    """
+
+    verbose: bool
+    results_root: Path
+    output_file: Path
+    jobs: int
+    force: bool = False
+    route_length_breakdowns: bool = False
+
+    def print_args(self) -> str:
+        """Get a string representation of the arguments."""
+        return "\n".join(
+            [""]
+            + [
+                indent(f"{attr}={pprint.pformat(value)},", " " * 4)
+                for attr, value in sorted(dataclasses.asdict(self).items())
+            ],
+        )
+
+
+def get_description() -> str:
+    """Get the command line description."""
+    return dedent(
+        """\
+
+    Analyse every seed_* simulation directory of a results tree, e.g. after a
+    change of the analyzer, without running the experiments again.
+
+    A simulation is analysed again only if its cloth_output.json is older than its
+    output files (or with --force). The results of all the simulations are then
+    written to a single table, with the columns of the experiments results.csv
+    and the directory of each simulation.
+
+    Example 1: Re-analyse the simulations of experiment 1 with 8 processes
+
+        $ python -m statistics_analyzer batch experiments/2025_COMCOM/results/exp-1 --jobs 8
+    \
+    """,
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Get the command line parser."""
+    parser = argparse.ArgumentParser(
+        prog="statistics_analyzer batch",
+        description="CLoTH Statistics Analyzer - batch analysis of a results tree",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=get_description(),
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="verbose output")
+    parser.add_argument("results_root", type=Path, help="root of the results tree")
+    parser.add_argument(
+        "-o",
+        "--output-file",
+        type=Path,
+        help=f"consolidated results table (default: '<results_root>/{DEFAULT_OUTPUT_FILENAME}')",
+        default=None,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="number of simulations analysed at once (default: the number of CPUs)",
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="analyse also the simulations whose cloth_output.json is up to date",
+    )
+    parser.add_argument(
+        "--route-length-breakdowns",
+        action="store_true",
+        help="also compute the route length distribution per payment type and per sender nation",
+    )
+    return parser
+
+
+def parse_args() -> Args:
+    """Parse command line arguments."""
+    parser = get_parser()
+    raw_args = parser.parse_args()
+    results_root = raw_args.results_root.resolve()
+
+    return Args(
+        verbose=raw_args.verbose,
+        results_root=results_root,
+        output_file=(
+            raw_args.output_file or results_root / DEFAULT_OUTPUT_FILENAME
+        ).resolve(),
+        jobs=raw_args.jobs,
+        force=raw_args.force,
+        route_length_breakdowns=raw_args.route_length_breakdowns,
+    )
+
+
+def _output_files(simulation_dir: Path) -> list[Path]:
+    return find_output_files(
+        simulation_dir, PAYMENTS_OUTPUT_FILE_PATTERN
+    ) + find_output_files(simulation_dir, CHANNEL_OUTPUT_FILE_PATTERN)
+
+
+def _is_up_to_date(simulation_dir: Path) -> bool:
+    """Check whether cloth_output.json is newer than the simulator output files.
+
+    A simulation whose output files have been cleaned up is up to date, as it can
+    not be analysed again.
+    """
+    cloth_output_file = simulation_dir / CLOTH_OUTPUT_FILE
+    if not cloth_output_file.is_file():
+        return False
+    output_mtime = max(
+        (f.stat().st_mtime for f in _output_files(simulation_dir)), default=0
+    )
+    return cloth_output_file.stat().st_mtime >= output_mtime
+
+
+def _find_simulation_dirs(results_root: Path) -> list[Path]:
+    """Find the seed_* directories with simulator output files or a cloth_output.json."""
+    return sorted(
+        d
+        for d in results_root.rglob(SIMULATION_DIR_PATTERN)
+        if d.is_dir() and ((d / CLOTH_OUTPUT_FILE).is_file() or _output_files(d))
+    )
+
+
+def _analyze_simulation(simulation_dir: Path, args: Args) -> None:
+    """Analyse a simulation, in a worker process.
+
+    The simulation end, number of batches and bucket length are those of the
+    experiment.json manifest, as in the analysis run by the experiments.
+    """
+    analyze(
+        AnalyzerArgs(
+            verbose=args.verbose,
+            input_dir=simulation_dir,
+            output_dir=simulation_dir,
+            rank_idx=None,
+            route_length_breakdowns=args.route_length_breakdowns,
+            **analysis_parameters(read_experiment_manifest(simulation_dir)),
+        )
+    )
+
+
+def _do_job(args: Args) -> None:
+    """Do the main job."""
+    simulation_dirs = _find_simulation_dirs(args.results_root)
+    logging.info("Found %d simulations in %s", len(simulation_dirs), args.results_root)
+    to_analyze = [d for d in simulation_dirs if args.force or not _is_up_to_date(d)]
+    logging.info(
+        "Analysing %d simulations, %d are up to date",
+        len(to_analyze),
+        len(simulation_dirs) - len(to_analyze),
+    )
+
+    failed: set[Path] = set()
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {executor.submit(_analyze_simulation, d, args): d for d in to_analyze}
+        for future in as_completed(futures):
+            simulation_dir = futures[future]
+            error = future.exception()
+            if error is not None:
+                logging.error("Could not analyse %s: %s", simulation_dir, error)
+                failed.add(simulation_dir)
+            else:
+                logging.info("Analysed %s", simulation_dir)
+
+    records = [
+        {"output_dir": str(d)} | read_simulation_record(d)
+        for d in simulation_dirs
+        if d not in failed and (d / CLOTH_OUTPUT_FILE).is_file()
+    ]
+    args.output_file.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(records).to_csv(args.output_file, index=False)
+    logging.info(
+        "Results of %d simulations written in %s", len(records), args.output_file
+    )
+
+    if failed:
+        msg = f"{len(failed)} simulations could not be analysed"
+        raise RuntimeError(msg)
+
+
+def _execute(args: Args) -> None:
+    configure_logging(args.verbose)
+
+    # Validate the results tree
+    check_path_is_directory(args.results_root, CliArgsValidationError)
+
+    logging.info("CLoTH Statistics Analyzer batch running at %s", args.results_root)
+    if args.verbose:
+        logging.debug("Arguments: %s", args.print_args())
+    _do_job(args)
+
+
+def main() -> None:
+    """Execute the main script."""
+    try:
+        args: Args = parse_args()
+        _execute(args)
+        sys.exit(EXIT_SUCCESS)
+    except KeyboardInterrupt:
+        logging.info("\nInterrupted by user")
+        sys.exit(EXIT_FAILURE)
+    except CliArgsValidationError as e:
+        logging.error(e)
+        sys.exit(EXIT_FAILURE)
+    except Exception:
+        logging.exception("Unexpected error")
+        sys.exit(EXIT_FAILURE)
+
+
+if __name__ == "__main__":
+    main()
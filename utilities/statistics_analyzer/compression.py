@@ -0,0 +1,93 @@
+########################################################################################################################
+#                         Copyright (c) 2019-2021 Banca d'Italia - All Rights Reserved                                 #
+#                                                                                                                      #
+# This file is part of the "itCoin" project.                                                                           #
+# Unauthorized copying of this file, via any medium, is strictly prohibited.                                           #
+# The content of this and related source files is proprietary and confidential.                                        #
+#                                                                                                                      #
+# Written by ART (Applied Research Team) - email: appliedresearchteam@bancaditalia.it - web: https://www.bankit.art    #
+########################################################################################################################
+
+"""Transparent reading of (possibly compressed) simulator output files."""
+
+import gzip
+import io
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any
+
+import pandas as pd
+
+from statistics_analyzer.utils import COMPRESSION_SUFFIXES
+
+_CHUNK_SIZE = 1 << 20
+
+
+def _open_decompressor(path: Path) -> io.BufferedIOBase:
+    """Open a decompressing reader for the given file, according to its suffix."""
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            msg = f"reading {path} requires the 'zstandard' package (poetry install --extras zstd)"
+            raise ModuleNotFoundError(msg) from None
+        reader: io.BufferedIOBase = zstandard.ZstdDecompressor().stream_reader(
+            path.open("rb")
+        )
+        return reader
+    msg = f"unsupported compression format for file {path}"
+    raise ValueError(msg)
+
+
+@contextmanager
+def open_output_file(path: Path) -> Iterator[IO[bytes]]:
+    """Open a simulator output file for reading, in binary mode.
+
+    Plain files are opened directly. Files ending in .gz or .zst are inflated
+    in a background thread and streamed through a pipe, so that decompression
+    overlaps with the parsing done by the consumer.
+    """
+    if path.suffix not in COMPRESSION_SUFFIXES:
+        with path.open("rb") as f:
+            yield f
+        return
+
+    read_fd, write_fd = os.pipe()
+    errors: list[Exception] = []
+
+    def _pump() -> None:
+        try:
+            with (
+                os.fdopen(write_fd, "wb", buffering=_CHUNK_SIZE) as sink,
+                _open_decompressor(path) as source,
+            ):
+                while chunk := source.read(_CHUNK_SIZE):
+                    sink.write(chunk)
+        except BrokenPipeError:
+            # the consumer stopped reading early: nothing left to do
+            pass
+        except Exception as e:
+            errors.append(e)
+
+    pump = threading.Thread(target=_pump, name=f"inflate-{path.name}", daemon=True)
+    pump.start()
+    try:
+        with os.fdopen(read_fd, "rb") as f:
+            yield f
+    finally:
+        pump.join()
+        # a decompression error explains any parsing error of the truncated stream
+        if errors:
+            raise errors[0]
+
+
+def read_output_csv(path: Path, **kwargs: Any) -> pd.DataFrame:
+    """Read a (possibly compressed) simulator CSV output file with pandas."""
+    with open_output_file(path) as f:
+        df: pd.DataFrame = pd.read_csv(f, **kwargs)
+    return df
@@ -7,6 +7,8 @@
 #                                                                                                                      #
 # Written by ART (Applied Research Team) - email: appliedresearchteam@bancaditalia.it - web: https://www.bankit.art    #
 ########################################################################################################################
+import functools
+import math
 from dataclasses import dataclass, field
 from enum import Enum
 
@@ -15,6 +17,8 @@ import scipy.stats
 
 N_BATCHES = 30
 ALFA_CONFIDENCE = 0.95
+MINUTES_IN_A_DAY = 60 * 24
+MILLISECONDS_IN_A_MINUTE = 60 * 1000
 
 
 class StatType(str, Enum):
@@ -46,6 +50,8 @@ class GeneralStat(str, Enum):
     TOTAL_SUBMARINE_SWAPS_1_1 = "TotalSubmarineSwaps1<>1"
     TOTAL_SUBMARINE_SWAPS_1_2 = "TotalSubmarineSwaps1<>2"
     TOTAL_SUBMARINE_SWAPS_2_2 = "TotalSubmarineSwaps2<>2"
+    # the length in milliseconds of the time buckets of the per-minute statistics
+    STATS_BUCKET_MS = "StatsBucketMs"
 
 
 class StatsPerMinute(str, Enum):
@@ -58,6 +64,8 @@ class StatsPerMinute(str, Enum):
 
 class DistributionStats(str, Enum):
     ROUTE_LENGTH_DISTR = "RouteLengthDistr"
+    ROUTE_LENGTH_DISTR_BY_TYPE = "RouteLengthDistrByType"
+    ROUTE_LENGTH_DISTR_BY_NATION = "RouteLengthDistrByNation"
 
 
 class DistributionInnerStats(str, Enum):
@@ -66,57 +74,101 @@ class DistributionInnerStats(str, Enum):
     ROUTED_BY_L2 = "RoutedByL2"
 
 
+class ProgressStat(str, Enum):
+    PROGRESS = "Progress"
+    SIMULATED_TIME = "SimulatedTime"
+    SIMULATION_END = "SimulationEnd"
+    COMPLETED = "Completed"
+    PAYMENTS_READ = "PaymentsRead"
+
+
+class PercentileStat(str, Enum):
+    PERCENTILES = "Percentiles"
+    TIME = "Time"
+    ATTEMPTS = "Attempts"
+    ROUTE_LENGTH = "RouteLength"
+    TOTAL_FEE = "TotalFee"
+
+
+RouteLengthDistr = dict[int, dict[DistributionInnerStats, float]]
+
+
 def generate_data() -> dict[StatType, dict[StatInnerKey, float]]:
     return {stat: {innerStat: 0} for innerStat in StatInnerKey for stat in StatType}
 
 
-def generate_batches() -> dict[StatType, list[int]]:
-    return {stat: [0] * N_BATCHES for stat in StatType}
+@functools.cache
+def t_quantile(nb_batches: int) -> float:
+    """Get the t quantile of the confidence intervals, for a number of batches."""
+    return float(scipy.stats.t.isf((ALFA_CONFIDENCE) / 2.0, nb_batches))
 
 
 def generate_general_stats() -> dict[GeneralStat, float]:
     return {stat: 0 for stat in GeneralStat}
 
 
-def generate_stats_per_minute() -> dict[StatsPerMinute, dict[int, float]]:
-    return {stat: {hour: 0 for hour in range(1440)} for stat in StatsPerMinute}
+def generate_stats_per_minute() -> np.ndarray:
+    return np.full((len(StatsPerMinute), MINUTES_IN_A_DAY), np.nan)
+
 
+def stats_per_minute_output(
+    stats_per_minute: np.ndarray,
+) -> dict[StatsPerMinute, list[float | None]]:
+    """Turn the per-minute statistics into lists, with None for the NaN minutes."""
+    return {
+        stat: [None if math.isnan(value) else value for value in row.tolist()]
+        for stat, row in zip(StatsPerMinute, stats_per_minute, strict=True)
+    }
 
-def generate_distribution_stats() -> dict[int, dict[DistributionInnerStats, float]]:
+
+def generate_distribution_stats() -> dict[
+    DistributionStats, RouteLengthDistr | dict[str, RouteLengthDistr]
+]:
     return {}
 
 
 @dataclass
 class PaymentsStats:
-    """Model the payments statistics."""
+    """Model the payments statistics.
+
+    The per-batch statistics are a (len(StatType), number of batches) matrix,
+    whose rows follow the order of StatType. The per-minute statistics are a
+    (len(StatsPerMinute), number of time buckets) matrix, whose rows follow the
+    order of StatsPerMinute, and which is NaN in the buckets in which no payment
+    started. The buckets last one minute unless otherwise specified, and their
+    counts are then given as rates per minute.
+    """
 
+    nb_batches: int = N_BATCHES
     data: dict[StatType, dict[StatInnerKey, float]] = field(
         default_factory=generate_data, init=False
     )
-    batches: dict[StatType, list[int]] = field(
-        default_factory=generate_batches, init=False
-    )
+    batches: np.ndarray = field(init=False)
     general_stats: dict[GeneralStat, float] = field(
         default_factory=generate_general_stats, init=False
     )
-    stats_per_minute: dict[StatsPerMinute, dict[int, float]] = field(
+    stats_per_minute: np.ndarray = field(
         default_factory=generate_stats_per_minute, init=False
     )
     distributions_stats: dict[
-        DistributionStats, dict[int, dict[DistributionInnerStats, float]]
+        DistributionStats, RouteLengthDistr | dict[str, RouteLengthDistr]
     ] = field(default_factory=generate_distribution_stats, init=False)
+    # the quantiles of each PercentileStat, by group of payments
+    percentiles: dict[PercentileStat, dict[str, dict[str, float | None]]] = field(
+        default_factory=dict, init=False
+    )
+
+    def __post_init__(self) -> None:
+        self.batches = np.zeros((len(StatType), self.nb_batches))
 
     def compute_batch_means(self) -> None:
         """Compute batch means"""
-        for stat in StatType:
-            self.data[stat][StatInnerKey.MEAN] = np.mean(self.batches[stat])
-            h = scipy.stats.sem(self.batches[stat]) * scipy.stats.t.isf(
-                (ALFA_CONFIDENCE) / 2.0, N_BATCHES
-            )
-            self.data[stat][StatInnerKey.CONFIDENCE_MIN] = (
-                self.data[stat][StatInnerKey.MEAN] - h
-            )
-            self.data[stat][StatInnerKey.CONFIDENCE_MAX] = (
-                self.data[stat][StatInnerKey.MEAN] + h
-            )
-            self.data[stat][StatInnerKey.VARIANCE] = np.var(self.batches[stat])
+        mean = np.mean(self.batches, axis=1)
+        sem = np.std(self.batches, axis=1, ddof=1) / np.sqrt(self.batches.shape[1])
+        h = sem * t_quantile(self.nb_batches)
+        variance = np.var(self.batches, axis=1)
+        for i, stat in enumerate(StatType):
+            self.data[stat][StatInnerKey.MEAN] = mean[i]
+            self.data[stat][StatInnerKey.CONFIDENCE_MIN] = mean[i] - h[i]
+            self.data[stat][StatInnerKey.CONFIDENCE_MAX] = mean[i] + h[i]
+            self.data[stat][StatInnerKey.VARIANCE] = variance[i]
@@ -0,0 +1,189 @@
+########################################################################################################################
+#                         Copyright (c) 2019-2021 Banca d'Italia - All Rights Reserved                                 #
+#                                                                                                                      #
+# This file is part of the "itCoin" project.                                                                           #
+# Unauthorized copying of this file, via any medium, is strictly prohibited.                                           #
+# The content of this and related source files is proprietary and confidential.                                        #
+#                                                                                                                      #
+# Written by ART (Applied Research Team) - email: appliedresearchteam@bancaditalia.it - web: https://www.bankit.art    #
+########################################################################################################################
+
+"""Additive per-batch and per-minute payment counters.
+
+The counters are plain sums, so that they can be computed on any subset of the
+payments (e.g. the rows appended to the output files since the last read) and
+then added together.
+"""
+
+from enum import IntEnum
+
+import numpy as np
+import pandas as pd
+
+from statistics_analyzer.core import MILLISECONDS_IN_A_MINUTE, StatsPerMinute, StatType
+
+
+class BatchCounter(IntEnum):
+    TOTAL = 0
+    SUCCESS = 1
+    ATTEMPTS = 2
+    TIME = 3
+    ROUTE_LENGTH = 4
+    FAIL_TIMEOUT_EXPIRED = 5
+    FAIL_NO_PATH = 6
+    FAIL_OFFLINE = 7
+    FAIL_NO_BALANCE = 8
+
+
+class MinuteCounter(IntEnum):
+    TRANSACTIONS = 0
+    SUCCESSFUL_TRANSACTIONS = 1
+    DEPOSITS = 2
+    WITHDRAWALS = 3
+    SUBMARINE_SWAPS = 4
+
+
+def batch_counters(
+    txs_df: pd.DataFrame, batch: np.ndarray, nb_batches: int
+) -> np.ndarray:
+    """Compute the per-batch counters of the given transactions.
+
+    Args:
+    ----
+        txs_df: the transactions, with the time, route_length and no_route columns.
+        batch: the batch index of each transaction.
+        nb_batches: the number of batches.
+
+    Returns an array of shape (len(BatchCounter), nb_batches).
+    """
+    is_success = (txs_df["is_success"] == "1").to_numpy()
+    is_failure = (txs_df["is_success"] == "0").to_numpy()
+    is_timeout = (txs_df["timeout_exp"] == "1").to_numpy()
+    no_timeout = (txs_df["timeout_exp"] == "0").to_numpy()
+    no_route = txs_df["no_route"].to_numpy()
+    is_offline = (txs_df["offline_node_count"] > txs_df["no_balance_count"]).to_numpy()
+    failed_on_route = is_failure & no_timeout & ~no_route
+
+    def _sum(mask: np.ndarray, column: str | None = None) -> np.ndarray:
+        weights = None if column is None else txs_df[column].to_numpy()[mask]
+        return np.bincount(batch[mask], weights=weights, minlength=nb_batches)
+
+    counters = np.zeros((len(BatchCounter), nb_batches))
+    counters[BatchCounter.TOTAL] = _sum(np.ones_like(is_success))
+    counters[BatchCounter.SUCCESS] = _sum(is_success)
+    counters[BatchCounter.ATTEMPTS] = _sum(is_success, "attempts")
+    counters[BatchCounter.TIME] = _sum(is_success, "time")
+    counters[BatchCounter.ROUTE_LENGTH] = _sum(is_success, "route_length")
+    counters[BatchCounter.FAIL_TIMEOUT_EXPIRED] = _sum(is_failure & is_timeout)
+    counters[BatchCounter.FAIL_NO_PATH] = _sum(is_failure & no_timeout & no_route)
+    counters[BatchCounter.FAIL_OFFLINE] = _sum(failed_on_route & is_offline)
+    counters[BatchCounter.FAIL_NO_BALANCE] = _sum(failed_on_route & ~is_offline)
+    return counters
+
+
+# The (numerator, denominator) counters of each per-batch statistic
+BATCH_STAT_COUNTERS = {
+    StatType.SUCCESS: (BatchCounter.SUCCESS, BatchCounter.TOTAL),
+    StatType.FAIL_NO_PATH: (BatchCounter.FAIL_NO_PATH, BatchCounter.TOTAL),
+    StatType.FAIL_NO_BALANCE: (BatchCounter.FAIL_NO_BALANCE, BatchCounter.TOTAL),
+    StatType.FAIL_OFFLINE: (BatchCounter.FAIL_OFFLINE, BatchCounter.TOTAL),
+    StatType.FAIL_TIMEOUT_EXPIRED: (
+        BatchCounter.FAIL_TIMEOUT_EXPIRED,
+        BatchCounter.TOTAL,
+    ),
+    StatType.TIME: (BatchCounter.TIME, BatchCounter.SUCCESS),
+    StatType.ATTEMPTS: (BatchCounter.ATTEMPTS, BatchCounter.SUCCESS),
+    StatType.ROUTE_LENGTH: (BatchCounter.ROUTE_LENGTH, BatchCounter.SUCCESS),
+}
+
+
+def batch_stats(counters: np.ndarray) -> np.ndarray:
+    """Turn the per-batch counters into the per-batch statistics.
+
+    Returns an array of shape (len(StatType), number of batches), whose rows
+    follow the order of StatType (see PaymentsStats.batches).
+    """
+    numerators = [BATCH_STAT_COUNTERS[stat][0] for stat in StatType]
+    denominators = [BATCH_STAT_COUNTERS[stat][1] for stat in StatType]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stats: np.ndarray = counters[numerators] / counters[denominators]
+    return stats
+
+
+def minute_counters(
+    payments_df: pd.DataFrame,
+    bucket_ms: int = MILLISECONDS_IN_A_MINUTE,
+    nb_buckets: int = 0,
+) -> np.ndarray:
+    """Compute the per-minute counters of the given payments.
+
+    The payments are counted in time buckets of bucket_ms milliseconds (one minute
+    by default), from the start of the simulation. The time axis is unbounded: it
+    has at least nb_buckets buckets, and as many as needed to count the last
+    payment.
+
+    Returns an array of shape (len(MinuteCounter), number of buckets).
+    """
+    bucket = payments_df["start_time"].to_numpy() // bucket_ms
+    nb_buckets = max(nb_buckets, int(bucket.max()) + 1 if len(bucket) else 0)
+    payment_type = payments_df["type"].to_numpy()
+    is_success = (payments_df["is_success"] == "1").to_numpy()
+
+    def _count(mask: np.ndarray) -> np.ndarray:
+        return np.bincount(bucket[mask], minlength=nb_buckets)
+
+    counters = np.zeros((len(MinuteCounter), nb_buckets), dtype=np.int64)
+    counters[MinuteCounter.TRANSACTIONS] = _count(payment_type == "0")
+    counters[MinuteCounter.SUCCESSFUL_TRANSACTIONS] = _count(
+        (payment_type == "0") & is_success
+    )
+    counters[MinuteCounter.DEPOSITS] = _count(payment_type == "1")
+    counters[MinuteCounter.WITHDRAWALS] = _count(payment_type == "2")
+    counters[MinuteCounter.SUBMARINE_SWAPS] = _count(payment_type == "3")
+    return counters
+
+
+def add_minute_counters(total: np.ndarray, counters: np.ndarray) -> np.ndarray:
+    """Add per-minute counters to a total, extending its time axis if needed."""
+    if counters.shape[1] > total.shape[1]:
+        total = np.pad(total, ((0, 0), (0, counters.shape[1] - total.shape[1])))
+    total[:, : counters.shape[1]] += counters
+    return total
+
+
+def stats_per_minute(
+    counters: np.ndarray, bucket_ms: int = MILLISECONDS_IN_A_MINUTE
+) -> np.ndarray:
+    """Turn the per-minute counters into the per-minute statistics.
+
+    The counts of the time buckets of bucket_ms milliseconds are turned into
+    rates per minute, so that the statistics are per minute whatever the length
+    of the buckets.
+
+    Returns an array of shape (len(StatsPerMinute), number of buckets), whose rows
+    follow the order of StatsPerMinute (see PaymentsStats.stats_per_minute). The
+    buckets in which no payment started are NaN.
+    """
+    per_minute = MILLISECONDS_IN_A_MINUTE / bucket_ms
+    transactions = counters[MinuteCounter.TRANSACTIONS]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        success_rate = np.round(
+            counters[MinuteCounter.SUCCESSFUL_TRANSACTIONS] / transactions, 2
+        )
+    series = {
+        StatsPerMinute.TX_PER_MINUTE: transactions * per_minute,
+        StatsPerMinute.PSR_PER_MINUTE: success_rate,
+        StatsPerMinute.DEPOSITS_PER_MINUTE: counters[MinuteCounter.DEPOSITS]
+        * per_minute,
+        StatsPerMinute.WITHDRAWALS_PER_MINUTE: counters[MinuteCounter.WITHDRAWALS]
+        * per_minute,
+        StatsPerMinute.SUBMARINE_SWAPS_PER_MINUTE: counters[
+            MinuteCounter.SUBMARINE_SWAPS
+        ]
+        * per_minute,
+    }
+    rows = [series[stat] for stat in StatsPerMinute]
+    stats: np.ndarray = np.stack(rows).astype(float)
+    payments = counters.sum(axis=0) - counters[MinuteCounter.SUCCESSFUL_TRANSACTIONS]
+    stats[:, payments == 0] = np.nan
+    return stats
@@ -0,0 +1,176 @@
+########################################################################################################################
+#                         Copyright (c) 2019-2021 Banca d'Italia - All Rights Reserved                                 #
+#                                                                                                                      #
+# This file is part of the "itCoin" project.                                                                           #
+# Unauthorized copying of this file, via any medium, is strictly prohibited.                                           #
+# The content of this and related source files is proprietary and confidential.                                        #
+#                                                                                                                      #
+# Written by ART (Applied Research Team) - email: appliedresearchteam@bancaditalia.it - web: https://www.bankit.art    #
+########################################################################################################################
+
+"""The results record of a simulation, as tabulated by the experiments."""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from statistics_analyzer.core import (
+    MILLISECONDS_IN_A_MINUTE,
+    MINUTES_IN_A_DAY,
+    N_BATCHES,
+    GeneralStat,
+    StatsPerMinute,
+    stats_per_minute_output,
+)
+
+CLOTH_OUTPUT_FILE = "cloth_output.json"
+EXPERIMENT_MANIFEST_FILE = "experiment.json"
+# The keys of the experiment.json manifest which are not columns of the results
+# (the input directory, and the parameters of the analysis)
+MANIFEST_ONLY_KEYS = ("input_dir", "nb_batches", "bucket_ms")
+RUN_METRICS_FILE = "run_metrics.json"
+
+DAILY_LIQUIDITY_COST = 0.0001271488302
+SUBMARINE_SWAP_COST = 0.10 * 2
+
+# The key of the per-minute statistics array in a simulation results record
+STATS_PER_MINUTE = "stats_per_minute"
+# The results.csv columns of the per-minute statistics
+STATS_PER_MINUTE_COLUMNS = {
+    StatsPerMinute.TX_PER_MINUTE: "transactions_per_minute",
+    StatsPerMinute.PSR_PER_MINUTE: "success_per_minute",
+    StatsPerMinute.DEPOSITS_PER_MINUTE: "deposits_per_minute",
+    StatsPerMinute.WITHDRAWALS_PER_MINUTE: "withdrawals_per_minute",
+    StatsPerMinute.SUBMARINE_SWAPS_PER_MINUTE: "submarine_swaps_per_minute",
+}
+
+
+def _per_minute_array(values: list | dict) -> np.ndarray:
+    """Read a per-minute statistic, written either as a list or, by older
+    versions of the analyzer, as a {minute: value} dict of the observed minutes."""
+    if isinstance(values, list):
+        return np.array(values, dtype=float)
+    array = np.full(MINUTES_IN_A_DAY, np.nan)
+    for minute, value in values.items():
+        array[int(minute)] = value
+    return array
+
+
+def stats_per_minute_from_output(cloth_output: dict) -> np.ndarray:
+    """Get the per-minute statistics array from a cloth_output.json content."""
+    return np.stack(
+        [_per_minute_array(cloth_output[stat.value]) for stat in StatsPerMinute]
+    )
+
+
+def stats_per_minute_from_columns(record: dict) -> np.ndarray | None:
+    """Pop the per-minute statistics columns of a results.csv record, as an array.
+
+    Returns None if the record has no per-minute statistics.
+    """
+    columns = [record.pop(column, None) for column in STATS_PER_MINUTE_COLUMNS.values()]
+    if any(not isinstance(column, str) for column in columns):
+        return None
+    stats: np.ndarray = np.stack(
+        [_per_minute_array(json.loads(column)) for column in columns]
+    )
+    return stats
+
+
+def stats_per_minute_columns(stats_per_minute: np.ndarray) -> dict[str, str]:
+    """Get the results.csv columns of a per-minute statistics array, as compact
+    json lists (null in the minutes in which no payment started)."""
+    return {
+        STATS_PER_MINUTE_COLUMNS[stat]: json.dumps(values, separators=(",", ":"))
+        for stat, values in stats_per_minute_output(stats_per_minute).items()
+    }
+
+
+def simulation_results(cloth_output: dict) -> dict:
+    """Get the results columns of a simulation from its cloth_output.json content.
+
+    The per-minute statistics are an array, under the STATS_PER_MINUTE key.
+    """
+    cost_wholesale_liquidity = (
+        DAILY_LIQUIDITY_COST * float(cloth_output["TotalWholeSaleCapacity"]) / 100
+    )
+    stats_per_minute = stats_per_minute_from_output(cloth_output)
+    cost_submarine_swaps = SUBMARINE_SWAP_COST * (
+        float(cloth_output["TotalSubmarineSwaps1<>2"])
+        + float(cloth_output["TotalSubmarineSwaps2<>2"])
+    )
+    return {
+        "success": float(str(cloth_output["Success"]["Mean"])[:6]),
+        "fail_no_path": cloth_output["FailNoPath"]["Mean"],
+        "fail_no_balance": cloth_output["FailNoBalance"]["Mean"],
+        "fail_offline_node": cloth_output["FailOfflineNode"]["Mean"],
+        "fail_timeout_expired": cloth_output["FailTimeoutExpired"]["Mean"],
+        "time": cloth_output["Time"]["Mean"],
+        "attempts": cloth_output["Attempts"]["Mean"],
+        "route_length": cloth_output["RouteLength"]["Mean"],
+        "wholesale_capacity": float(cloth_output["TotalWholeSaleCapacity"]) / 100,
+        "total_success_volume": cloth_output["TotalSuccessVolume"],
+        "volume_capacity_ratio": cloth_output["VolumeCapacityRatio"],
+        "total_payments": cloth_output["TotalPayments"],
+        "total_deposits": cloth_output["TotalDeposits"],
+        "total_withdrawals": cloth_output["TotalWithdrawals"],
+        "route_length_distr": json.dumps(cloth_output["RouteLengthDistr"]),
+        STATS_PER_MINUTE: stats_per_minute,
+        "stats_bucket_ms": cloth_output.get(
+            GeneralStat.STATS_BUCKET_MS, MILLISECONDS_IN_A_MINUTE
+        ),
+        # the mean over the time buckets in which at least a payment started
+        "mean_submarine_swaps_per_minute": np.nanmean(
+            stats_per_minute[
+                list(StatsPerMinute).index(StatsPerMinute.SUBMARINE_SWAPS_PER_MINUTE)
+            ]
+        ),
+        "cost_submarine_swaps": cost_submarine_swaps,
+        "cost_wholesale_liquidity": cost_wholesale_liquidity,
+        "total_cost": cost_wholesale_liquidity + cost_submarine_swaps,
+    }
+
+
+def read_experiment_manifest(output_dir: Path) -> dict:
+    """Read the experiment.json manifest of a simulation, empty if there is none."""
+    manifest_file = output_dir / EXPERIMENT_MANIFEST_FILE
+    if not manifest_file.is_file():
+        return {}
+    manifest: dict = json.loads(manifest_file.read_text())
+    return manifest
+
+
+def analysis_parameters(manifest: dict) -> dict:
+    """Get the simulation_end, nb_batches and bucket_ms of the analysis of a simulation.
+
+    The manifests written before the analysis parameters were recorded get the
+    defaults of the analyzer, with which those simulations were analysed.
+    """
+    return {
+        "simulation_end": manifest.get("simulation_end"),
+        "nb_batches": manifest.get("nb_batches", N_BATCHES),
+        "bucket_ms": manifest.get("bucket_ms", MILLISECONDS_IN_A_MINUTE),
+    }
+
+
+def read_simulation_record(output_dir: Path) -> dict:
+    """Read the results record of an analysed simulation from its output directory.
+
+    The record has the simulation inputs of the experiment.json manifest (if any),
+    the results of cloth_output.json and the resource usage of run_metrics.json
+    (if any), as in the results.csv of the experiments.
+    """
+    record = {
+        key: value
+        for key, value in read_experiment_manifest(output_dir).items()
+        if key not in MANIFEST_ONLY_KEYS
+    }
+    record |= simulation_results(
+        json.loads((output_dir / CLOTH_OUTPUT_FILE).read_text())
+    )
+    record |= stats_per_minute_columns(record.pop(STATS_PER_MINUTE))
+    run_metrics_file = output_dir / RUN_METRICS_FILE
+    if run_metrics_file.is_file():
+        record |= json.loads(run_metrics_file.read_text())
+    return record
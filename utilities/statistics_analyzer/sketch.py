@@ -0,0 +1,253 @@
+########################################################################################################################
+#                         Copyright (c) 2019-2021 Banca d'Italia - All Rights Reserved                                 #
+#                                                                                                                      #
+# This file is part of the "itCoin" project.                                                                           #
+# Unauthorized copying of this file, via any medium, is strictly prohibited.                                           #
+# The content of this and related source files is proprietary and confidential.                                        #
+#                                                                                                                      #
+# Written by ART (Applied Research Team) - email: appliedresearchteam@bancaditalia.it - web: https://www.bankit.art    #
+########################################################################################################################
+
+"""Mergeable quantile sketches of the payments.
+
+The sketches are DDSketches: the values are counted in logarithmic buckets, so
+that any quantile is estimated within a relative accuracy, in a memory that
+depends on the range of the values and not on their number. Two sketches are
+merged by adding their bucket counts, hence the sketches of the chunks of an
+output file, of the ranks of a simulation, or of several seeds can be merged
+into the sketch of all their payments.
+"""
+
+import json
+import math
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+from typing import TypedDict
+
+import numpy as np
+import pandas as pd
+
+from statistics_analyzer.core import PercentileStat
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+QUANTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+PAYMENTS_SKETCHES_FILE = "payments_sketches.json"
+# The tier of the payments whose sender is missing, which are not grouped by tier
+UNKNOWN_TIER = 0
+
+
+class SketchData(TypedDict):
+    """The JSON representation of a QuantileSketch."""
+
+    RelativeAccuracy: float
+    ZeroCount: int
+    Offset: int
+    Counts: list[int]
+
+
+# The sketches of each statistic, by group of payments (see payments_sketches())
+PaymentsSketches = dict[PercentileStat, dict[str, "QuantileSketch"]]
+
+
+def quantile_name(q: float) -> str:
+    """Get the output name of a quantile, e.g. P99.9 for 0.999."""
+    return f"P{100 * q:.10g}"
+
+
+class QuantileSketch:
+    """A DDSketch of non-negative values.
+
+    The positive values are counted in the buckets (gamma^(k-1), gamma^k], with
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy), so that the middle
+    of the bucket of a quantile is within the relative accuracy of the quantile.
+    The other values are counted as zeros.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> None:
+        if not 0 < relative_accuracy < 1:
+            msg = f"The relative accuracy must be in (0, 1), got {relative_accuracy}"
+            raise ValueError(msg)
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.zero_count = 0
+        # counts[i] is the count of the bucket with key offset + i
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + int(self.counts.sum())
+
+    def _add_counts(self, offset: int, counts: np.ndarray) -> None:
+        if len(counts) == 0:
+            return
+        if len(self.counts) == 0:
+            self.offset, self.counts = offset, counts.astype(np.int64)
+            return
+        low = min(self.offset, offset)
+        high = max(self.offset + len(self.counts), offset + len(counts))
+        merged = np.zeros(high - low, dtype=np.int64)
+        merged[self.offset - low : self.offset - low + len(self.counts)] += self.counts
+        merged[offset - low : offset - low + len(counts)] += counts
+        self.offset, self.counts = low, merged
+
+    def add(self, values: np.ndarray) -> None:
+        """Add the given values, ignoring the NaNs."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive) == 0:
+            return
+        keys = np.ceil(np.log(positive) / math.log(self.gamma)).astype(np.int64)
+        offset = int(keys.min())
+        self._add_counts(offset, np.bincount(keys - offset))
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add the values of another sketch, with the same relative accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            msg = (
+                "Cannot merge sketches with relative accuracies "
+                f"{self.relative_accuracy} and {other.relative_accuracy}"
+            )
+            raise ValueError(msg)
+        self.zero_count += other.zero_count
+        self._add_counts(other.offset, other.counts)
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """Estimate the given quantiles, NaN if the sketch is empty."""
+        count = self.count
+        if count == 0:
+            return np.full(len(qs), np.nan)
+        # the lower rank, as numpy.quantile(method="lower")
+        ranks = np.floor(np.asarray(qs) * (count - 1))
+        index = np.searchsorted(
+            np.cumsum(self.counts), ranks - self.zero_count, side="right"
+        )
+        index = np.minimum(index, len(self.counts) - 1)
+        estimates = 2 * self.gamma ** (self.offset + index) / (self.gamma + 1)
+        return np.where(ranks < self.zero_count, 0.0, estimates)
+
+    def to_dict(self) -> SketchData:
+        return {
+            "RelativeAccuracy": self.relative_accuracy,
+            "ZeroCount": self.zero_count,
+            "Offset": self.offset,
+            "Counts": self.counts.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: SketchData) -> "QuantileSketch":
+        sketch = cls(data["RelativeAccuracy"])
+        sketch.zero_count = data["ZeroCount"]
+        sketch.offset = data["Offset"]
+        sketch.counts = np.array(data["Counts"], dtype=np.int64)
+        return sketch
+
+
+def _payment_measures(payments_df: pd.DataFrame) -> dict[PercentileStat, np.ndarray]:
+    measures = {
+        PercentileStat.TIME: (
+            payments_df["end_time"] - payments_df["start_time"]
+        ).to_numpy(dtype=np.float64),
+        PercentileStat.ATTEMPTS: payments_df["attempts"].to_numpy(dtype=np.float64),
+        PercentileStat.ROUTE_LENGTH: payments_df["route_length"].to_numpy(
+            dtype=np.float64
+        ),
+    }
+    # the simulator outputs before the fees were recorded have no total_fee
+    if "total_fee" in payments_df.columns:
+        measures[PercentileStat.TOTAL_FEE] = payments_df["total_fee"].to_numpy(
+            dtype=np.float64
+        )
+    return measures
+
+
+def payments_sketches(
+    payments_df: pd.DataFrame,
+    sender_tiers: np.ndarray,
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+) -> PaymentsSketches:
+    """Sketch the latency, attempts, route length and fee of the successful payments.
+
+    The payments are grouped as:
+        All: all the transactions (type 0), as the batch means
+        Type<type>: the payments of each type
+        SenderTier<tier>: the transactions whose sender is in each tier
+
+    Args:
+    ----
+        payments_df: the payments, with the route_length column.
+        sender_tiers: the tier of the sender of each payment (UNKNOWN_TIER if
+            the sender is missing).
+        relative_accuracy: the relative accuracy of the sketches.
+    """
+    is_success = (payments_df["is_success"] == "1").to_numpy()
+    payment_type = payments_df["type"].to_numpy()
+    is_transaction = payment_type == "0"
+    groups = {"All": is_success & is_transaction}
+    for t in sorted(pd.unique(payment_type[is_success])):
+        groups[f"Type{t}"] = is_success & (payment_type == t)
+    for tier in sorted(np.unique(sender_tiers[is_success & is_transaction])):
+        if tier == UNKNOWN_TIER:
+            continue
+        groups[f"SenderTier{tier}"] = (
+            is_success & is_transaction & (sender_tiers == tier)
+        )
+
+    sketches: PaymentsSketches = {}
+    for stat, values in _payment_measures(payments_df).items():
+        sketches[stat] = {}
+        for group, mask in groups.items():
+            sketch = QuantileSketch(relative_accuracy)
+            sketch.add(values[mask])
+            sketches[stat][group] = sketch
+    return sketches
+
+
+def merge_payments_sketches(
+    all_sketches: Iterable[PaymentsSketches],
+) -> PaymentsSketches:
+    """Merge the sketches of several sets of payments, e.g. ranks or seeds."""
+    merged: PaymentsSketches = {}
+    for sketches in all_sketches:
+        for stat, groups in sketches.items():
+            for group, sketch in groups.items():
+                merged_sketch = merged.setdefault(stat, {}).setdefault(
+                    group, QuantileSketch(sketch.relative_accuracy)
+                )
+                merged_sketch.merge(sketch)
+    return merged
+
+
+def percentiles_output(
+    sketches: PaymentsSketches, qs: Sequence[float] = QUANTILES
+) -> dict[PercentileStat, dict[str, dict[str, float | None]]]:
+    """Estimate the quantiles of every sketch, None for the empty ones."""
+    return {
+        stat: {
+            group: {
+                quantile_name(q): None if math.isnan(value) else float(value)
+                for q, value in zip(qs, sketch.quantiles(qs), strict=True)
+            }
+            for group, sketch in groups.items()
+        }
+        for stat, groups in sketches.items()
+    }
+
+
+def write_payments_sketches(path: Path, sketches: PaymentsSketches) -> None:
+    data = {
+        stat: {group: sketch.to_dict() for group, sketch in groups.items()}
+        for stat, groups in sketches.items()
+    }
+    path.write_text(json.dumps(data, separators=(",", ":")))
+
+
+def read_payments_sketches(path: Path) -> PaymentsSketches:
+    return {
+        PercentileStat(stat): {
+            group: QuantileSketch.from_dict(sketch) for group, sketch in groups.items()
+        }
+        for stat, groups in json.loads(path.read_text()).items()
+    }
@@ -0,0 +1,70 @@
+########################################################################################################################
+#                         Copyright (c) 2019-2021 Banca d'Italia - All Rights Reserved                                 #
+#                                                                                                                      #
+# This file is part of the "itCoin" project.                                                                           #
+# Unauthorized copying of this file, via any medium, is strictly prohibited.                                           #
+# The content of this and related source files is proprietary and confidential.                                        #
+#                                                                                                                      #
+# Written by ART (Applied Research Team) - email: appliedresearchteam@bancaditalia.it - web: https://www.bankit.art    #
+########################################################################################################################
+
+"""Incremental reading of CSV files that are still being written."""
+
+import io
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+
+
+class CsvTail:
+    """Read the complete rows appended to a CSV file since the last read.
+
+    Only the bytes up to the last newline are consumed, so that a row which is
+    being written is read only once it is complete. Compressed files cannot be
+    tailed.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.offset = 0
+        self.header: list[str] | None = None
+
+    def read_new_rows(
+        self,
+        dtype: dict[str, str] | None = None,
+        usecols: Callable[[str], bool] | None = None,
+    ) -> pd.DataFrame | None:
+        """Read the rows appended since the last call.
+
+        Args:
+        ----
+            dtype: the types of the columns, as for pd.read_csv.
+            usecols: the columns to be read, as for pd.read_csv.
+
+        Returns None if no complete row was appended.
+        """
+        if self.path.stat().st_size < self.offset:
+            # the file has been truncated (e.g. the simulation was restarted)
+            self.offset = 0
+            self.header = None
+        with self.path.open("rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return None
+        data = data[:end]
+        self.offset += end
+        if self.header is None:
+            header, _, data = data.partition(b"\n")
+            self.header = header.decode().strip().split(",")
+        if not data.strip():
+            return None
+        return pd.read_csv(
+            io.BytesIO(data),
+            header=None,
+            names=self.header,
+            dtype=dtype,
+            usecols=usecols,
+        )
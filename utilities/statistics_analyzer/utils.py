@@ -14,6 +14,9 @@ from pathlib import Path
 EXIT_SUCCESS = 0
 EXIT_FAILURE = 1
 
+"""Suffixes of the compressed variants of the simulator output files"""
+COMPRESSION_SUFFIXES = (".gz", ".zst")
+
 
 def configure_logging(verbose: bool) -> None:
     """Configure logging.
@@ -45,6 +48,32 @@ def check_path_is_directory(
         raise exception_class(msg)
 
 
+def strip_compression_suffix(path: Path) -> Path:
+    """Return the path without its compression suffix, if any."""
+    if path.suffix in COMPRESSION_SUFFIXES:
+        return path.with_suffix("")
+    return path
+
+
+def find_output_files(dirpath: Path, pattern: str) -> list[Path]:
+    """Find the files matching the pattern, including their compressed variants.
+
+    When both a plain file and one of its compressed variants exist, the plain
+    file is preferred. The result is sorted by (uncompressed) file name.
+
+    Args:
+    ----
+        dirpath: The path to the directory to search in.
+        pattern: Filename pattern of the uncompressed files.
+    """
+    files_by_name: dict[Path, Path] = {}
+    for suffix in ("", *COMPRESSION_SUFFIXES):
+        for file in dirpath.glob(pattern + suffix):
+            if file.is_file():
+                files_by_name.setdefault(strip_compression_suffix(file), file)
+    return [files_by_name[name] for name in sorted(files_by_name)]
+
+
 def count_file_in_dir(
     dirpath: Path,
     pattern: str,
@@ -52,14 +81,15 @@ def count_file_in_dir(
 ) -> int:
     """Check if the filename exists in the directory.
 
+    Compressed variants of the matching files are counted as well.
+
     Args:
     ----
         dirpath: The path to the output directory.
         pattern: Filename pattern to search for within the directory.
         exception_class: The exception class to be raised if validation fails.
     """
-    files = dirpath.glob(pattern)
-    count = sum(1 for file in files if file.is_file())
+    count = len(find_output_files(dirpath, pattern))
     if count == 0:
         msg = (
             f"path {dirpath} does not contain any file following the pattern {pattern}"